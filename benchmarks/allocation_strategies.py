@@ -0,0 +1,96 @@
+import argparse
+import random
+import pandas as pd
+from lido_sandbox.allocation_harness import compare_allocation_strategies
+from lido_sandbox.libs import (
+    CappedAllocationStrategy,
+    MinFirstAllocationStrategy,
+    PriorityAllocationStrategy,
+    RoundRobinAllocationStrategy,
+    WeightedAllocationStrategy,
+)
+from lido_sandbox.locator import Locator
+from lido_sandbox.staking_module import StakingModule
+
+# The built-in allocation strategies side by side over one deposit stream: three
+# modules with target shares that bound them only loosely, node operators with
+# uneven numbers of vetted keys, and a stream of submissions of random size each
+# followed by a deposit.
+
+DEPOSIT_SIZE: int = 32 * 10**18
+TARGET_SHARES: tuple[int, ...] = (10000, 5000, 2500)
+
+
+def build_world(operators: int, max_keys: int, rnd: random.Random) -> Locator:
+    locator = Locator("locator")
+    lido = locator.lido
+    router = locator.staking_router
+    lido.balance = 10**18
+    lido.initialize()
+
+    for module_index, target_share in enumerate(TARGET_SHARES):
+        module = StakingModule(
+            f"module type {module_index}", locator, f"module {module_index}"
+        )
+        module.MAX_NODE_OPERATORS_COUNT = max(
+            module.MAX_NODE_OPERATORS_COUNT, operators
+        )
+        router.add_staking_module(
+            name=f"module {module_index}",
+            staking_module=module,
+            target_share=target_share,
+            staking_module_fee=500,
+            treasury_fee=500,
+        )
+        for node_operator_id in range(operators):
+            name = f"module {module_index} operator {node_operator_id}"
+            module.add_node_operator(name, name)
+            keys_count = rnd.randint(1, max_keys)
+            module.add_signing_keys(
+                node_operator_id,
+                [(f"{name} key {k}", f"{name} sig {k}") for k in range(keys_count)],
+            )
+            module.set_node_operator_staking_limit(node_operator_id, keys_count)
+    return locator
+
+
+def deposit_stream(
+    steps: int, max_deposits: int, rnd: random.Random
+) -> list[tuple[int, int]]:
+    return [
+        (rnd.randint(1, max_deposits) * DEPOSIT_SIZE, max_deposits)
+        for _ in range(steps)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operators", type=int, default=100)
+    parser.add_argument("--max-keys", type=int, default=60)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--max-deposits", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    locator = build_world(args.operators, args.max_keys, rnd)
+    stream = deposit_stream(args.steps, args.max_deposits, rnd)
+
+    # a module must take every deposit the router hands it, so the capped
+    # strategies overflow
+    strategies = {
+        "min first": MinFirstAllocationStrategy(),
+        "weighted": WeightedAllocationStrategy(),
+        "round robin": RoundRobinAllocationStrategy(),
+        "priority": PriorityAllocationStrategy(),
+        "capped 35% min first": CappedAllocationStrategy(3500, overflow=True),
+        "capped 35% round robin": CappedAllocationStrategy(
+            3500, RoundRobinAllocationStrategy(), overflow=True
+        ),
+    }
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(compare_allocation_strategies(locator, strategies, stream).T)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import random
+import time
+from lido_sandbox.libs import MinFirstAllocationStrategy
+
+# MinFirstAllocationStrategy.allocate against the step by step allocate_iteratively:
+# a fuzz run checks that both leave the same buckets and report the same allocated
+# amount, the benchmark times both on buckets at similar fill levels. The tests in
+# tests/test_min_first_allocation_strategy.py run the same comparison.
+
+
+def random_case(rnd: random.Random) -> tuple[list[int], list[int], int]:
+    count = rnd.randint(0, 12)
+    top = rnd.choice([3, 10, 100, 10**6])
+    buckets = [rnd.randint(0, top) for _ in range(count)]
+    capacities = [
+        rnd.choice([bucket, rnd.randint(0, top), bucket + rnd.randint(0, top)])
+        for bucket in buckets
+    ]
+    allocation_size = rnd.choice(
+        [0, 1, rnd.randint(0, count + 1), rnd.randint(0, top * (count + 1))]
+    )
+    return buckets, capacities, allocation_size
+
+
+def fuzz(cases: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    for case in range(cases):
+        buckets, capacities, allocation_size = random_case(rnd)
+        expected_buckets = list(buckets)
+        expected = MinFirstAllocationStrategy.allocate_iteratively(
+            expected_buckets, capacities, allocation_size
+        )
+        allocated = MinFirstAllocationStrategy.allocate(
+            buckets, capacities, allocation_size
+        )
+        assert (allocated, buckets) == (expected, expected_buckets), (
+            case,
+            capacities,
+            allocation_size,
+        )
+    print(f"fuzz: {cases} cases equal")
+
+
+def similar_levels(
+    count: int, rnd: random.Random
+) -> tuple[list[int], list[int], int]:
+    # operators a few validators apart, each with a few hundred keys left, and an
+    # allocation of about ten deposits per operator
+    buckets = [1_000 + rnd.randint(0, 5) for _ in range(count)]
+    capacities = [bucket + rnd.randint(0, 300) for bucket in buckets]
+    return buckets, capacities, 10 * count
+
+
+def timed(allocate, buckets: list[int], capacities: list[int], size: int) -> float:
+    buckets = list(buckets)
+    start = time.perf_counter()
+    allocate(buckets, capacities, size)
+    return time.perf_counter() - start
+
+
+def benchmark(counts: list[int], iterative_limit: int, seed: int) -> None:
+    rnd = random.Random(seed)
+    print("buckets  iterative ms  water-filling ms  speedup")
+    for count in counts:
+        buckets, capacities, size = similar_levels(count, rnd)
+        water_filling = timed(
+            MinFirstAllocationStrategy.allocate, buckets, capacities, size
+        )
+        if count <= iterative_limit:
+            iterative = timed(
+                MinFirstAllocationStrategy.allocate_iteratively,
+                buckets,
+                capacities,
+                size,
+            )
+            print(
+                f"{count:7}  {iterative * 1e3:12.2f}  {water_filling * 1e3:16.2f}"
+                f"  {iterative / water_filling:7.0f}x"
+            )
+        else:
+            print(f"{count:7}  {'skipped':>12}  {water_filling * 1e3:16.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=100_000)
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 1_000, 100_000])
+    # the step by step allocation is quadratic in the buckets count, at 100k buckets
+    # it runs for hours, so by default only allocate is timed there
+    parser.add_argument("--iterative-limit", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    fuzz(args.cases, args.seed)
+    benchmark(args.counts, args.iterative_limit, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import random
+import time
+from lido_sandbox.locator import Locator
+from lido_sandbox.staking_module import StakingModule
+
+# The scans over all the node operators of a large module, on the NodeOperator
+# objects and on the columnar NodeOperatorRegistry: the rewards distribution of a
+# report and the allocation of a deposit. Both stores must give the same results.
+
+DEPOSIT_SIZE: int = 32 * 10**18
+
+
+def build_world(operators: int, rnd: random.Random) -> tuple[Locator, StakingModule]:
+    locator = Locator("locator")
+    lido = locator.lido
+    lido.balance = 10**18
+    lido.initialize()
+
+    module = StakingModule("permissionless type", locator, "permissionless module")
+    module.MAX_NODE_OPERATORS_COUNT = operators
+    locator.staking_router.add_staking_module(
+        name="permissionless",
+        staking_module=module,
+        target_share=10000,
+        staking_module_fee=500,
+        treasury_fee=500,
+    )
+    for node_operator_id in range(operators):
+        name = f"operator {node_operator_id}"
+        module.add_node_operator(name, name)
+        keys_count = rnd.randint(1, 8)
+        module.add_signing_keys(
+            node_operator_id,
+            [(f"{name} key {k}", f"{name} sig {k}") for k in range(keys_count)],
+        )
+        module.set_node_operator_staking_limit(node_operator_id, keys_count)
+
+    lido.submit("staker", 2 * operators * DEPOSIT_SIZE)
+    lido.deposit_all(2 * operators)
+    return locator, module
+
+
+def timed(function, repeats: int) -> tuple[float, object]:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start) / repeats, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operators", type=int, nargs="+", default=[1_000, 20_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("operators  scan                   objects ms  registry ms  speedup")
+    for operators in args.operators:
+        locator, module = build_world(operators, random.Random(args.seed))
+        forked = locator.fork()
+        forked_module = forked.staking_router.get_staking_module_instance(
+            module.address
+        )
+        forked_module.enable_node_operator_registry()
+
+        for scan, run in (
+            (
+                "rewards distribution",
+                lambda module: module.get_rewards_distribution(10**24),
+            ),
+            ("deposit of 1000 keys", lambda module: module.obtain_deposit_data(1000)),
+        ):
+            # a deposit is made once on a fork per store, so both start alike
+            repeats = args.repeats if scan == "rewards distribution" else 1
+            objects, objects_result = timed(lambda: run(module), repeats)
+            registry, registry_result = timed(lambda: run(forked_module), repeats)
+            assert objects_result == registry_result, scan
+            print(
+                f"{operators:9}  {scan:21}  {objects * 1e3:10.2f}"
+                f"  {registry * 1e3:11.2f}  {objects / registry:6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import random
+import tracemalloc
+from lido_sandbox.locator import Locator
+
+# Memory footprint of read-only workloads: every round queries balances, shares and
+# allowances of addresses that mostly hold nothing, plus the withdrawal queue state.
+# Reads must not materialise entries, so the retained memory stays flat across rounds.
+
+
+def build_world(holders: int) -> Locator:
+    locator = Locator("locator")
+    lido = locator.lido
+    lido.balance = 10**18
+    lido.initialize()
+    lido.submit_many(
+        [f"0x{i:040x}" for i in range(holders)],
+        [10**18 + i for i in range(holders)],
+    )
+    for i in range(0, holders, 10):
+        lido.approve(f"0x{i:040x}", f"0x{i + 1:040x}", 10**17)
+    return locator
+
+
+def run_queries(locator: Locator, queries: int, rnd: random.Random) -> None:
+    lido = locator.lido
+    withdrawal_queue = locator.withdrawal_queue
+    for _ in range(queries):
+        account = f"0x{rnd.randrange(10 * queries):040x}"
+        lido.balance_of(account)
+        lido.shares_of(account)
+        lido.allowance(account, f"0x{rnd.randrange(10 * queries):040x}")
+    for _ in range(queries // 100):
+        withdrawal_queue.unfinalized_steth()
+
+
+def entries_count(locator: Locator) -> tuple[int, int, int, int]:
+    lido = locator.lido
+    withdrawal_queue = locator.withdrawal_queue
+    return (
+        len(lido._shares),
+        len(lido._allowances),
+        len(withdrawal_queue._queue._local),
+        len(withdrawal_queue._checkpoints._local),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--holders", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--fork", action="store_true")
+    args = parser.parse_args()
+
+    locator = build_world(args.holders)
+    if args.fork:
+        # a forked world reads everything from frozen layers
+        locator = locator.fork()
+
+    rnd = random.Random(0)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    print("round  retained KiB  peak KiB  shares  allowances  queue  checkpoints")
+    for round_number in range(args.rounds):
+        tracemalloc.reset_peak()
+        run_queries(locator, args.queries, rnd)
+        current, peak = tracemalloc.get_traced_memory()
+        print(
+            f"{round_number:5}  {(current - baseline) / 1024:12.1f}"
+            f"  {(peak - baseline) / 1024:8.1f}",
+            *(f"{count:6}" for count in entries_count(locator)),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ from lido_sandbox.el_rewards_vault import ElRewardsVault
 from lido_sandbox.lido import Lido
 from lido_sandbox.oracle_report_sanity_checker import OracleReportSanityChecker
 from lido_sandbox.post_token_rebase_receiver import PostTokenRebaseReceiver
+from lido_sandbox.report_metrics import ReportMetrics
+from lido_sandbox.report_metrics_recorder import ReportMetricsRecorder
 from lido_sandbox.staking_router import StakingRouter
 from lido_sandbox.steth import StETH
 from lido_sandbox.treasury import Treasury
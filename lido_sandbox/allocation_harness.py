@@ -0,0 +1,189 @@
+from collections.abc import Iterable
+from copy import deepcopy
+from time import perf_counter_ns
+import numpy as np
+import pandas as pd
+from lido_sandbox.libs import AllocationStrategy, AllocationStrategyWrapper
+from lido_sandbox.locator import Locator
+
+# A step of a deposit stream submits some ether to Lido and then deposits at most
+# some count of validators, (submitted ether, max deposits count). The same stream
+# runs on a fork of the base world per strategy, so the rows of the comparison only
+# differ by the strategy.
+DepositStep = tuple[int, int]
+
+HARNESS_SENDER: str = "allocation harness"
+
+
+def compare_allocation_strategies(
+    locator: Locator,
+    strategies: dict[str, AllocationStrategy],
+    deposit_stream: Iterable[DepositStep],
+) -> pd.DataFrame:
+    # Every strategy splits the deposits between the modules and between the node
+    # operators of every module, each contract gets its own copy of it. The rows
+    # hold the allocation latency, the active validators of every module, how far
+    # the modules are from their target shares and how evenly the validators are
+    # spread over the node operators.
+    deposit_stream = list(deposit_stream)
+    rows = {
+        name: run_deposit_stream(locator, strategy, deposit_stream)
+        for name, strategy in strategies.items()
+    }
+    return pd.DataFrame.from_dict(rows, orient="index").rename_axis("strategy")
+
+
+def run_deposit_stream(
+    locator: Locator,
+    strategy: AllocationStrategy,
+    deposit_stream: list[DepositStep],
+) -> dict:
+    forked = locator.fork()
+    router = forked.staking_router
+    latencies = []
+
+    router.set_allocation_strategy(
+        _TimedAllocationStrategy(deepcopy(strategy), latencies)
+    )
+    for module_data in router.get_staking_modules():
+        router.get_staking_module_instance(
+            module_data.staking_module_address
+        ).set_allocation_strategy(
+            _TimedAllocationStrategy(deepcopy(strategy), latencies)
+        )
+
+    lido = forked.lido
+    deposits_count = 0
+    start = perf_counter_ns()
+    for submitted_ether, max_deposits_count in deposit_stream:
+        if submitted_ether > 0:
+            lido.submit(HARNESS_SENDER, submitted_ether)
+        if lido.can_deposit():
+            deposits_count += sum(lido.deposit_all(max_deposits_count))
+    elapsed = perf_counter_ns() - start
+
+    latencies = np.array(latencies, dtype=np.float64) / 1e3
+    return (
+        {
+            "deposits": deposits_count,
+            "deposit_ms": elapsed / 1e6,
+            "allocations": len(latencies),
+            "allocation_mean_us": latencies.mean() if len(latencies) else 0.0,
+            "allocation_p99_us": (
+                np.percentile(latencies, 99) if len(latencies) else 0.0
+            ),
+        }
+        | get_modules_distribution(forked)
+        | get_node_operators_fairness(forked)
+    )
+
+
+def get_modules_distribution(locator: Locator) -> dict:
+    # the active validators of every module and the largest gap between the share
+    # of a module and its target share, both normalised over the active modules
+    router = locator.staking_router
+    staking_modules = router.get_staking_modules()
+    validators = [
+        router.get_staking_module_active_validators_count(module_data.id)
+        for module_data in staking_modules
+    ]
+    total_validators = sum(validators)
+    total_target_share = sum(
+        module_data.target_share for module_data in staking_modules
+    )
+
+    distribution = {}
+    max_deviation = 0.0
+    for module_data, module_validators in zip(staking_modules, validators):
+        distribution[f"validators.{module_data.id}"] = module_validators
+        if total_validators > 0 and total_target_share > 0:
+            max_deviation = max(
+                max_deviation,
+                abs(
+                    module_validators / total_validators
+                    - module_data.target_share / total_target_share
+                ),
+            )
+    distribution["max_target_share_deviation"] = max_deviation
+    return distribution
+
+
+def get_node_operators_fairness(locator: Locator) -> dict:
+    # how evenly the active validators are spread over the active node operators of
+    # all modules: Gini coefficient (0 is even), Jain's index (1 is even) and the
+    # smallest and largest counts
+    router = locator.staking_router
+    counts = []
+    for module_data in router.get_staking_modules():
+        module = router.get_staking_module_instance(module_data.staking_module_address)
+        for node_operator_id in range(module.get_node_operators_count()):
+            if not module.get_node_operator_is_active(node_operator_id):
+                continue
+            summary = module.get_node_operator_summary(node_operator_id)
+            # deposited minus exited keys
+            counts.append(summary[6] - summary[5])
+
+    counts = np.sort(np.array(counts, dtype=np.float64))
+    total = counts.sum()
+    if total == 0:
+        return {
+            "operator_gini": 0.0,
+            "operator_jain": 1.0,
+            "operator_min": 0,
+            "operator_max": 0,
+        }
+
+    n = len(counts)
+    ranks = np.arange(1, n + 1)
+    return {
+        "operator_gini": 2 * (ranks * counts).sum() / (n * total) - (n + 1) / n,
+        "operator_jain": total**2 / (n * (counts**2).sum()),
+        "operator_min": int(counts[0]),
+        "operator_max": int(counts[-1]),
+    }
+
+
+class _TimedAllocationStrategy(AllocationStrategyWrapper):
+    # records the latency of every allocation of the wrapped strategy
+    def __init__(self, strategy: AllocationStrategy, latencies: list[int]) -> None:
+        super().__init__(strategy)
+        self._latencies = latencies
+
+    def allocate(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        return self._timed(
+            super().allocate, buckets, capacities, allocation_size, weights
+        )
+
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        return self._timed(
+            super().allocate_in_order, buckets, capacities, allocation_size, weights
+        )
+
+    def commit_allocation(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        return self._timed(
+            super().commit_allocation, buckets, capacities, allocation_size, weights
+        )
+
+    def _timed(self, allocate, *args):
+        start = perf_counter_ns()
+        result = allocate(*args)
+        self._latencies.append(perf_counter_ns() - start)
+        return result
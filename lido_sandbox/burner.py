@@ -5,8 +5,8 @@ class Burner(Contract):
     def __init__(self, address: str) -> None:
         super().__init__(address)
 
-    def request_burn_shares():
+    def request_burn_shares(self, *args):
         pass
 
-    def commit_shares_to_burn():
+    def commit_shares_to_burn(self, *args):
         pass
@@ -1,19 +1,33 @@
-from typing import Self
+from collections.abc import Callable
+
+
+def view(method: Callable) -> Callable:
+    # views only read the state, so they never run as transactions
+    method._view = True
+    return method
+
+
+def _new_contract(contract_class: type) -> "Contract":
+    return contract_class.__new__(contract_class)
 
 
 class Contract:
     address: str
     balance: int
 
-    _contracts_registry: dict[str, Self] = {}
-
-    def __new__(cls, address: str, *args, **kwargs):
-        if not address in cls._contracts_registry:
-            instance = super().__new__(cls)
-            cls._contracts_registry[address] = instance
-
-        return cls._contracts_registry[address]
+    _world = None
+    _event_log = None
+    _transactional: bool = True
 
     def __init__(self, address: str, balance: int = 0) -> None:
         self.address = address
         self.balance = balance
+
+    def __reduce_ex__(self, protocol):
+        # hooks installed by the world live in a subclass that is never copied, so
+        # forks and pickles always get the plain contract class
+        reduced = super().__reduce_ex__(protocol)
+        unhooked_class = type(self).__dict__.get("_unhooked_class")
+        if unhooked_class is None:
+            return reduced
+        return (_new_contract, (unhooked_class,), *reduced[2:])
@@ -0,0 +1,165 @@
+from collections.abc import Iterator
+import numpy as np
+import pandas as pd
+from lido_sandbox.objects import EVENT_SCHEMAS, Event, EventType
+
+ADDRESS_COLUMNS: int = 2
+VALUE_COLUMNS: int = 7
+NO_ADDRESS: int = -1
+
+
+class EventLog:
+    # Events are recorded into preallocated columns of a ring buffer: once the
+    # capacity is exhausted the oldest events are overwritten. Addresses are interned
+    # into int32 ids, amounts are kept as exact ints in object columns.
+    DEFAULT_CAPACITY: int = 2**20
+
+    _capacity: int
+    _count: int
+    _address_ids: dict[str, int]
+    _addresses: list[str]
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        assert capacity > 0, "INVALID_CAPACITY"
+
+        self._capacity = capacity
+        self._count = 0
+        self._address_ids = {}
+        self._addresses = []
+        self._seq = None
+        self._savepoints = []
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+    def __deepcopy__(self, memo: dict) -> "EventLog":
+        # forked worlds start with an empty log of their own
+        return EventLog(self._capacity)
+
+    def get_capacity(self) -> int:
+        return self._capacity
+
+    def get_events_count(self) -> int:
+        return self._count
+
+    def emit(
+        self,
+        event_type: EventType,
+        emitter: str,
+        addresses: tuple[str, ...] = (),
+        values: tuple[int, ...] = (),
+    ) -> None:
+        if self._seq is None:
+            self._allocate()
+
+        row = self._count % self._capacity
+        self._seq[row] = self._count
+        self._event[row] = event_type.value
+        self._emitter[row] = self._intern(emitter)
+
+        for i in range(ADDRESS_COLUMNS):
+            self._address_columns[i][row] = (
+                self._intern(addresses[i]) if i < len(addresses) else NO_ADDRESS
+            )
+        for i in range(VALUE_COLUMNS):
+            self._value_columns[i][row] = values[i] if i < len(values) else None
+
+        self._count += 1
+
+    def get_events(self, event_type: EventType | None = None) -> list[Event]:
+        events = []
+        for row in self._rows():
+            row_event_type = EventType(int(self._event[row]))
+            if event_type is not None and row_event_type != event_type:
+                continue
+
+            address_fields, value_fields = EVENT_SCHEMAS[row_event_type]
+            args = {}
+            for i, field in enumerate(address_fields):
+                args[field] = self._addresses[self._address_columns[i][row]]
+            for i, field in enumerate(value_fields):
+                args[field] = self._value_columns[i][row]
+
+            events.append(
+                Event(
+                    int(self._seq[row]),
+                    row_event_type,
+                    self._addresses[self._emitter[row]],
+                    args,
+                )
+            )
+        return events
+
+    def to_dataframe(self, event_type: EventType | None = None) -> pd.DataFrame:
+        # until the buffer wraps around the columns are handed to pandas as views
+        columns = {"seq": self._column(self._seq, np.int64)}
+        columns["event"] = pd.Categorical.from_codes(
+            self._column(self._event, np.int8),
+            categories=[event.name for event in EventType],
+        )
+        columns["emitter"] = self._addresses_column(self._emitter)
+        for i in range(ADDRESS_COLUMNS):
+            columns[f"address_{i}"] = self._addresses_column(self._address_columns[i])
+        for i in range(VALUE_COLUMNS):
+            columns[f"value_{i}"] = self._column(self._value_columns[i], object)
+
+        df = pd.DataFrame(columns, copy=False)
+        if event_type is None:
+            return df
+
+        address_fields, value_fields = EVENT_SCHEMAS[event_type]
+        df = df[df["event"] == event_type.name]
+        renames = {f"address_{i}": field for i, field in enumerate(address_fields)}
+        renames.update({f"value_{i}": field for i, field in enumerate(value_fields)})
+        return df[["seq", "emitter", *renames.keys()]].rename(columns=renames)
+
+    def clear(self) -> None:
+        self._count = 0
+
+    # events emitted by a reverted call are dropped, but events overwritten by
+    # them in a wrapped buffer are lost for good
+    def _begin_transaction(self) -> None:
+        self._savepoints.append(self._count)
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+
+    def _rollback_transaction(self) -> None:
+        self._count = self._savepoints.pop()
+
+    def _allocate(self) -> None:
+        capacity = self._capacity
+        self._seq = np.empty(capacity, dtype=np.int64)
+        self._event = np.empty(capacity, dtype=np.int8)
+        self._emitter = np.empty(capacity, dtype=np.int32)
+        self._address_columns = [
+            np.empty(capacity, dtype=np.int32) for _ in range(ADDRESS_COLUMNS)
+        ]
+        self._value_columns = [
+            np.empty(capacity, dtype=object) for _ in range(VALUE_COLUMNS)
+        ]
+
+    def _intern(self, address: str) -> int:
+        address_id = self._address_ids.get(address)
+        if address_id is None:
+            address_id = len(self._addresses)
+            self._address_ids[address] = address_id
+            self._addresses.append(address)
+        return address_id
+
+    def _rows(self) -> Iterator[int]:
+        start = max(0, self._count - self._capacity)
+        return (row % self._capacity for row in range(start, self._count))
+
+    def _column(self, column: np.ndarray | None, dtype) -> np.ndarray:
+        if column is None:
+            return np.empty(0, dtype=dtype)
+        if self._count <= self._capacity:
+            return column[: self._count]
+        cursor = self._count % self._capacity
+        return np.concatenate((column[cursor:], column[:cursor]))
+
+    def _addresses_column(self, column: np.ndarray | None) -> pd.Categorical:
+        return pd.Categorical.from_codes(
+            self._column(column, np.int32), categories=self._addresses
+        )
@@ -0,0 +1,351 @@
+from collections.abc import Callable
+import pandas as pd
+from lido_sandbox.contract import Contract
+from lido_sandbox.hooks import register_hook
+from lido_sandbox.libs import CopyOnWriteDict, NodeOperatorRegistry, ShareLedger
+from lido_sandbox.libs.node_operator_registry import (
+    COUNT_FIELDS,
+    FLAG_FIELDS,
+    TEXT_FIELDS,
+    NodeOperatorView,
+)
+from lido_sandbox.objects import (
+    Checkpoint,
+    LimitsListPacked,
+    NodeOperator,
+    NodeOperatorSummary,
+    StakingModuleData,
+    WithdrawalRequest,
+)
+
+HOOK_GAS_METER: str = "gas_meter"
+
+# contract fields of these types are treated as storage slots
+STORAGE_VALUE_TYPES: tuple[type, ...] = (int, bool, str)
+# contract fields and mapping entries of these types are structs, every field of
+# them is a storage slot of its own
+STORAGE_STRUCT_TYPES: tuple[type, ...] = (
+    Checkpoint,
+    LimitsListPacked,
+    NodeOperator,
+    NodeOperatorSummary,
+    NodeOperatorView,
+    StakingModuleData,
+    WithdrawalRequest,
+)
+
+
+class GasMeter:
+    # Gas is estimated from the storage accesses of every entry point call using the
+    # EIP-2929/EIP-2200 pricing: the first access of a slot (or an account) during the
+    # call is cold, all the following ones are warm. Refunds are ignored.
+    TX_BASE_COST: int = 21000
+    COLD_SLOAD_COST: int = 2100
+    WARM_STORAGE_READ_COST: int = 100
+    SSTORE_SET_GAS: int = 20000
+    SSTORE_RESET_GAS: int = 2900
+    COLD_ACCOUNT_ACCESS_COST: int = 2600
+
+    _records: list[dict]
+    _depth: int
+
+    def __init__(self) -> None:
+        self._records = []
+        self._depth = 0
+        self._record = None
+
+    def __deepcopy__(self, memo: dict) -> "GasMeter":
+        # forked worlds start with an empty meter of their own
+        return GasMeter()
+
+    def reset(self) -> None:
+        assert self._depth == 0, "GAS_METER_IS_RUNNING"
+        self._records = []
+
+    def get_last_call(self) -> dict:
+        return self._records[-1]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            self._records,
+            columns=[
+                "contract",
+                "method",
+                "cold_sloads",
+                "warm_sloads",
+                "sstores_set",
+                "sstores_reset",
+                "sstores_warm",
+                "cold_calls",
+                "warm_calls",
+                "gas",
+            ],
+        )
+
+    def _enter(self, contract: Contract, method: str) -> None:
+        self._depth += 1
+        if self._depth > 1:
+            self._call(contract.address)
+            return
+
+        self._record = {
+            "contract": contract.address,
+            "method": method,
+            "cold_sloads": 0,
+            "warm_sloads": 0,
+            "sstores_set": 0,
+            "sstores_reset": 0,
+            "sstores_warm": 0,
+            "cold_calls": 0,
+            "warm_calls": 0,
+            "gas": self.TX_BASE_COST,
+        }
+        self._accessed_slots = set()
+        self._original_values = {}
+        self._accessed_accounts = {contract.address}
+
+    def _exit(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._records.append(self._record)
+            self._record = None
+
+    def _call(self, address: str) -> None:
+        if address in self._accessed_accounts:
+            self._record["warm_calls"] += 1
+            self._record["gas"] += self.WARM_STORAGE_READ_COST
+        else:
+            self._accessed_accounts.add(address)
+            self._record["cold_calls"] += 1
+            self._record["gas"] += self.COLD_ACCOUNT_ACCESS_COST
+
+    def _sload(self, slot: tuple) -> None:
+        record = self._record
+        if record is None:
+            return
+
+        if slot in self._accessed_slots:
+            record["warm_sloads"] += 1
+            record["gas"] += self.WARM_STORAGE_READ_COST
+        else:
+            self._accessed_slots.add(slot)
+            record["cold_sloads"] += 1
+            record["gas"] += self.COLD_SLOAD_COST
+
+    def _sstore(self, slot: tuple, current_value, new_value) -> None:
+        record = self._record
+        if record is None:
+            return
+
+        if slot not in self._accessed_slots:
+            self._accessed_slots.add(slot)
+            record["gas"] += self.COLD_SLOAD_COST
+        original_value = self._original_values.setdefault(slot, current_value)
+
+        if new_value == current_value or original_value != current_value:
+            record["sstores_warm"] += 1
+            record["gas"] += self.WARM_STORAGE_READ_COST
+        elif not original_value:
+            record["sstores_set"] += 1
+            record["gas"] += self.SSTORE_SET_GAS
+        else:
+            record["sstores_reset"] += 1
+            record["gas"] += self.SSTORE_RESET_GAS
+
+
+class MeteredStruct:
+    # A struct read from contract storage. Its fields are read and written through
+    # the gas meter as slots keyed by the slot of the struct and the field name,
+    # e.g. (contract, mapping, key, field).
+    __slots__ = ("_struct", "_gas_meter", "_slot")
+
+    def __init__(self, struct, gas_meter: GasMeter, slot: tuple) -> None:
+        object.__setattr__(self, "_struct", struct)
+        object.__setattr__(self, "_gas_meter", gas_meter)
+        object.__setattr__(self, "_slot", slot)
+
+    def __getattr__(self, name: str):
+        value = getattr(self._struct, name)
+        if type(value) in STORAGE_VALUE_TYPES:
+            self._gas_meter._sload(self._slot + (name,))
+        return value
+
+    def __setattr__(self, name: str, value) -> None:
+        if type(value) in STORAGE_VALUE_TYPES:
+            self._gas_meter._sstore(
+                self._slot + (name,), getattr(self._struct, name, 0), value
+            )
+        setattr(self._struct, name, value)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._struct!r})"
+
+
+def unwrap_struct(value):
+    return value._struct if type(value) is MeteredStruct else value
+
+
+def _read_slot(gas_meter: GasMeter, slot: tuple, value):
+    # structs are metered field by field, any other value is a single slot. Reads
+    # made outside of entry point calls hand out the structs themselves
+    if type(value) in STORAGE_STRUCT_TYPES and gas_meter._record is not None:
+        return MeteredStruct(value, gas_meter, slot)
+    gas_meter._sload(slot)
+    return value
+
+
+def _struct_fields(struct) -> dict:
+    if type(struct) is NodeOperatorView:
+        return {
+            name: getattr(struct, name)
+            for name in COUNT_FIELDS + FLAG_FIELDS + TEXT_FIELDS
+        }
+    return vars(struct)
+
+
+def _write_slot(gas_meter: GasMeter, slot: tuple, current_value, value) -> None:
+    if type(value) not in STORAGE_STRUCT_TYPES:
+        gas_meter._sstore(slot, current_value, value)
+    elif value is not current_value:
+        # a struct written as a whole stores each of its fields
+        for name, field_value in _struct_fields(value).items():
+            if type(field_value) in STORAGE_VALUE_TYPES:
+                gas_meter._sstore(
+                    slot + (name,),
+                    0 if current_value is None else getattr(current_value, name, 0),
+                    field_value,
+                )
+
+
+def metered_mapping_class(mapping_class: type) -> type:
+    # Every entry of a mapping is a separate storage slot, and so is every field of
+    # a struct entry. Metered classes are swapped onto existing mappings, so they
+    # directly subclass the mapping class.
+    def get(self, key, default=None):
+        value = mapping_class.get(self, key, default)
+        if value is default:
+            self._gas_meter._sload(self._slot + (key,))
+            return value
+        return _read_slot(self._gas_meter, self._slot + (key,), value)
+
+    def __getitem__(self, key):
+        return _read_slot(
+            self._gas_meter, self._slot + (key,), mapping_class.__getitem__(self, key)
+        )
+
+    def peek(self, key, default=None):
+        value = mapping_class.peek(self, key, default)
+        if value is default:
+            self._gas_meter._sload(self._slot + (key,))
+            return value
+        return _read_slot(self._gas_meter, self._slot + (key,), value)
+
+    def __contains__(self, key) -> bool:
+        self._gas_meter._sload(self._slot + (key,))
+        return mapping_class.__contains__(self, key)
+
+    def __setitem__(self, key, value) -> None:
+        value = unwrap_struct(value)
+        current_value = mapping_class.get(self, key)
+        _write_slot(self._gas_meter, self._slot + (key,), current_value, value)
+        mapping_class.__setitem__(self, key, value)
+
+    def __delitem__(self, key) -> None:
+        current_value = mapping_class.get(self, key)
+        self._gas_meter._sstore(self._slot + (key,), current_value, None)
+        mapping_class.__delitem__(self, key)
+
+    namespace = {
+        "get": get,
+        "__getitem__": __getitem__,
+        "__contains__": __contains__,
+        "__setitem__": __setitem__,
+        "__delitem__": __delitem__,
+    }
+    if hasattr(mapping_class, "peek"):
+        namespace["peek"] = peek
+    return type(f"Metered{mapping_class.__name__}", (mapping_class,), namespace)
+
+
+MeteredCopyOnWriteDict = metered_mapping_class(CopyOnWriteDict)
+MeteredShareLedger = metered_mapping_class(ShareLedger)
+MeteredNodeOperatorRegistry = metered_mapping_class(NodeOperatorRegistry)
+
+# metered class -> unmetered class
+METERED_MAPPINGS: dict[type, type] = {
+    MeteredCopyOnWriteDict: CopyOnWriteDict,
+    MeteredShareLedger: ShareLedger,
+    MeteredNodeOperatorRegistry: NodeOperatorRegistry,
+}
+_UNMETERED_MAPPINGS: dict[type, type] = {
+    unmetered: metered for metered, unmetered in METERED_MAPPINGS.items()
+}
+
+
+def attach_gas_meter(contract: Contract, gas_meter: GasMeter | None) -> None:
+    for name, value in contract.__dict__.items():
+        if gas_meter is None:
+            if type(value) in METERED_MAPPINGS:
+                value.__class__ = METERED_MAPPINGS[type(value)]
+                del value._gas_meter, value._slot
+        elif type(value) in _UNMETERED_MAPPINGS:
+            value.__class__ = _UNMETERED_MAPPINGS[type(value)]
+            value._gas_meter = gas_meter
+            value._slot = (contract.address, name)
+
+
+def _is_metered(contract_class: type, name: str) -> bool:
+    return not name.startswith("_")
+
+
+def _metered_method(method: Callable) -> Callable:
+    name = method.__qualname__
+
+    def metered(self: Contract, *args, **kwargs):
+        gas_meter = self._world.gas_meter
+        gas_meter._enter(self, name)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            gas_meter._exit()
+
+    return metered
+
+
+def _metered_getattribute(self: Contract, name: str):
+    value = object.__getattribute__(self, name)
+    if (
+        type(value) in STORAGE_VALUE_TYPES or type(value) in STORAGE_STRUCT_TYPES
+    ) and (name.startswith("_") and not name.startswith("__")):
+        gas_meter = object.__getattribute__(self, "_world").gas_meter
+        return _read_slot(
+            gas_meter, (object.__getattribute__(self, "address"), name), value
+        )
+    return value
+
+
+def _metered_setattr(self: Contract, name: str, value) -> None:
+    value = unwrap_struct(value)
+    if (
+        type(value) in STORAGE_VALUE_TYPES or type(value) in STORAGE_STRUCT_TYPES
+    ) and name.startswith("_"):
+        gas_meter = object.__getattribute__(self, "_world").gas_meter
+        try:
+            current_value = object.__getattribute__(self, name)
+        except AttributeError:
+            current_value = None if type(value) in STORAGE_STRUCT_TYPES else 0
+        _write_slot(
+            gas_meter,
+            (object.__getattribute__(self, "address"), name),
+            current_value,
+            value,
+        )
+    object.__setattr__(self, name, value)
+
+
+register_hook(
+    HOOK_GAS_METER,
+    _is_metered,
+    _metered_method,
+    {"__getattribute__": _metered_getattribute, "__setattr__": _metered_setattr},
+)
@@ -5,15 +5,13 @@ import pandas as pd
 
 def print_lido_stakers(locator: Locator):
     lido = locator.lido
+    accounts, shares, balances = lido.balances_of()
 
     df = pd.DataFrame(
         {
-            "address": [key for key, _ in lido._shares.items()],
-            "shares": [wei_to_eth(value) for _, value in lido._shares.items()],
-            "steth": [
-                wei_to_eth(lido.get_pooled_eth_by_shares(value))
-                for _, value in lido._shares.items()
-            ],
+            "address": accounts,
+            "shares": wei_to_eth(shares).astype(float),
+            "steth": wei_to_eth(balances).astype(float),
         }
     )
 
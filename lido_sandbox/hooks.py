@@ -0,0 +1,71 @@
+from collections.abc import Callable
+from functools import wraps
+from inspect import getattr_static, isfunction
+from lido_sandbox.contract import Contract
+
+HOOK_TRANSACTIONS: str = "transactions"
+
+# hook kind -> (does the method need the hook, wraps the method, extra attributes)
+_HOOKS: dict[str, tuple[Callable, Callable, dict]] = {}
+_hooked_classes: dict[tuple[type, tuple[str, ...]], type] = {}
+
+
+def register_hook(
+    kind: str, selector: Callable, wrapper: Callable, attributes: dict | None = None
+) -> None:
+    _HOOKS[kind] = (selector, wrapper, attributes or {})
+
+
+def unhooked_class(contract_class: type) -> type:
+    return contract_class.__dict__.get("_unhooked_class", contract_class)
+
+
+def hooked_class(contract_class: type, kinds: tuple[str, ...]) -> type:
+    # Hooks are applied by swapping the class of a contract for a subclass with
+    # wrapped methods. Contracts without hooks keep their class, so a disabled hook
+    # costs nothing.
+    contract_class = unhooked_class(contract_class)
+    if not kinds:
+        return contract_class
+
+    key = (contract_class, kinds)
+    if key not in _hooked_classes:
+        namespace = {"_unhooked_class": contract_class}
+        for kind in kinds:
+            selector, wrapper, attributes = _HOOKS[kind]
+            namespace.update(attributes)
+            for name in dir(contract_class):
+                if name.startswith("__"):
+                    continue
+                method = namespace.get(name, getattr_static(contract_class, name))
+                if isfunction(method) and selector(contract_class, name):
+                    namespace[name] = wraps(method)(wrapper(method))
+        _hooked_classes[key] = type(
+            contract_class.__name__, (contract_class,), namespace
+        )
+    return _hooked_classes[key]
+
+
+def _is_entry_point(contract_class: type, name: str) -> bool:
+    return (
+        contract_class._transactional
+        and not name.startswith("_")
+        and not getattr(getattr_static(contract_class, name), "_view", False)
+    )
+
+
+def _entry_point(method: Callable) -> Callable:
+    # a contract is journaled when one of its entry points is called for the first
+    # time in a transaction, contracts that are not called are never copied
+    def entry_point(self: Contract, *args, **kwargs):
+        world = self._world
+        if world._journal:
+            world._journal_contract(self)
+            return method(self, *args, **kwargs)
+        with world.transaction(self):
+            return method(self, *args, **kwargs)
+
+    return entry_point
+
+
+register_hook(HOOK_TRANSACTIONS, _is_entry_point, _entry_point)
@@ -1,2 +1,16 @@
+from lido_sandbox.libs.accounting_kernel import AccountingKernel
+from lido_sandbox.libs.allocation_strategies import (
+    AllocationStrategy,
+    AllocationStrategyWrapper,
+    CappedAllocationStrategy,
+    GreedyAllocationStrategy,
+    PriorityAllocationStrategy,
+    RoundRobinAllocationStrategy,
+    WeightedAllocationStrategy,
+)
+from lido_sandbox.libs.copy_on_write_dict import CopyOnWriteDict
+from lido_sandbox.libs.holder_index import HolderIndex
 from lido_sandbox.libs.min_first_allocation_strategy import MinFirstAllocationStrategy
+from lido_sandbox.libs.node_operator_registry import NodeOperatorRegistry
 from lido_sandbox.libs.positve_token_rebase_limiter import PositiveTokenRebaseLimiter
+from lido_sandbox.libs.share_ledger import AccountIndex, ShareLedger
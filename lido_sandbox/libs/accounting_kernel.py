@@ -0,0 +1,217 @@
+import numpy as np
+from lido_sandbox.libs.positve_token_rebase_limiter import PositiveTokenRebaseLimiter
+from lido_sandbox.objects import OracleReportBatch
+
+
+class AccountingKernel:
+    # The accounting of Lido._handle_oracle_report over arrays of independent
+    # reports: the positive token rebase smoothing of the sanity checker, the
+    # collection of vault balances and withdrawal finalization, the burn and the fee
+    # mint. Every row gives the same result as the object path. Amounts may exceed
+    # int64, so the arithmetic runs on object arrays of exact ints. Arguments are
+    # broadcast against each other, so scalars may stand for whole columns.
+    DEPOSIT_SIZE: int = 32 * 10**18
+
+    @staticmethod
+    def as_array(value) -> np.ndarray:
+        # int64 arrays are widened to exact ints
+        return np.asarray(value, dtype=object)
+
+    @staticmethod
+    def handle_oracle_reports(
+        pre_total_pooled_ether,
+        pre_total_shares,
+        pre_cl_balance,
+        pre_cl_validators,
+        post_cl_validators,
+        post_cl_balance,
+        withdrawal_vault_balance,
+        el_rewards_vault_balance,
+        shares_requested_to_burn,
+        max_positive_token_rebase,
+        total_fee,
+        precision_points,
+        ether_to_lock_on_withdrawal_queue=0,
+        shares_to_burn_from_withdrawal_queue=0,
+    ) -> OracleReportBatch:
+        (
+            pre_total_pooled_ether,
+            pre_total_shares,
+            pre_cl_balance,
+            pre_cl_validators,
+            post_cl_validators,
+            post_cl_balance,
+            withdrawal_vault_balance,
+            el_rewards_vault_balance,
+            shares_requested_to_burn,
+            max_positive_token_rebase,
+            total_fee,
+            precision_points,
+            ether_to_lock_on_withdrawal_queue,
+            shares_to_burn_from_withdrawal_queue,
+        ) = np.broadcast_arrays(
+            *(
+                AccountingKernel.as_array(value)
+                for value in (
+                    pre_total_pooled_ether,
+                    pre_total_shares,
+                    pre_cl_balance,
+                    pre_cl_validators,
+                    post_cl_validators,
+                    post_cl_balance,
+                    withdrawal_vault_balance,
+                    el_rewards_vault_balance,
+                    shares_requested_to_burn,
+                    max_positive_token_rebase,
+                    total_fee,
+                    precision_points,
+                    ether_to_lock_on_withdrawal_queue,
+                    shares_to_burn_from_withdrawal_queue,
+                )
+            )
+        )
+        assert np.all(
+            post_cl_validators >= pre_cl_validators
+        ), "REPORTED_LESS_VALIDATORS"
+
+        # Step 1. validators appeared since the last report bring their deposits
+        pre_cl_balance = (
+            pre_cl_balance
+            + (post_cl_validators - pre_cl_validators) * AccountingKernel.DEPOSIT_SIZE
+        )
+
+        # Step 4. smoothen the token rebase
+        limiter = _Limiter(
+            max_positive_token_rebase, pre_total_pooled_ether, pre_total_shares
+        )
+        cl_decrease = pre_cl_balance > post_cl_balance
+        limiter.decrease_ether(
+            np.where(cl_decrease, pre_cl_balance - post_cl_balance, 0)
+        )
+        limiter.increase_ether(
+            np.where(cl_decrease, 0, post_cl_balance - pre_cl_balance)
+        )
+        withdrawals = limiter.increase_ether(withdrawal_vault_balance)
+        el_rewards = limiter.increase_ether(el_rewards_vault_balance)
+        simulated_shares_to_burn = np.minimum(
+            limiter.get_shares_to_burn_limit(), shares_requested_to_burn
+        )
+        limiter.decrease_ether(ether_to_lock_on_withdrawal_queue)
+        shares_to_burn = np.minimum(
+            limiter.get_shares_to_burn_limit(),
+            shares_to_burn_from_withdrawal_queue + shares_requested_to_burn,
+        )
+
+        # Step 7. mint the fee shares, only when the consensus layer earned rewards
+        consensus_layer_rewards = post_cl_balance + withdrawals - pre_cl_balance
+        total_rewards = consensus_layer_rewards + el_rewards
+        has_fee = (consensus_layer_rewards > 0) & (total_fee > 0)
+        denominator = (
+            pre_total_pooled_ether + total_rewards
+        ) * precision_points - total_rewards * total_fee
+        shares_minted_as_fees = np.where(
+            has_fee,
+            total_rewards
+            * total_fee
+            * pre_total_shares
+            // np.where(has_fee, denominator, 1),
+            0,
+        )
+
+        # Steps 5, 6 and 8. pooled ether and shares after the rebase
+        post_total_pooled_ether = (
+            pre_total_pooled_ether
+            + post_cl_balance
+            - pre_cl_balance
+            + withdrawals
+            + el_rewards
+            - ether_to_lock_on_withdrawal_queue
+        )
+        post_total_shares = pre_total_shares - shares_to_burn + shares_minted_as_fees
+
+        return OracleReportBatch(
+            post_total_pooled_ether,
+            post_total_shares,
+            withdrawals,
+            el_rewards,
+            simulated_shares_to_burn,
+            shares_to_burn,
+            shares_minted_as_fees,
+        )
+
+
+class _Limiter:
+    # PositiveTokenRebaseLimiter over arrays, rows with an unlimited rebase pass
+    # every ether change through
+    def __init__(
+        self,
+        rebase_limit: np.ndarray,
+        pre_total_pooled_ether: np.ndarray,
+        pre_total_shares: np.ndarray,
+    ) -> None:
+        assert np.all(rebase_limit != 0)
+        assert np.all(rebase_limit <= PositiveTokenRebaseLimiter.UNLIMITED_REBASE)
+
+        self.unlimited = (
+            rebase_limit == PositiveTokenRebaseLimiter.UNLIMITED_REBASE
+        ) | (pre_total_pooled_ether == 0)
+        self.rebase_limit = np.where(
+            self.unlimited, PositiveTokenRebaseLimiter.UNLIMITED_REBASE, rebase_limit
+        )
+        self.current_total_pooled_ether = pre_total_pooled_ether
+        self.pre_total_pooled_ether = pre_total_pooled_ether
+        self.pre_total_shares = pre_total_shares
+        self.max_total_pooled_ether = np.where(
+            self.unlimited,
+            PositiveTokenRebaseLimiter.MAX_UINT256,
+            pre_total_pooled_ether
+            + self.rebase_limit
+            * pre_total_pooled_ether
+            // PositiveTokenRebaseLimiter.LIMITER_PRECISION_BASE,
+        )
+
+    def decrease_ether(self, ether_amount: np.ndarray) -> None:
+        if np.any(~self.unlimited & (ether_amount > self.current_total_pooled_ether)):
+            raise ValueError("NegativeTotalPooledEther")
+        self.current_total_pooled_ether = np.where(
+            self.unlimited,
+            self.current_total_pooled_ether,
+            self.current_total_pooled_ether - ether_amount,
+        )
+
+    def increase_ether(self, ether_amount: np.ndarray) -> np.ndarray:
+        prev_pooled_ether = self.current_total_pooled_ether
+        self.current_total_pooled_ether = np.where(
+            self.unlimited,
+            prev_pooled_ether,
+            np.minimum(prev_pooled_ether + ether_amount, self.max_total_pooled_ether),
+        )
+        return np.where(
+            self.unlimited,
+            ether_amount,
+            self.current_total_pooled_ether - prev_pooled_ether,
+        )
+
+    def get_shares_to_burn_limit(self) -> np.ndarray:
+        rebase_limit_plus_1 = (
+            self.rebase_limit + PositiveTokenRebaseLimiter.LIMITER_PRECISION_BASE
+        )
+        pooled_ether_rate = (
+            self.current_total_pooled_ether
+            * PositiveTokenRebaseLimiter.LIMITER_PRECISION_BASE
+            // np.where(self.unlimited, 1, self.pre_total_pooled_ether)
+        )
+        max_shares_to_burn = (
+            self.pre_total_shares
+            * (rebase_limit_plus_1 - pooled_ether_rate)
+            // rebase_limit_plus_1
+        )
+        return np.where(
+            self.unlimited,
+            self.pre_total_shares,
+            np.where(
+                self.current_total_pooled_ether >= self.max_total_pooled_ether,
+                0,
+                max_shares_to_burn,
+            ),
+        )
@@ -0,0 +1,347 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from heapq import heapify, heappop, heapreplace
+from math import lcm
+from lido_sandbox.libs.min_first_allocation_strategy import MinFirstAllocationStrategy
+
+
+class AllocationStrategy(ABC):
+    # Splits allocation_size units over the buckets without raising any bucket above
+    # its capacity. The buckets are updated in place and the allocated count is
+    # returned. Weights, when the caller has them, are the target shares of the
+    # buckets, e.g. the target shares of the staking modules. StakingRouter and
+    # StakingModule take any object with this allocate, MinFirstAllocationStrategy
+    # included. Strategies that hand out units one at a time also tell the bucket of
+    # every unit in turn through allocate_in_order. A resumable strategy picks every
+    # unit from the buckets alone, so resuming an allocation from its own result
+    # gives the units of one longer allocation. A strategy with state of its own,
+    # e.g. a round-robin position, leaves it as is in allocate, which also answers
+    # views, and moves it on in commit_allocation, which the callers use for the
+    # allocations they carry out.
+    RESUMABLE: bool = False
+
+    @abstractmethod
+    def allocate(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int: ...
+
+
+class GreedyAllocationStrategy(AllocationStrategy):
+    def allocate(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        return len(
+            self.allocate_in_order(buckets, capacities, allocation_size, weights)
+        )
+
+    @abstractmethod
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]: ...
+
+
+class WeightedAllocationStrategy(GreedyAllocationStrategy):
+    # every unit goes to the open bucket lowest relative to its weight, i.e. with
+    # the smallest (bucket + 1) / weight, first by index. Buckets with no weight get
+    # nothing, with no weights at all every bucket weighs the same and the result is
+    # the one of MinFirstAllocationStrategy
+    RESUMABLE: bool = True
+
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        if weights is None:
+            weights = [1] * len(buckets)
+        assert len(weights) == len(buckets), "INVALID_WEIGHTS_LENGTH"
+
+        # (bucket + 1) / weight scaled by the common multiple of the weights keeps
+        # the keys exact ints
+        positive_weights = [weight for weight in weights if weight > 0]
+        scale = lcm(*positive_weights) if positive_weights else 1
+        steps = [scale // weight if weight > 0 else 0 for weight in weights]
+
+        heap = [
+            ((buckets[i] + 1) * steps[i], i)
+            for i in range(len(buckets))
+            if buckets[i] < capacities[i] and weights[i] > 0
+        ]
+        heapify(heap)
+        order = []
+        while heap and len(order) < allocation_size:
+            i = heap[0][1]
+            order.append(i)
+            buckets[i] += 1
+            if buckets[i] < capacities[i]:
+                heapreplace(heap, (heap[0][0] + steps[i], i))
+            else:
+                heappop(heap)
+        return order
+
+
+class RoundRobinAllocationStrategy(GreedyAllocationStrategy):
+    # one unit per open bucket in turn, carrying on from the bucket after the last
+    # one served by the previous committed allocation. The position is kept by
+    # bucket index, so it drifts when the caller drops buckets, e.g. node operators
+    # running out of keys. The position is journaled with the world transactions
+    # of its owner.
+    _next_index: int
+    _savepoints: list[int]
+
+    def __init__(self) -> None:
+        self._next_index = 0
+        self._savepoints = []
+
+    def commit_allocation(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        order = self.allocate_in_order(buckets, capacities, allocation_size, weights)
+        if order:
+            self._next_index = order[-1] + 1
+        return len(order)
+
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        # leaves the position as is, only commit_allocation moves it on
+        count = len(buckets)
+        start = self._next_index % count if count > 0 else 0
+        queue = deque(
+            i
+            for i in [*range(start, count), *range(start)]
+            if buckets[i] < capacities[i]
+        )
+        order = []
+        while queue and len(order) < allocation_size:
+            i = queue.popleft()
+            order.append(i)
+            buckets[i] += 1
+            if buckets[i] < capacities[i]:
+                queue.append(i)
+        return order
+
+    def _begin_transaction(self) -> None:
+        self._savepoints.append(self._next_index)
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+
+    def _rollback_transaction(self) -> None:
+        self._next_index = self._savepoints.pop()
+
+
+class PriorityAllocationStrategy(GreedyAllocationStrategy):
+    # fills the buckets up to their capacity one after another, by ascending
+    # priority and then by index. Without priorities the buckets are filled by index
+    RESUMABLE: bool = True
+
+    _priorities: list[int] | None
+
+    def __init__(self, priorities: list[int] | None = None) -> None:
+        self._priorities = priorities
+
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        priorities = self._priorities
+        if priorities is None:
+            priorities = [0] * len(buckets)
+        assert len(priorities) >= len(buckets), "INVALID_PRIORITIES_LENGTH"
+
+        order = []
+        for i in sorted(range(len(buckets)), key=lambda i: (priorities[i], i)):
+            if len(order) == allocation_size:
+                break
+            allocated = min(capacities[i] - buckets[i], allocation_size - len(order))
+            if allocated > 0:
+                order.extend([i] * allocated)
+                buckets[i] += allocated
+        return order
+
+
+class AllocationStrategyWrapper(AllocationStrategy):
+    # Base of the strategies built around another one. Allocations, resumability
+    # and the world transactions go to the wrapped strategy, which may be a
+    # participant as well, e.g. a round-robin.
+    _strategy: AllocationStrategy
+    _strategy_is_participant: bool
+
+    def __init__(self, strategy: AllocationStrategy) -> None:
+        self._strategy = strategy
+        self._strategy_is_participant = hasattr(strategy, "_begin_transaction")
+
+    @property
+    def RESUMABLE(self) -> bool:
+        return getattr(self._strategy, "RESUMABLE", False)
+
+    def allocate(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        return self._strategy.allocate(buckets, capacities, allocation_size, weights)
+
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        return self._strategy.allocate_in_order(
+            buckets, capacities, allocation_size, weights
+        )
+
+    def commit_allocation(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        commit_allocation = getattr(
+            self._strategy, "commit_allocation", self._strategy.allocate
+        )
+        return commit_allocation(buckets, capacities, allocation_size, weights)
+
+    def _begin_transaction(self) -> None:
+        if self._strategy_is_participant:
+            self._strategy._begin_transaction()
+
+    def _commit_transaction(self) -> None:
+        if self._strategy_is_participant:
+            self._strategy._commit_transaction()
+
+    def _rollback_transaction(self) -> None:
+        if self._strategy_is_participant:
+            self._strategy._rollback_transaction()
+
+
+class CappedAllocationStrategy(AllocationStrategyWrapper):
+    # Allocates with the wrapped strategy while keeping every bucket under
+    # max_share_bp of the buckets total after the allocation, what the capped
+    # buckets cannot take is left unallocated. With overflow it goes on to the
+    # wrapped strategy with the capacities alone instead, so nothing is left
+    # unallocated that an uncapped strategy would place. The cap follows the
+    # allocation size, so the first k units of allocate_in_order are not the
+    # allocation of k units, nor is the strategy resumable.
+    TOTAL_BASIS_POINTS: int = 10000
+    RESUMABLE: bool = False
+
+    _max_share_bp: int
+    _overflow: bool
+
+    def __init__(
+        self,
+        max_share_bp: int,
+        strategy: AllocationStrategy = MinFirstAllocationStrategy(),
+        overflow: bool = False,
+    ) -> None:
+        assert 0 < max_share_bp <= self.TOTAL_BASIS_POINTS, "INVALID_MAX_SHARE"
+
+        super().__init__(strategy)
+        self._max_share_bp = max_share_bp
+        self._overflow = overflow
+
+    def allocate(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        return self._allocate(
+            self._strategy.allocate, buckets, capacities, allocation_size, weights
+        )
+
+    def allocate_in_order(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        order = self._strategy.allocate_in_order(
+            buckets,
+            self._get_capped_capacities(buckets, capacities, allocation_size),
+            allocation_size,
+            weights,
+        )
+        if self._overflow and len(order) < allocation_size:
+            order += self._strategy.allocate_in_order(
+                buckets, capacities, allocation_size - len(order), weights
+            )
+        return order
+
+    def commit_allocation(
+        self,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        return self._allocate(
+            super().commit_allocation, buckets, capacities, allocation_size, weights
+        )
+
+    def _allocate(
+        self,
+        allocate,
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None,
+    ) -> int:
+        allocated = allocate(
+            buckets,
+            self._get_capped_capacities(buckets, capacities, allocation_size),
+            allocation_size,
+            weights,
+        )
+        if self._overflow and allocated < allocation_size:
+            allocated += allocate(
+                buckets, capacities, allocation_size - allocated, weights
+            )
+        return allocated
+
+    def _get_capped_capacities(
+        self, buckets: list[int], capacities: list[int], allocation_size: int
+    ) -> list[int]:
+        cap = (
+            self._max_share_bp
+            * (sum(buckets) + allocation_size)
+            // self.TOTAL_BASIS_POINTS
+        )
+        return [
+            min(capacity, max(bucket, cap))
+            for bucket, capacity in zip(buckets, capacities)
+        ]
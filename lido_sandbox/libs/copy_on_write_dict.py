@@ -0,0 +1,186 @@
+from collections.abc import Callable, Iterator, Mapping, MutableMapping
+from copy import copy
+from typing import Any
+
+_MISSING = object()
+_DELETED = object()
+
+
+class CopyOnWriteDict(MutableMapping):
+    # Entries live in a stack of layers. Only the local layer is ever written,
+    # all the other layers are frozen and may be shared with forks of the dict.
+    MAX_LAYERS: int = 16
+
+    _local: dict
+    _layers: tuple[Mapping, ...]
+    _size: int
+    _savepoints: list[int]
+
+    def __init__(
+        self,
+        default_factory: Callable[[], Any] | None = None,
+        copy_values: bool = False,
+        data: dict | None = None,
+    ) -> None:
+        self.default_factory = default_factory
+        # mutable values must be copied before they are handed out of a frozen layer
+        self.copy_values = copy_values
+        self._local = dict(data) if data else {}
+        self._layers = ()
+        self._size = len(self._local)
+        self._savepoints = []
+
+    @staticmethod
+    def with_base(
+        base: Mapping,
+        default_factory: Callable[[], Any] | None = None,
+        copy_values: bool = False,
+    ) -> "CopyOnWriteDict":
+        # the base mapping becomes the bottom frozen layer and is never written
+        cow_dict = CopyOnWriteDict(default_factory, copy_values)
+        cow_dict._layers = (base,)
+        cow_dict._size = len(base)
+        return cow_dict
+
+    def fork(self) -> "CopyOnWriteDict":
+        assert not self._savepoints, "FORK_INSIDE_TRANSACTION"
+        self._freeze()
+
+        forked = CopyOnWriteDict.__new__(CopyOnWriteDict)
+        forked.default_factory = self.default_factory
+        forked.copy_values = self.copy_values
+        forked._local = {}
+        forked._layers = self._layers
+        forked._size = self._size
+        forked._savepoints = []
+        return forked
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def peek(self, key, default=None):
+        # a read that never writes: neither the default factory nor copy_values
+        # materialise an entry, so the value must not be mutated
+        value = self._local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._lookup_layers(key)
+        return default if value is _MISSING or value is _DELETED else value
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            if self.default_factory is None:
+                raise KeyError(key)
+            value = self.default_factory()
+            self[key] = value
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        local = self._local
+        if key in local:
+            if local[key] is _DELETED:
+                self._size += 1
+        else:
+            # a key deleted in a frozen layer counts as missing
+            layered = self._lookup_layers(key)
+            if layered is _MISSING or layered is _DELETED:
+                self._size += 1
+        local[key] = value
+
+    def __delitem__(self, key) -> None:
+        if self._lookup(key) is _MISSING:
+            raise KeyError(key)
+        if self._layers:
+            self._local[key] = _DELETED
+        else:
+            del self._local[key]
+        self._size -= 1
+
+    def __contains__(self, key) -> bool:
+        value = self._local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._lookup_layers(key)
+        return value is not _MISSING and value is not _DELETED
+
+    def __iter__(self) -> Iterator:
+        if not self._layers:
+            return iter(self._local)
+        return iter(self._merge())
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __deepcopy__(self, memo: dict) -> "CopyOnWriteDict":
+        # a dict referenced twice in the copied graph forks once
+        forked = self.fork()
+        memo[id(self)] = forked
+        return forked
+
+    def __reduce__(self):
+        return (
+            CopyOnWriteDict,
+            (self.default_factory, self.copy_values, self._merge()),
+        )
+
+    # A transaction pushes the local layer down the stack, so every write of the
+    # transaction lands in a new local layer: a rollback drops that layer and a
+    # commit merges it into the layer below.
+    def _begin_transaction(self) -> None:
+        self._savepoints.append(self._size)
+        self._layers = (self._local,) + self._layers
+        self._local = {}
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+        committed, self._layers = self._layers[0], self._layers[1:]
+        committed.update(self._local)
+        if not self._layers:
+            for key, value in self._local.items():
+                if value is _DELETED:
+                    del committed[key]
+        self._local = committed
+
+    def _rollback_transaction(self) -> None:
+        self._size = self._savepoints.pop()
+        self._local, self._layers = self._layers[0], self._layers[1:]
+
+    def _lookup(self, key):
+        value = self._local.get(key, _MISSING)
+        if value is _DELETED:
+            return _MISSING
+        if value is not _MISSING:
+            return value
+
+        value = self._lookup_layers(key)
+        if value is _MISSING or value is _DELETED:
+            return _MISSING
+
+        if self.copy_values:
+            value = copy(value)
+            self._local[key] = value
+        return value
+
+    def _lookup_layers(self, key):
+        for layer in self._layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return _MISSING
+
+    def _freeze(self) -> None:
+        if self._local:
+            self._layers = (self._local,) + self._layers
+            self._local = {}
+        if len(self._layers) > self.MAX_LAYERS:
+            self._layers = (self._merge(),)
+
+    def _merge(self) -> dict:
+        merged = {}
+        for layer in reversed(self._layers):
+            merged.update(layer)
+        merged.update(self._local)
+        return {key: value for key, value in merged.items() if value is not _DELETED}
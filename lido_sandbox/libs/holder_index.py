@@ -0,0 +1,269 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+
+
+class HolderIndex:
+    # Order statistics over the (shares, account) pairs of every holder with non-zero
+    # shares. Pairs are kept ascending in sorted buckets of up to 2 * BUCKET_SIZE
+    # entries, with Fenwick trees over the bucket sizes and share sums, so positions
+    # and prefix sums are found in logarithmic time. The sum of rank * shares is kept
+    # up to date for the Gini coefficient. Each bucket keeps its shares in a parallel
+    # list for fast partial sums. Buckets are shared with forks of the index until
+    # they are written.
+    BUCKET_SIZE: int = 256
+
+    _buckets: list[list[tuple[int, str]]]
+    _values: list[list[int]]
+    _maxes: list[tuple[int, str]]
+    _sums: list[int]
+    _owned: list[bool]
+    _count_tree: list[int]
+    _sum_tree: list[int]
+    _count: int
+    _total: int
+    _weighted_total: int
+    _undo_log: list[tuple[str, int, int]]
+    _savepoints: list[int]
+
+    def __init__(self, holders: Iterable[tuple[str, int]] = ()) -> None:
+        pairs = sorted((shares, account) for account, shares in holders if shares > 0)
+        size = self.BUCKET_SIZE
+        self._buckets = [pairs[i : i + size] for i in range(0, len(pairs), size)]
+        self._values = [[shares for shares, _ in bucket] for bucket in self._buckets]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._sums = [sum(values) for values in self._values]
+        self._owned = [True] * len(self._buckets)
+        self._count = len(pairs)
+        self._total = sum(self._sums)
+        self._weighted_total = sum(
+            rank * shares for rank, (shares, _) in enumerate(pairs, 1)
+        )
+        self._undo_log = []
+        self._savepoints = []
+        self._rebuild_trees()
+
+    def __deepcopy__(self, memo: dict) -> "HolderIndex":
+        assert not self._savepoints, "FORK_INSIDE_TRANSACTION"
+
+        forked = HolderIndex.__new__(HolderIndex)
+        forked.__dict__.update(self.__dict__)
+        for name in (
+            "_buckets",
+            "_values",
+            "_maxes",
+            "_sums",
+            "_count_tree",
+            "_sum_tree",
+        ):
+            setattr(forked, name, list(getattr(self, name)))
+        forked._undo_log = []
+        forked._savepoints = []
+        self._owned = [False] * len(self._buckets)
+        forked._owned = [False] * len(self._buckets)
+        return forked
+
+    def get_holders_count(self) -> int:
+        return self._count
+
+    def get_total_shares(self) -> int:
+        return self._total
+
+    def get_top_holders(self, count: int) -> list[tuple[str, int]]:
+        top_holders = []
+        for bucket in reversed(self._buckets):
+            for shares, account in reversed(bucket):
+                if len(top_holders) == count:
+                    return top_holders
+                top_holders.append((account, shares))
+        return top_holders
+
+    def get_rank(self, account: str, shares: int) -> int | None:
+        # 1 for the largest holder, None for accounts without shares
+        if shares <= 0:
+            return None
+        key = (shares, account)
+        bucket_index = bisect_left(self._maxes, key)
+        if bucket_index == len(self._maxes):
+            return None
+        offset = bisect_left(self._buckets[bucket_index], key)
+        if offset == len(self._buckets[bucket_index]):
+            return None
+        if self._buckets[bucket_index][offset] != key:
+            return None
+        return self._count - self._position(bucket_index, offset)
+
+    def get_top_shares(self, count: int) -> int:
+        # shares held by the largest `count` holders together
+        count = min(count, self._count)
+        return self._total - self._prefix_sum(self._count - count)
+
+    def get_gini(self) -> float:
+        if self._count == 0 or self._total == 0:
+            return 0.0
+        count = self._count
+        return (2 * self._weighted_total - (count + 1) * self._total) / (
+            count * self._total
+        )
+
+    def update(self, account: str, shares_before: int, shares_after: int) -> None:
+        if shares_before == shares_after:
+            return
+        if self._savepoints:
+            self._undo_log.append((account, shares_before, shares_after))
+        if shares_before > 0:
+            self._remove((shares_before, account))
+        if shares_after > 0:
+            self._insert((shares_after, account))
+
+    def _begin_transaction(self) -> None:
+        self._savepoints.append(len(self._undo_log))
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+        if not self._savepoints:
+            self._undo_log.clear()
+
+    def _rollback_transaction(self) -> None:
+        mark = self._savepoints.pop()
+        undo_log = self._undo_log
+        while len(undo_log) > mark:
+            account, shares_before, shares_after = undo_log.pop()
+            if shares_after > 0:
+                self._remove((shares_after, account))
+            if shares_before > 0:
+                self._insert((shares_before, account))
+
+    def _insert(self, key: tuple[int, str]) -> None:
+        shares = key[0]
+        if not self._buckets:
+            self._buckets.append([key])
+            self._values.append([shares])
+            self._maxes.append(key)
+            self._sums.append(shares)
+            self._owned.append(True)
+            self._rebuild_trees()
+            bucket_index, offset = 0, 0
+        else:
+            bucket_index = min(bisect_right(self._maxes, key), len(self._maxes) - 1)
+            bucket, values = self._own_bucket(bucket_index)
+            offset = bisect_right(bucket, key)
+            bucket.insert(offset, key)
+            values.insert(offset, shares)
+            self._maxes[bucket_index] = bucket[-1]
+            self._sums[bucket_index] += shares
+            self._update_trees(bucket_index, 1, shares)
+
+        # every holder above the new one moves one rank up
+        position = self._position(bucket_index, offset)
+        above = self._total - self._prefix_sum(position)
+        self._weighted_total += shares * (position + 1) + above
+        self._count += 1
+        self._total += shares
+
+        if len(self._buckets[bucket_index]) > 2 * self.BUCKET_SIZE:
+            self._split(bucket_index)
+
+    def _remove(self, key: tuple[int, str]) -> None:
+        shares = key[0]
+        bucket_index = bisect_left(self._maxes, key)
+        bucket, values = self._own_bucket(bucket_index)
+        offset = bisect_left(bucket, key)
+        assert offset < len(bucket) and bucket[offset] == key, "UNKNOWN_HOLDER"
+
+        position = self._position(bucket_index, offset)
+        above = self._total - self._prefix_sum(position) - shares
+        self._weighted_total -= shares * (position + 1) + above
+        self._count -= 1
+        self._total -= shares
+
+        del bucket[offset]
+        del values[offset]
+        self._sums[bucket_index] -= shares
+        if bucket:
+            self._maxes[bucket_index] = bucket[-1]
+            self._update_trees(bucket_index, -1, -shares)
+        else:
+            del self._buckets[bucket_index]
+            del self._values[bucket_index]
+            del self._maxes[bucket_index]
+            del self._sums[bucket_index]
+            del self._owned[bucket_index]
+            self._rebuild_trees()
+
+    def _own_bucket(self, bucket_index: int) -> tuple[list[tuple[int, str]], list[int]]:
+        if not self._owned[bucket_index]:
+            self._buckets[bucket_index] = list(self._buckets[bucket_index])
+            self._values[bucket_index] = list(self._values[bucket_index])
+            self._owned[bucket_index] = True
+        return self._buckets[bucket_index], self._values[bucket_index]
+
+    def _split(self, bucket_index: int) -> None:
+        bucket = self._buckets[bucket_index]
+        values = self._values[bucket_index]
+        half = len(bucket) // 2
+        low, high = bucket[:half], bucket[half:]
+        self._buckets[bucket_index : bucket_index + 1] = [low, high]
+        self._values[bucket_index : bucket_index + 1] = [values[:half], values[half:]]
+        self._maxes[bucket_index : bucket_index + 1] = [low[-1], high[-1]]
+        low_sum = sum(values[:half])
+        self._sums[bucket_index : bucket_index + 1] = [
+            low_sum,
+            self._sums[bucket_index] - low_sum,
+        ]
+        self._owned[bucket_index : bucket_index + 1] = [True, True]
+        self._rebuild_trees()
+
+    # Fenwick trees are 1-based: node i covers the buckets (i - (i & -i), i]
+    def _rebuild_trees(self) -> None:
+        size = len(self._buckets)
+        count_tree = [0] * (size + 1)
+        sum_tree = [0] * (size + 1)
+        for i in range(1, size + 1):
+            count_tree[i] += len(self._buckets[i - 1])
+            sum_tree[i] += self._sums[i - 1]
+            parent = i + (i & -i)
+            if parent <= size:
+                count_tree[parent] += count_tree[i]
+                sum_tree[parent] += sum_tree[i]
+        self._count_tree = count_tree
+        self._sum_tree = sum_tree
+
+    def _update_trees(
+        self, bucket_index: int, count_delta: int, sum_delta: int
+    ) -> None:
+        i = bucket_index + 1
+        size = len(self._count_tree) - 1
+        while i <= size:
+            self._count_tree[i] += count_delta
+            self._sum_tree[i] += sum_delta
+            i += i & -i
+
+    def _position(self, bucket_index: int, offset: int) -> int:
+        # number of pairs before the given one
+        position = offset
+        i = bucket_index
+        while i > 0:
+            position += self._count_tree[i]
+            i -= i & -i
+        return position
+
+    def _prefix_sum(self, position: int) -> int:
+        # shares of the first `position` pairs: the Fenwick tree is descended to the
+        # bucket holding the position, the rest is summed from the nearer end of it
+        size = len(self._count_tree) - 1
+        bucket_index, remaining, total = 0, position, 0
+        step = 1 << size.bit_length()
+        while step:
+            i = bucket_index + step
+            if i <= size and self._count_tree[i] <= remaining:
+                bucket_index = i
+                remaining -= self._count_tree[i]
+                total += self._sum_tree[i]
+            step >>= 1
+        if remaining:
+            values = self._values[bucket_index]
+            if 2 * remaining <= len(values):
+                total += sum(values[:remaining])
+            else:
+                total += self._sums[bucket_index] - sum(values[remaining:])
+        return total
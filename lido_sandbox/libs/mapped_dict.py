@@ -0,0 +1,145 @@
+import pickle
+from array import array
+from collections.abc import Iterator, Mapping
+
+UINT256_SIZE: int = 32
+
+KEY_STR: bytes = b"s"
+KEY_INT: bytes = b"i"
+KEY_PICKLE: bytes = b"p"
+
+VALUES_UINT256: str = "uint256"
+VALUES_PICKLE: str = "pickle"
+
+_MISSING = object()
+
+
+def encode_key(key) -> bytes:
+    # the encoding keeps the natural order of non-negative ints, so keys can be
+    # binary searched as raw bytes
+    if type(key) is str:
+        return KEY_STR + key.encode()
+    if type(key) is int and 0 <= key < 2 ** (8 * UINT256_SIZE):
+        return KEY_INT + key.to_bytes(UINT256_SIZE, "big")
+    return KEY_PICKLE + pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_key(encoded: bytes):
+    kind, payload = encoded[:1], encoded[1:]
+    if kind == KEY_STR:
+        return payload.decode()
+    if kind == KEY_INT:
+        return int.from_bytes(payload, "big")
+    return pickle.loads(payload)
+
+
+def pack_blobs(blobs: list[bytes]) -> tuple[array, bytes]:
+    offsets = array("Q", [0])
+    offset = 0
+    for blob in blobs:
+        offset += len(blob)
+        offsets.append(offset)
+    return offsets, b"".join(blobs)
+
+
+def pack_dict(data: dict) -> dict:
+    encoded_keys = [encode_key(key) for key in data.keys()]
+    key_offsets, keys = pack_blobs(encoded_keys)
+    order = array("Q", sorted(range(len(encoded_keys)), key=encoded_keys.__getitem__))
+
+    values = list(data.values())
+    if all(
+        type(value) is int and 0 <= value < 2 ** (8 * UINT256_SIZE) for value in values
+    ):
+        return {
+            "key_offsets": key_offsets,
+            "keys": keys,
+            "order": order,
+            "values_kind": VALUES_UINT256,
+            "values": b"".join(
+                value.to_bytes(UINT256_SIZE, "little") for value in values
+            ),
+            "value_offsets": None,
+        }
+
+    value_offsets, packed_values = pack_blobs(
+        [pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL) for value in values]
+    )
+    return {
+        "key_offsets": key_offsets,
+        "keys": keys,
+        "order": order,
+        "values_kind": VALUES_PICKLE,
+        "values": packed_values,
+        "value_offsets": value_offsets,
+    }
+
+
+class MappedDict(Mapping):
+    # Read-only dict over packed buffers (usually slices of a memory-mapped file).
+    # Nothing is decoded upfront: lookups binary search the sorted key order and
+    # only the requested entry is decoded.
+    def __init__(
+        self,
+        key_offsets: memoryview,
+        keys: memoryview,
+        order: memoryview,
+        values_kind: str,
+        values: memoryview,
+        value_offsets: memoryview | None = None,
+    ) -> None:
+        assert values_kind in (VALUES_UINT256, VALUES_PICKLE), "UNKNOWN_VALUES_KIND"
+        assert len(key_offsets) == len(order) + 1, "CORRUPTED_KEYS"
+
+        self._key_offsets = key_offsets
+        self._keys = keys
+        self._order = order
+        self._values_kind = values_kind
+        self._values = values
+        self._value_offsets = value_offsets
+
+    def get(self, key, default=None):
+        index = self._find(encode_key(key))
+        return default if index is None else self._value_at(index)
+
+    def __getitem__(self, key):
+        index = self._find(encode_key(key))
+        if index is None:
+            raise KeyError(key)
+        return self._value_at(index)
+
+    def __contains__(self, key) -> bool:
+        return self._find(encode_key(key)) is not None
+
+    def __iter__(self) -> Iterator:
+        for index in range(len(self._order)):
+            yield decode_key(self._encoded_key_at(index))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _find(self, encoded_key: bytes) -> int | None:
+        order = self._order
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded_key_at(order[middle]) < encoded_key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order) and self._encoded_key_at(order[low]) == encoded_key:
+            return order[low]
+        return None
+
+    def _encoded_key_at(self, index: int) -> bytes:
+        return bytes(
+            self._keys[self._key_offsets[index] : self._key_offsets[index + 1]]
+        )
+
+    def _value_at(self, index: int):
+        if self._values_kind == VALUES_UINT256:
+            start = index * UINT256_SIZE
+            return int.from_bytes(self._values[start : start + UINT256_SIZE], "little")
+        return pickle.loads(
+            self._values[self._value_offsets[index] : self._value_offsets[index + 1]]
+        )
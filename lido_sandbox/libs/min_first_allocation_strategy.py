@@ -1,5 +1,10 @@
+from heapq import heapify, heappop, heapreplace
+
+
 class MinFirstAllocationStrategy:
     MAX_UINT256 = 2**256 - 1
+    # see AllocationStrategy
+    RESUMABLE: bool = True
 
     @staticmethod
     def ceildiv(a: int, b: int) -> int:
@@ -7,6 +12,86 @@ class MinFirstAllocationStrategy:
 
     @staticmethod
     def allocate(
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> int:
+        # Same result as allocate_iteratively in one pass over the sorted levels.
+        # Filling the lowest buckets first levels every open bucket up to a common
+        # water level, capped by its capacity: the highest level the allocation
+        # pays for in full. What is left over is less than one unit per bucket at
+        # the water level and goes to the first of them by index. Weights are
+        # taken for the AllocationStrategy interface and ignored.
+        if allocation_size == 0:
+            return 0
+
+        # the filled amount grows with the water level at a slope of the number of
+        # open buckets under it: +1 at every bucket level, -1 at every capacity
+        events = []
+        for i in range(len(buckets)):
+            if buckets[i] < capacities[i]:
+                events.append((buckets[i], 1))
+                events.append((capacities[i], -1))
+        events.sort()
+
+        filled = 0
+        slope = 0
+        water_level = events[0][0] if events else 0
+        for level, slope_delta in events:
+            next_filled = filled + slope * (level - water_level)
+            if next_filled >= allocation_size:
+                break
+            filled = next_filled
+            water_level = level
+            slope += slope_delta
+        else:
+            # every bucket is filled up to its capacity
+            for i in range(len(buckets)):
+                if buckets[i] < capacities[i]:
+                    buckets[i] = capacities[i]
+            return filled
+
+        rise = (allocation_size - filled) // slope
+        remainder = allocation_size - filled - rise * slope
+        water_level += rise
+
+        for i in range(len(buckets)):
+            if buckets[i] < capacities[i] and buckets[i] <= water_level:
+                if remainder > 0 and water_level < capacities[i]:
+                    buckets[i] = water_level + 1
+                    remainder -= 1
+                else:
+                    buckets[i] = min(water_level, capacities[i])
+        return allocation_size
+
+    @staticmethod
+    def allocate_in_order(
+        buckets: list[int],
+        capacities: list[int],
+        allocation_size: int,
+        weights: list[int] | None = None,
+    ) -> list[int]:
+        # the bucket of every allocated unit in turn. Each unit goes to the lowest
+        # open bucket, first by index, so allocating the first k units of the order
+        # gives the same buckets as allocate with k for every k at once
+        heap = [
+            (buckets[i], i) for i in range(len(buckets)) if buckets[i] < capacities[i]
+        ]
+        heapify(heap)
+        order = []
+        while heap and len(order) < allocation_size:
+            level, i = heap[0]
+            order.append(i)
+            buckets[i] = level + 1
+            if level + 1 < capacities[i]:
+                heapreplace(heap, (level + 1, i))
+            else:
+                heappop(heap)
+        return order
+
+    @staticmethod
+    def allocate_iteratively(
         buckets: list[int], capacities: list[int], allocation_size: int
     ) -> int:
         allocated = 0
@@ -0,0 +1,232 @@
+from array import array
+from collections.abc import Iterable, Iterator, Mapping
+import numpy as np
+from lido_sandbox.objects import NodeOperator
+
+# uint64 columns of the counters of every node operator
+COUNT_FIELDS: tuple[str, ...] = (
+    "exited_signing_keys_count",
+    "deposited_signing_keys_count",
+    "vetted_signing_keys_count",
+    "total_signing_keys_count",
+    "stuck_validators_count",
+    "refunded_validators_count",
+    "stuck_penalty_end_timestamp",
+    "target_validators_count",
+    "max_validators_count",
+)
+# uint8 columns
+FLAG_FIELDS: tuple[str, ...] = ("active", "is_target_limit_active")
+# lists of strings
+TEXT_FIELDS: tuple[str, ...] = ("name", "reward_address")
+
+_TYPECODES: dict[str, str] = dict.fromkeys(COUNT_FIELDS, "Q") | dict.fromkeys(
+    FLAG_FIELDS, "B"
+)
+_DTYPES: dict[str, type] = {"Q": np.uint64, "B": np.uint8}
+
+
+class NodeOperatorRegistry(Mapping):
+    # Node operators of a staking module kept by id in parallel columns, one per
+    # NodeOperator field. Ids are dense, a new operator is appended after the last
+    # one and operators are never removed. Reading an operator returns a view that
+    # reads and writes its row, so code written against NodeOperator objects works
+    # unchanged, while whole-module scans run over numpy views of the columns. The
+    # columns are shared with forks of the registry until the first write.
+    _columns: dict[str, array | list[str]]
+    _size: int
+    _shared: bool
+    _undo_log: list[tuple[str, int, int | str]]
+    _savepoints: list[tuple[int, int]]
+
+    def __init__(self, node_operators: Iterable[NodeOperator] = ()) -> None:
+        self._columns = {
+            name: array(typecode) for name, typecode in _TYPECODES.items()
+        } | {name: [] for name in TEXT_FIELDS}
+        self._size = 0
+        self._shared = False
+        self._undo_log = []
+        self._savepoints = []
+        for node_operator_id, node_operator in enumerate(node_operators):
+            self[node_operator_id] = node_operator
+
+    @staticmethod
+    def from_columns(columns: dict[str, array | list[str]]) -> "NodeOperatorRegistry":
+        sizes = {len(column) for column in columns.values()}
+        assert len(sizes) == 1, "CORRUPTED_REGISTRY"
+        assert set(columns) == set(_TYPECODES) | set(TEXT_FIELDS), "CORRUPTED_REGISTRY"
+
+        registry = NodeOperatorRegistry.__new__(NodeOperatorRegistry)
+        registry._columns = columns
+        registry._size = sizes.pop()
+        registry._shared = True
+        registry._undo_log = []
+        registry._savepoints = []
+        return registry
+
+    def fork(self) -> "NodeOperatorRegistry":
+        assert not self._savepoints, "FORK_INSIDE_TRANSACTION"
+
+        self._shared = True
+        return NodeOperatorRegistry.from_columns(dict(self._columns))
+
+    def get(self, node_operator_id: int, default=None):
+        if node_operator_id in self:
+            return NodeOperatorView(self, node_operator_id)
+        return default
+
+    def __getitem__(self, node_operator_id: int) -> "NodeOperatorView":
+        if not 0 <= node_operator_id < self._size:
+            raise KeyError(node_operator_id)
+        return NodeOperatorView(self, node_operator_id)
+
+    def __setitem__(self, node_operator_id: int, node_operator: NodeOperator) -> None:
+        # either overwrites an operator or appends the next one
+        assert 0 <= node_operator_id <= self._size, "NON_CONTIGUOUS_ID"
+
+        if node_operator_id == self._size:
+            self._prepare_write()
+            for name, column in self._columns.items():
+                column.append("" if name in TEXT_FIELDS else 0)
+            self._size += 1
+        for name in self._columns:
+            self._set(name, node_operator_id, getattr(node_operator, name))
+
+    def __contains__(self, node_operator_id) -> bool:
+        return (
+            isinstance(node_operator_id, int) and 0 <= node_operator_id < self._size
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __deepcopy__(self, memo: dict) -> "NodeOperatorRegistry":
+        return self.fork()
+
+    def __reduce__(self):
+        return (NodeOperatorRegistry.from_columns, (_copy_columns(self._columns),))
+
+    def to_node_operator(self, node_operator_id: int) -> NodeOperator:
+        return NodeOperator(
+            **{
+                name: getattr(self[node_operator_id], name)
+                for name in self._columns
+            }
+        )
+
+    def get_values(self, name: str, node_operator_ids: np.ndarray) -> np.ndarray:
+        # a copy of the column cells of the operators, in the order of the ids
+        return self._view(name)[node_operator_ids]
+
+    def get_rewards_inputs(
+        self, timestamp: int
+    ) -> tuple[list[str], np.ndarray, np.ndarray]:
+        # the reward addresses, active validators and penalty flags of the active
+        # operators by id, see StakingModule.get_rewards_distribution
+        active = self._view("active") != 0
+        exited = self._view("exited_signing_keys_count")[active]
+        deposited = self._view("deposited_signing_keys_count")[active]
+        assert np.all(deposited >= exited)
+
+        penalized = (
+            self._view("refunded_validators_count")[active]
+            < self._view("stuck_validators_count")[active]
+        ) | (timestamp <= self._view("stuck_penalty_end_timestamp")[active])
+        reward_addresses = self._columns["reward_address"]
+        recipients = [reward_addresses[i] for i in np.flatnonzero(active).tolist()]
+        return recipients, deposited - exited, penalized
+
+    def get_allocation_buckets(self) -> tuple[list[int], list[int], list[int]]:
+        # the operators with keys left to deposit, their active keys and the most
+        # active keys they may have, see StakingModule
+        exited = self._view("exited_signing_keys_count")
+        deposited = self._view("deposited_signing_keys_count")
+        max_validators = self._view("max_validators_count")
+
+        with_keys_left = deposited != max_validators
+        exited = exited[with_keys_left]
+        return (
+            np.flatnonzero(with_keys_left).tolist(),
+            (deposited[with_keys_left] - exited).tolist(),
+            (max_validators[with_keys_left] - exited).tolist(),
+        )
+
+    # writes made inside a transaction are logged with the previous values of the
+    # cells and a rollback replays the log backwards. Operators appended by the
+    # transaction are cut off the columns.
+    def _begin_transaction(self) -> None:
+        self._savepoints.append((len(self._undo_log), self._size))
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+        if not self._savepoints:
+            self._undo_log.clear()
+
+    def _rollback_transaction(self) -> None:
+        mark, size = self._savepoints.pop()
+        undo_log = self._undo_log
+        while len(undo_log) > mark:
+            name, node_operator_id, value = undo_log.pop()
+            self._columns[name][node_operator_id] = value
+        if size < self._size:
+            for column in self._columns.values():
+                del column[size:]
+            self._size = size
+
+    def _view(self, name: str) -> np.ndarray:
+        # the view holds the buffer of the column, it must not outlive the call
+        column = self._columns[name]
+        return np.frombuffer(column, dtype=_DTYPES[column.typecode])
+
+    def _set(self, name: str, node_operator_id: int, value) -> None:
+        self._prepare_write()
+        column = self._columns[name]
+        if self._savepoints:
+            self._undo_log.append((name, node_operator_id, column[node_operator_id]))
+        column[node_operator_id] = value
+
+    def _prepare_write(self) -> None:
+        if self._shared:
+            self._columns = _copy_columns(self._columns)
+            self._shared = False
+
+
+def _copy_columns(
+    columns: dict[str, array | list[str]]
+) -> dict[str, array | list[str]]:
+    return {
+        name: array(column.typecode, column) if name in _TYPECODES else list(column)
+        for name, column in columns.items()
+    }
+
+
+class NodeOperatorView:
+    # a row of a NodeOperatorRegistry with the attributes of a NodeOperator
+    __slots__ = ("_registry", "_id")
+
+    def __init__(self, registry: NodeOperatorRegistry, node_operator_id: int) -> None:
+        self._registry = registry
+        self._id = node_operator_id
+
+
+def _value_field(name: str) -> property:
+    return property(
+        lambda view: view._registry._columns[name][view._id],
+        lambda view, value: view._registry._set(name, view._id, value),
+    )
+
+
+def _flag_field(name: str) -> property:
+    return property(
+        lambda view: view._registry._columns[name][view._id] != 0,
+        lambda view, value: view._registry._set(name, view._id, int(value)),
+    )
+
+
+for _name in COUNT_FIELDS + TEXT_FIELDS:
+    setattr(NodeOperatorView, _name, _value_field(_name))
+for _name in FLAG_FIELDS:
+    setattr(NodeOperatorView, _name, _flag_field(_name))
@@ -0,0 +1,422 @@
+from array import array
+from collections.abc import Iterable, Iterator, MutableMapping
+from zlib import crc32
+import numpy as np
+
+UINT64_BITS: int = 64
+UINT64_MASK: int = 2**64 - 1
+UINT32_BITS: int = 32
+UINT32_MASK: int = 2**32 - 1
+
+NO_ACCOUNT: int = -1
+
+
+def _copy_buffer(typecode: str, buffer) -> array:
+    copied = array(typecode)
+    copied.frombytes(memoryview(buffer).cast("B"))
+    return copied
+
+
+class AccountIndex:
+    # Interns account addresses into dense ids. Encoded addresses are packed into a
+    # single blob and found through an open addressing table of ids, keyed by crc32
+    # of the address, so an account costs its address plus ~24 bytes and the whole
+    # index can be stored and memory-mapped as is. The index is append-only and
+    # shared by all the forks of a ledger: an id is never reused and forks adding
+    # different accounts never clash. Ids of recently used accounts are cached in a
+    # small dict, as simulations touch the same few contracts over and over.
+    MIN_TABLE_SIZE: int = 1024
+    CACHE_SIZE: int = 4096
+
+    _blob: bytearray | memoryview
+    _offsets: array | memoryview
+    _hashes: array | memoryview
+    _table: array | memoryview
+    _mutable: bool
+    _cache: dict[str, int]
+
+    def __init__(self) -> None:
+        self._blob = bytearray()
+        self._offsets = array("Q", [0])
+        self._hashes = array("I")
+        self._table = array("i", [NO_ACCOUNT]) * self.MIN_TABLE_SIZE
+        self._mutable = True
+        self._cache = {}
+
+    @staticmethod
+    def from_buffers(blob, offsets, hashes, table) -> "AccountIndex":
+        # the buffers may be read-only (e.g. memory-mapped), they are copied on write
+        assert len(offsets) == len(hashes) + 1, "CORRUPTED_INDEX"
+        assert 2 * len(hashes) <= len(table), "CORRUPTED_INDEX"
+
+        index = AccountIndex.__new__(AccountIndex)
+        index._blob = blob
+        index._offsets = offsets
+        index._hashes = hashes
+        index._table = table
+        index._mutable = False
+        index._cache = {}
+        return index
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __deepcopy__(self, memo: dict) -> "AccountIndex":
+        return self
+
+    def __reduce__(self):
+        return (
+            AccountIndex.from_buffers,
+            (
+                bytearray(self._blob),
+                _copy_buffer("Q", self._offsets),
+                _copy_buffer("I", self._hashes),
+                _copy_buffer("i", self._table),
+            ),
+        )
+
+    def get_id(self, account: str) -> int | None:
+        account_id = self._cache.get(account)
+        if account_id is not None:
+            return account_id
+
+        encoded = account.encode()
+        account_id = self._find(encoded, crc32(encoded))[1]
+        if account_id == NO_ACCOUNT:
+            return None
+        self._remember(account, account_id)
+        return account_id
+
+    def get_account(self, account_id: int) -> str:
+        offsets = self._offsets
+        return str(self._blob[offsets[account_id] : offsets[account_id + 1]], "utf-8")
+
+    def get_accounts(self, ids: list[int]) -> list[str]:
+        blob = bytes(self._blob)
+        offsets = self._offsets.tolist()
+        return [
+            blob[offsets[account_id] : offsets[account_id + 1]].decode()
+            for account_id in ids
+        ]
+
+    def intern(self, account: str) -> int:
+        account_id = self._cache.get(account)
+        if account_id is not None:
+            return account_id
+
+        encoded = account.encode()
+        account_hash = crc32(encoded)
+        slot, account_id = self._find(encoded, account_hash)
+        if account_id != NO_ACCOUNT:
+            self._remember(account, account_id)
+            return account_id
+
+        if not self._mutable:
+            self._blob = bytearray(self._blob)
+            self._offsets = _copy_buffer("Q", self._offsets)
+            self._hashes = _copy_buffer("I", self._hashes)
+            self._table = _copy_buffer("i", self._table)
+            self._mutable = True
+
+        account_id = len(self._hashes)
+        self._blob += encoded
+        self._offsets.append(len(self._blob))
+        self._hashes.append(account_hash)
+        self._table[slot] = account_id
+
+        # the table is kept at most half full
+        if 2 * len(self._hashes) > len(self._table):
+            self._rehash(2 * len(self._table))
+        self._remember(account, account_id)
+        return account_id
+
+    def _remember(self, account: str, account_id: int) -> None:
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[account] = account_id
+
+    def _find(self, encoded: bytes, account_hash: int) -> tuple[int, int]:
+        # returns the slot of the account and its id, or the free slot for it
+        table, hashes, offsets, blob = (
+            self._table,
+            self._hashes,
+            self._offsets,
+            self._blob,
+        )
+        mask = len(table) - 1
+        slot = account_hash & mask
+        while True:
+            account_id = table[slot]
+            if account_id == NO_ACCOUNT:
+                return slot, NO_ACCOUNT
+            if (
+                hashes[account_id] == account_hash
+                and blob[offsets[account_id] : offsets[account_id + 1]] == encoded
+            ):
+                return slot, account_id
+            slot = (slot + 1) & mask
+
+    def _rehash(self, size: int) -> None:
+        table = array("i", [NO_ACCOUNT]) * size
+        mask = size - 1
+        for account_id, account_hash in enumerate(self._hashes):
+            slot = account_hash & mask
+            while table[slot] != NO_ACCOUNT:
+                slot = (slot + 1) & mask
+            table[slot] = account_id
+        self._table = table
+
+
+class ShareLedger(MutableMapping):
+    # Shares of every account are stored by account id in growable uint64 columns as
+    # two limbs (low and high 64 bits), so amounts up to 2**128 are kept exactly.
+    # Whole-ledger scans run over zero-copy numpy views of the columns. Missing
+    # accounts hold zero shares and reading them inserts nothing.
+    MAX_SHARES: int = 2**128
+
+    _index: AccountIndex
+    _low: array | memoryview
+    _high: array | memoryview
+    _known: array | memoryview
+    _size: int
+    _shared: bool
+    _undo_log: list[tuple[int, int, int, int]]
+    _savepoints: list[tuple[int, int]]
+
+    def __init__(self, index: AccountIndex | None = None) -> None:
+        self._index = AccountIndex() if index is None else index
+        self._low = array("Q")
+        self._high = array("Q")
+        self._known = array("B")
+        self._size = 0
+        self._shared = False
+        self._undo_log = []
+        self._savepoints = []
+
+    @staticmethod
+    def from_columns(index: AccountIndex, low, high, known) -> "ShareLedger":
+        # the columns may be read-only (e.g. memory-mapped), they are copied on write
+        assert len(low) == len(high) == len(known) <= len(index), "CORRUPTED_LEDGER"
+
+        ledger = ShareLedger.__new__(ShareLedger)
+        ledger._index = index
+        ledger._low = low
+        ledger._high = high
+        ledger._known = known
+        ledger._size = int(np.count_nonzero(np.frombuffer(known, dtype=np.uint8)))
+        ledger._shared = True
+        ledger._undo_log = []
+        ledger._savepoints = []
+        return ledger
+
+    def fork(self) -> "ShareLedger":
+        assert not self._savepoints, "FORK_INSIDE_TRANSACTION"
+
+        # both ledgers keep the columns until the first write
+        self._shared = True
+        return ShareLedger.from_columns(self._index, self._low, self._high, self._known)
+
+    def get_index(self) -> AccountIndex:
+        return self._index
+
+    def get_ids(self, accounts: Iterable[str]) -> np.ndarray:
+        # accounts missing from the ledger get NO_ACCOUNT
+        get_known_id = self._get_known_id
+        return np.fromiter(
+            (get_known_id(account) for account in accounts), dtype=np.int64
+        )
+
+    def get_accounts(self, ids: np.ndarray | None = None) -> list[str]:
+        if ids is None:
+            ids = self.get_known_ids()
+        return self._index.get_accounts(ids.tolist())
+
+    def get_known_ids(self) -> np.ndarray:
+        return np.flatnonzero(np.frombuffer(self._known, dtype=np.uint8))
+
+    def get_shares_array(self, ids: np.ndarray | None = None) -> np.ndarray:
+        # exact shares as an object array of ints in the order of ids
+        if ids is None:
+            ids = self.get_known_ids()
+        known = ids != NO_ACCOUNT
+        shares = np.zeros(len(ids), dtype=object)
+        low = np.frombuffer(self._low, dtype=np.uint64)[ids[known]].astype(object)
+        high = np.frombuffer(self._high, dtype=np.uint64)[ids[known]].astype(object)
+        shares[known] = low + (high << UINT64_BITS)
+        return shares
+
+    def sum_shares(self, ids: np.ndarray | None = None) -> int:
+        # 32-bit halves of the limbs are summed separately, so the uint64 sums
+        # can't overflow for less than 2**32 accounts
+        low = np.frombuffer(self._low, dtype=np.uint64)
+        high = np.frombuffer(self._high, dtype=np.uint64)
+        if ids is not None:
+            ids = ids[ids != NO_ACCOUNT]
+            low, high = low[ids], high[ids]
+
+        total = 0
+        for limb, shift in ((low, 0), (high, UINT64_BITS)):
+            for half, half_shift in (
+                (limb & np.uint64(UINT32_MASK), 0),
+                (limb >> np.uint64(UINT32_BITS), UINT32_BITS),
+            ):
+                total += int(half.sum(dtype=np.uint64)) << (shift + half_shift)
+        return total
+
+    def set_many(self, accounts: Iterable[str], shares: Iterable[int]) -> None:
+        # same as assigning the entries one by one, but the columns are written in bulk
+        intern = self._index.intern
+        ids = np.fromiter((intern(account) for account in accounts), dtype=np.int64)
+        shares = list(shares)
+        assert len(ids) == len(shares), "WRONG_INPUT_LENGTHS"
+        if not shares:
+            return
+        assert 0 <= min(shares) and max(shares) < self.MAX_SHARES, "SHARES_OVERFLOW"
+
+        self._prepare_write(int(ids.max()))
+        low = np.frombuffer(self._low, dtype=np.uint64)
+        high = np.frombuffer(self._high, dtype=np.uint64)
+        known = np.frombuffer(self._known, dtype=np.uint8)
+
+        if self._savepoints:
+            self._undo_log.extend(
+                zip(
+                    ids.tolist(),
+                    known[ids].tolist(),
+                    low[ids].tolist(),
+                    high[ids].tolist(),
+                )
+            )
+
+        unique_ids = np.unique(ids)
+        self._size += len(unique_ids) - int(np.count_nonzero(known[unique_ids]))
+        known[ids] = 1
+        low[ids] = np.array([value & UINT64_MASK for value in shares], dtype=np.uint64)
+        high[ids] = np.array(
+            [value >> UINT64_BITS for value in shares], dtype=np.uint64
+        )
+
+    def drop_zeros(self) -> int:
+        # entries holding no shares are removed, the accounts stay interned
+        low = np.frombuffer(self._low, dtype=np.uint64)
+        high = np.frombuffer(self._high, dtype=np.uint64)
+        known = np.frombuffer(self._known, dtype=np.uint8)
+        ids = np.flatnonzero((known != 0) & (low == 0) & (high == 0))
+        if not len(ids):
+            return 0
+
+        self._prepare_write(int(ids.max()))
+        known = np.frombuffer(self._known, dtype=np.uint8)
+        if self._savepoints:
+            self._undo_log.extend((account_id, 1, 0, 0) for account_id in ids.tolist())
+        known[ids] = 0
+        self._size -= len(ids)
+        return len(ids)
+
+    def get(self, account: str, default=None):
+        account_id = self._get_known_id(account)
+        return default if account_id == NO_ACCOUNT else self._get_value(account_id)
+
+    def __getitem__(self, account: str) -> int:
+        account_id = self._get_known_id(account)
+        return 0 if account_id == NO_ACCOUNT else self._get_value(account_id)
+
+    def __setitem__(self, account: str, shares: int) -> None:
+        assert 0 <= shares < self.MAX_SHARES, "SHARES_OVERFLOW"
+        self._set_value(self._index.intern(account), 1, shares)
+
+    def __delitem__(self, account: str) -> None:
+        account_id = self._get_known_id(account)
+        if account_id == NO_ACCOUNT:
+            raise KeyError(account)
+        self._set_value(account_id, 0, 0)
+
+    def __contains__(self, account) -> bool:
+        return self._get_known_id(account) != NO_ACCOUNT
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.get_accounts())
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __deepcopy__(self, memo: dict) -> "ShareLedger":
+        return self.fork()
+
+    def __reduce__(self):
+        return (
+            ShareLedger.from_columns,
+            (
+                self._index,
+                _copy_buffer("Q", self._low),
+                _copy_buffer("Q", self._high),
+                _copy_buffer("B", self._known),
+            ),
+        )
+
+    # writes made inside a transaction are logged with the previous values of the
+    # entries and a rollback replays the log backwards. Accounts interned by a
+    # reverted write stay in the index, they just hold no entry.
+    def _begin_transaction(self) -> None:
+        self._savepoints.append((len(self._undo_log), self._size))
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+        if not self._savepoints:
+            self._undo_log.clear()
+
+    def _rollback_transaction(self) -> None:
+        mark, self._size = self._savepoints.pop()
+        undo_log = self._undo_log
+        while len(undo_log) > mark:
+            account_id, known, low, high = undo_log.pop()
+            self._known[account_id] = known
+            self._low[account_id] = low
+            self._high[account_id] = high
+
+    def _get_known_id(self, account: str) -> int:
+        account_id = self._index.get_id(account)
+        if (
+            account_id is None
+            or account_id >= len(self._known)
+            or not self._known[account_id]
+        ):
+            return NO_ACCOUNT
+        return account_id
+
+    def _get_value(self, account_id: int) -> int:
+        return self._low[account_id] | self._high[account_id] << UINT64_BITS
+
+    def _prepare_write(self, max_account_id: int) -> None:
+        if self._shared:
+            self._low = _copy_buffer("Q", self._low)
+            self._high = _copy_buffer("Q", self._high)
+            self._known = _copy_buffer("B", self._known)
+            self._shared = False
+
+        missing = max_account_id + 1 - len(self._known)
+        if missing > 0:
+            self._low.frombytes(bytes(8 * missing))
+            self._high.frombytes(bytes(8 * missing))
+            self._known.frombytes(bytes(missing))
+
+    def _set_value(self, account_id: int, known: int, shares: int) -> None:
+        self._prepare_write(account_id)
+
+        if self._savepoints:
+            self._undo_log.append(
+                (
+                    account_id,
+                    self._known[account_id],
+                    self._low[account_id],
+                    self._high[account_id],
+                )
+            )
+
+        self._size += known - self._known[account_id]
+        self._known[account_id] = known
+        self._low[account_id] = shares & UINT64_MASK
+        self._high[account_id] = shares >> UINT64_BITS
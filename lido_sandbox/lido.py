@@ -1,8 +1,14 @@
+import numpy as np
+from lido_sandbox.libs import AccountingKernel
+from lido_sandbox.contract import view
 from lido_sandbox.steth import StETH
 from lido_sandbox.staking_router import StakingRouter
 from lido_sandbox.locator import Locator
 from lido_sandbox.objects import (
+    EventType,
+    OracleReportBatch,
     OracleReportContext,
+    OracleReportSimulation,
     OracleReportedData,
     StakingRewardsDistribution,
 )
@@ -22,11 +28,13 @@ class Lido(StETH):
     _locator: Locator
 
     DEPOSIT_SIZE: int = 32 * 10**18
+    SHARE_RATE_PRECISION_E27: int = 10**27
 
     def __init__(self, locator: Locator, address: str):
         super().__init__(address)
         self._locator = locator
 
+    @view
     def get_buffered_ether(self) -> int:
         return self._get_buffered_ether()
 
@@ -43,6 +51,9 @@ class Lido(StETH):
     def submit(self, sender: str, value: int):
         return self._submit(sender, value)
 
+    def submit_many(self, senders: list[str], values: list[int]) -> list[int]:
+        return self._submit_many(senders, values)
+
     def receive_el_rewards(self, msg_value: int):
         self._total_el_rewards_collected = self._total_el_rewards_collected + msg_value
 
@@ -75,16 +86,115 @@ class Lido(StETH):
             )
         )
 
+    def simulate_oracle_report(
+        self,
+        report_timestamp: int,
+        time_elapsed: int,
+        cl_validators: int,
+        cl_balance: int,
+        withdrawal_vault_balance: int,
+        el_rewards_vault_balance: int,
+        shares_requested_to_burn: int,
+        withdrawal_finalization_batches: list[int],
+        simulated_share_rate: int,
+    ) -> OracleReportSimulation:
+        # the report is handled in a transaction that is always rolled back, so the
+        # world is left untouched without being copied
+        report_context = OracleReportContext()
+        world = self._world
+        world.begin_transaction()
+        try:
+            (
+                post_total_pooled_ether,
+                post_total_shares,
+                withdrawals,
+                el_rewards,
+            ) = self._handle_oracle_report(
+                OracleReportedData(
+                    report_timestamp,
+                    time_elapsed,
+                    cl_validators,
+                    cl_balance,
+                    withdrawal_vault_balance,
+                    el_rewards_vault_balance,
+                    shares_requested_to_burn,
+                    withdrawal_finalization_batches,
+                    simulated_share_rate,
+                ),
+                report_context,
+            )
+        finally:
+            world.rollback_transaction()
+
+        return OracleReportSimulation(
+            post_total_pooled_ether,
+            post_total_shares,
+            withdrawals,
+            el_rewards,
+            report_context.shares_minted_as_fees or 0,
+            report_context.module_ids,
+            report_context.module_rewards,
+            report_context.treasury_rewards,
+            post_total_pooled_ether
+            * self.SHARE_RATE_PRECISION_E27
+            // post_total_shares,
+        )
+
+    def simulate_oracle_reports(
+        self,
+        cl_validators,
+        cl_balance,
+        withdrawal_vault_balance,
+        el_rewards_vault_balance,
+        shares_requested_to_burn=0,
+        ether_to_lock_on_withdrawal_queue=0,
+        shares_to_burn_from_withdrawal_queue=0,
+    ) -> OracleReportBatch:
+        # alternative reports on the current state at once: every argument is an
+        # array or a scalar, the withdrawal finalization is given as its ether to
+        # lock and shares to burn
+        _, _, _, total_fee, precision_points = (
+            self._locator.staking_router.get_staking_rewards_distribution()
+        )
+        assert np.all(
+            AccountingKernel.as_array(cl_validators) <= self._deposited_validators
+        ), "REPORTED_MORE_DEPOSITED"
+
+        batch = AccountingKernel.handle_oracle_reports(
+            self._get_total_pooled_ether(),
+            self._get_total_shares(),
+            self._cl_balance,
+            self._cl_validators,
+            cl_validators,
+            cl_balance,
+            withdrawal_vault_balance,
+            el_rewards_vault_balance,
+            shares_requested_to_burn,
+            self._locator.oracle_report_sanity_checker.get_max_positive_token_rebase(),
+            total_fee,
+            precision_points,
+            ether_to_lock_on_withdrawal_queue,
+            shares_to_burn_from_withdrawal_queue,
+        )
+        assert np.all(
+            batch.shares_to_burn <= self._shares_of(self._locator.burner.address)
+        )
+        return batch
+
+    @view
     def get_total_el_rewards_collected(self) -> int:
         return self._total_el_rewards_collected
 
+    @view
     def get_beacon_stat(self) -> tuple[int, int, int]:
         return self._deposited_validators, self._cl_validators, self._cl_balance
 
+    @view
     def can_deposit(self) -> bool:
         withdrawal_queue = self._locator.withdrawal_queue
         return not withdrawal_queue.is_bunker_mode_active()
 
+    @view
     def get_depositable_ether(self) -> int:
         withdrawal_queue = self._locator.withdrawal_queue
         buffered_ether = self._get_buffered_ether()
@@ -113,12 +223,42 @@ class Lido(StETH):
 
             new_deposited_validators = self._deposited_validators + deposits_count
             self._deposited_validators = new_deposited_validators
+            self._invalidate_share_rate()
 
         staking_router.deposit(deposits_value, deposits_count, staking_module_id)
 
+    def deposit_all(self, max_deposits_count: int) -> list[int]:
+        # deposits into every active module at once, the deposits are allocated across
+        # the modules in a single pass, returns the deposits of each module
+        assert self.can_deposit(), "CAN_NOT_DEPOSIT"
+
+        staking_router = self._locator.staking_router
+        staking_module_ids, deposits_counts = (
+            staking_router.get_staking_modules_deposits_counts(
+                min(
+                    max_deposits_count,
+                    self.get_depositable_ether() // self.DEPOSIT_SIZE,
+                )
+            )
+        )
+        deposits_count = sum(deposits_counts)
+
+        deposits_value = 0
+        if deposits_count > 0:
+            deposits_value = deposits_count * self.DEPOSIT_SIZE
+            self._buffered_ether = self._get_buffered_ether() - deposits_value
+
+            new_deposited_validators = self._deposited_validators + deposits_count
+            self._deposited_validators = new_deposited_validators
+            self._invalidate_share_rate()
+
+        staking_router.deposit_many(deposits_value, staking_module_ids, deposits_counts)
+        return deposits_counts
+
+    @view
     def get_fee_distribution(self) -> tuple[int, int, int]:
         staking_router = self._locator.staking_router
-        total_basis_points: int = staking_router.total_basis_points()
+        total_basis_points: int = staking_router.TOTAL_BASIS_POINTS
         total_fee: int = staking_router.get_total_fee_e4_precision()
         (
             treasury_fee_basis_points_abs,
@@ -160,6 +300,7 @@ class Lido(StETH):
 
         pre_cl_balance = pre_cl_balance + appeared_validators * self.DEPOSIT_SIZE
         self._cl_balance = post_cl_balance
+        self._invalidate_share_rate()
 
         return pre_cl_balance
 
@@ -229,7 +370,12 @@ class Lido(StETH):
                 post_cl_total_balance - report_context.pre_cl_balance
             )
 
-            shares_minted_as_fees = self._distribute_fee(
+            (
+                shares_minted_as_fees,
+                report_context.module_ids,
+                report_context.module_rewards,
+                report_context.treasury_rewards,
+            ) = self._distribute_fee(
                 report_context.pre_total_pooled_ether,
                 report_context.pre_total_shares,
                 consensus_layer_rewards + withdrawn_el_rewards,
@@ -245,6 +391,67 @@ class Lido(StETH):
 
         return shares_amount
 
+    def _submit_many(self, senders: list[str], values: list[int]) -> list[int]:
+        assert len(senders) == len(values)
+
+        # rounding moves the share rate a bit with every submit, so the totals are
+        # rolled forward exactly as the sequential calls would do
+        total_pooled_ether, total_shares = self._get_share_rate()
+        shares_amounts = []
+        tokens_amounts = []
+        minted = {}
+        for sender, value in zip(senders, values):
+            assert value > 0
+
+            shares_amount = value * total_shares // total_pooled_ether
+            shares_amounts.append(shares_amount)
+            minted[sender] = minted.get(sender, 0) + shares_amount
+
+            total_shares += shares_amount
+            # the sequential submit emits its transfer before the ether is buffered
+            tokens_amounts.append(shares_amount * total_pooled_ether // total_shares)
+            total_pooled_ether += value
+
+        shares_before = [self._shares_of(sender) for sender in minted]
+        self._total_shares = total_shares
+        self._invalidate_share_rate()
+        self._shares.set_many(
+            minted.keys(),
+            [
+                account_shares + shares
+                for account_shares, shares in zip(shares_before, minted.values())
+            ],
+        )
+        self._set_buffered_ether(self.get_buffered_ether() + sum(values))
+
+        if self._holder_index is not None:
+            for (sender, shares), account_shares in zip(minted.items(), shares_before):
+                self._holder_index.update(
+                    sender, account_shares, account_shares + shares
+                )
+
+        if self._share_history.is_tracking_accounts():
+            tokens_received = dict.fromkeys(minted, 0)
+            for sender, tokens_amount in zip(senders, tokens_amounts):
+                tokens_received[sender] += tokens_amount
+            for (sender, shares), account_shares in zip(minted.items(), shares_before):
+                self._share_history.checkpoint(
+                    sender,
+                    account_shares,
+                    account_shares + shares,
+                    tokens_received[sender],
+                )
+
+        if self._event_log is not None:
+            for sender, shares_amount, tokens_amount in zip(
+                senders, shares_amounts, tokens_amounts
+            ):
+                self._emit_transfer_events(
+                    self.ZERO_ADDRESS, sender, shares_amount, tokens_amount
+                )
+
+        return shares_amounts
+
     def _get_staking_rewards_distribution(
         self,
     ) -> tuple[StakingRewardsDistribution, StakingRouter]:
@@ -270,9 +477,12 @@ class Lido(StETH):
 
     def _distribute_fee(
         self, pre_total_pooled_ether: int, pre_total_shares: int, total_rewards: int
-    ) -> int:
+    ) -> tuple[int, list[int], list[int], int]:
+        # returns the minted shares and their split between the modules and treasury
         rewards_distribution, router = self._get_staking_rewards_distribution()
         shares_minted_as_fees = 0
+        module_rewards = [0] * len(rewards_distribution.module_ids)
+        treasury_rewards = 0
 
         if rewards_distribution.total_fee > 0:
             total_pooled_ether_with_rewards = pre_total_pooled_ether + total_rewards
@@ -298,15 +508,19 @@ class Lido(StETH):
                 shares_minted_as_fees,
             )
 
-            self._transfer_treasury_rewards(
-                shares_minted_as_fees - total_module_rewards
-            )
+            treasury_rewards = shares_minted_as_fees - total_module_rewards
+            self._transfer_treasury_rewards(treasury_rewards)
 
             router.report_rewards_minted(
                 rewards_distribution.module_ids, module_rewards
             )
 
-        return shares_minted_as_fees
+        return (
+            shares_minted_as_fees,
+            rewards_distribution.module_ids,
+            module_rewards,
+            treasury_rewards,
+        )
 
     def _transfer_module_rewards(
         self,
@@ -338,6 +552,7 @@ class Lido(StETH):
 
     def _set_buffered_ether(self, value: int) -> None:
         self._buffered_ether = value
+        self._invalidate_share_rate()
 
     def _get_transient_balance(self) -> int:
         assert self._deposited_validators >= self._cl_validators
@@ -351,14 +566,17 @@ class Lido(StETH):
         )
 
     def _handle_oracle_report(
-        self, reported_data: OracleReportedData
+        self,
+        reported_data: OracleReportedData,
+        report_context: OracleReportContext | None = None,
     ) -> tuple[int, int, int, int]:
         withdrawal_queue = self._locator.withdrawal_queue
         burner = self._locator.burner
         oracle_report_sanity_checker = self._locator.oracle_report_sanity_checker
         post_token_rebase_receiver = self._locator.post_token_rebase_receiver
 
-        report_context = OracleReportContext()
+        if report_context is None:
+            report_context = OracleReportContext()
 
         # Step 1.
         # Take a snapshot of the current (pre-) state
@@ -479,6 +697,10 @@ class Lido(StETH):
         post_total_shares = self._get_total_shares()
         post_total_pooled_ether = self._get_total_pooled_ether()
 
+        self._share_history.append_report(
+            reported_data.report_timestamp, post_total_pooled_ether, post_total_shares
+        )
+
         if post_token_rebase_receiver is not None:
             post_token_rebase_receiver.handle_post_token_rebase(
                 reported_data.report_timestamp,
@@ -490,6 +712,22 @@ class Lido(StETH):
                 report_context.shares_minted_as_fees,
             )
 
+        if self._event_log is not None:
+            self._event_log.emit(
+                EventType.TokenRebased,
+                self.address,
+                (),
+                (
+                    reported_data.report_timestamp,
+                    reported_data.time_elapsed,
+                    report_context.pre_total_shares,
+                    report_context.pre_total_pooled_ether,
+                    post_total_shares,
+                    post_total_pooled_ether,
+                    report_context.shares_minted_as_fees,
+                ),
+            )
+
         return post_total_shares, post_total_pooled_ether
 
     def _bootstrap_initial_holder(self) -> None:
@@ -1,10 +1,20 @@
+from copy import deepcopy
 from lido_sandbox.contract import Contract
+from lido_sandbox.report_metrics import ReportMetrics
+from lido_sandbox.world import World
 
 
 class Locator(Contract):
+    world: World
+
+    _transactional: bool = False
+
     def __init__(self, address: str) -> None:
         super().__init__(address)
 
+        self.world = World()
+        self.world.register(self)
+
         from lido_sandbox.accounting_oracle import AccountingOracle
         from lido_sandbox.burner import Burner
         from lido_sandbox.el_rewards_vault import ElRewardsVault
@@ -30,3 +40,61 @@ class Locator(Contract):
         self.treasury = Treasury(address="treasury")
         self.withdrawal_queue = WithdrawalQueue(address="withdrawal_queue")
         self.withdrawal_vault = WithdrawalVault(address="withdrawal_vault")
+
+        for contract in (
+            self.accounting_oracle,
+            self.burner,
+            self.el_rewards_vault,
+            self.lido,
+            self.oracle_report_sanity_checker,
+            self.post_token_rebase_receiver,
+            self.staking_router,
+            self.treasury,
+            self.withdrawal_queue,
+            self.withdrawal_vault,
+        ):
+            self.world.register(contract)
+
+    def enable_report_metrics(
+        self,
+        window: int = ReportMetrics.DEFAULT_WINDOW,
+        capacity: int = ReportMetrics.DEFAULT_CAPACITY,
+    ) -> ReportMetrics:
+        # the recorder takes the place of the post token rebase receiver, the plain
+        # receiver stays registered and is put back by disable_report_metrics. A
+        # recorder enabled again keeps its metrics and window
+        from lido_sandbox.report_metrics_recorder import ReportMetricsRecorder
+
+        address = "report_metrics_recorder"
+        if not self.world.has_contract(address):
+            self.world.register(ReportMetricsRecorder(self, address, window, capacity))
+
+        recorder = self.world.get_contract(address)
+        if self.post_token_rebase_receiver is not recorder:
+            recorder._sync_treasury_shares()
+            self.post_token_rebase_receiver = recorder
+        return recorder.get_metrics()
+
+    def disable_report_metrics(self) -> None:
+        self.post_token_rebase_receiver = self.world.get_contract(
+            "post_token_rebase_receiver"
+        )
+
+    def fork(self) -> "Locator":
+        assert self.world.get_transaction_depth() == 0, "FORK_INSIDE_TRANSACTION"
+
+        # ledgers are copy-on-write, so forking costs the same for any world size
+        forked = deepcopy(self)
+        forked.world._inherit_hooks(self.world)
+        return forked
+
+    def save_snapshot(self, path: str) -> None:
+        from lido_sandbox.snapshot import save_snapshot
+
+        save_snapshot(self, path)
+
+    @staticmethod
+    def load_snapshot(path: str) -> "Locator":
+        from lido_sandbox.snapshot import load_snapshot
+
+        return load_snapshot(path)
@@ -1,8 +1,11 @@
 from lido_sandbox.objects.batches_calculation_state import BatchesCalculationState
 from lido_sandbox.objects.checkpoint import Checkpoint
+from lido_sandbox.objects.event import EVENT_SCHEMAS, Event, EventType
 from lido_sandbox.objects.limits_list_packed import LimitsListPacked
 from lido_sandbox.objects.node_operator import NodeOperator, NodeOperatorSummary
+from lido_sandbox.objects.oracle_report_batch import OracleReportBatch
 from lido_sandbox.objects.oracle_report_context import OracleReportContext
+from lido_sandbox.objects.oracle_report_simulation import OracleReportSimulation
 from lido_sandbox.objects.oracle_reported_data import OracleReportedData
 from lido_sandbox.objects.staking_module import (
     StakingModuleData,
@@ -0,0 +1,54 @@
+from enum import Enum
+
+
+class EventType(Enum):
+    Transfer = 0
+    TransferShares = 1
+    SharesBurnt = 2
+    TokenRebased = 3
+    WithdrawalRequested = 4
+    WithdrawalsFinalized = 5
+    DepositedSigningKeysCountChanged = 6
+
+
+# (indexed address fields, value fields) of every event, in emission order
+EVENT_SCHEMAS: dict[EventType, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    EventType.Transfer: (("from", "to"), ("value",)),
+    EventType.TransferShares: (("from", "to"), ("shares_value",)),
+    EventType.SharesBurnt: (
+        ("account",),
+        ("pre_rebase_token_amount", "post_rebase_token_amount", "shares_amount"),
+    ),
+    EventType.TokenRebased: (
+        (),
+        (
+            "report_timestamp",
+            "time_elapsed",
+            "pre_total_shares",
+            "pre_total_ether",
+            "post_total_shares",
+            "post_total_ether",
+            "shares_minted_as_fees",
+        ),
+    ),
+    EventType.WithdrawalRequested: (
+        ("requestor", "owner"),
+        ("request_id", "amount_of_steth", "amount_of_shares"),
+    ),
+    EventType.WithdrawalsFinalized: (
+        (),
+        ("from", "to", "amount_of_eth_locked", "shares_to_burn", "timestamp"),
+    ),
+    EventType.DepositedSigningKeysCountChanged: (
+        (),
+        ("node_operator_id", "deposited_validators_count"),
+    ),
+}
+
+
+class Event:
+    def __init__(self, seq: int, event_type: EventType, emitter: str, args: dict):
+        self.seq = seq
+        self.event_type = event_type
+        self.emitter = emitter
+        self.args = args
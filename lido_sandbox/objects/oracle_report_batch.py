@@ -0,0 +1,21 @@
+import numpy as np
+
+
+class OracleReportBatch:
+    def __init__(
+        self,
+        post_total_pooled_ether: np.ndarray,
+        post_total_shares: np.ndarray,
+        withdrawals: np.ndarray,
+        el_rewards: np.ndarray,
+        simulated_shares_to_burn: np.ndarray,
+        shares_to_burn: np.ndarray,
+        shares_minted_as_fees: np.ndarray,
+    ):
+        self.post_total_pooled_ether = post_total_pooled_ether
+        self.post_total_shares = post_total_shares
+        self.withdrawals = withdrawals
+        self.el_rewards = el_rewards
+        self.simulated_shares_to_burn = simulated_shares_to_burn
+        self.shares_to_burn = shares_to_burn
+        self.shares_minted_as_fees = shares_minted_as_fees
@@ -10,6 +10,9 @@ class OracleReportContext:
         simulated_shares_to_burn: int = 0,
         shares_to_burn: int = 0,
         shares_minted_as_fees: int = 0,
+        module_ids: list[int] | None = None,
+        module_rewards: list[int] | None = None,
+        treasury_rewards: int = 0,
     ):
         self.pre_cl_validators = pre_cl_validators
         self.pre_cl_balance = pre_cl_balance
@@ -20,3 +23,6 @@ class OracleReportContext:
         self.simulated_shares_to_burn = simulated_shares_to_burn
         self.shares_to_burn = shares_to_burn
         self.shares_minted_as_fees = shares_minted_as_fees
+        self.module_ids = [] if module_ids is None else module_ids
+        self.module_rewards = [] if module_rewards is None else module_rewards
+        self.treasury_rewards = treasury_rewards
@@ -0,0 +1,22 @@
+class OracleReportSimulation:
+    def __init__(
+        self,
+        post_total_pooled_ether: int,
+        post_total_shares: int,
+        withdrawals: int,
+        el_rewards: int,
+        shares_minted_as_fees: int,
+        module_ids: list[int],
+        module_rewards: list[int],
+        treasury_rewards: int,
+        share_rate: int,
+    ):
+        self.post_total_pooled_ether = post_total_pooled_ether
+        self.post_total_shares = post_total_shares
+        self.withdrawals = withdrawals
+        self.el_rewards = el_rewards
+        self.shares_minted_as_fees = shares_minted_as_fees
+        self.module_ids = module_ids
+        self.module_rewards = module_rewards
+        self.treasury_rewards = treasury_rewards
+        self.share_rate = share_rate
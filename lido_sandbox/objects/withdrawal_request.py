@@ -7,14 +7,14 @@ class WithdrawalRequest:
         cumulative_steth: int = 0,
         cumulative_shares: int = 0,
         owner: str = "nobody",
-        timestamp: int = int(time()),
+        timestamp: int | None = None,
         claimed: bool = True,
         report_timestamp: int = 0,
     ) -> None:
         self.cumulative_steth = cumulative_steth
         self.cumulative_shares = cumulative_shares
         self.owner = owner
-        self.timestamp = timestamp
+        self.timestamp = int(time()) if timestamp is None else timestamp
         self.claimed = claimed
         self.report_timestamp = report_timestamp
 
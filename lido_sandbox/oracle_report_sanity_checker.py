@@ -1,33 +1,42 @@
 from lido_sandbox.libs import PositiveTokenRebaseLimiter
 from lido_sandbox.objects import LimitsListPacked
-from lido_sandbox.contract import Contract
+from lido_sandbox.contract import Contract, view
 
 
 class OracleReportSanityChecker(Contract):
+    _limits: LimitsListPacked
+
     def __init__(self, address: str) -> None:
         super().__init__(address)
 
-    _limits = LimitsListPacked(
-        churn_validators_per_day_limit=20000,
-        one_off_cl_balance_decrease_bp_limit=500,
-        annual_balance_increase_bp_limit=1000,
-        simulated_share_rate_deviation_bp_limit=50,
-        max_validator_exit_requests_per_report=600,
-        max_accounting_extra_data_list_items_count=2,
-        max_node_operators_per_extra_data_item_count=100,
-        request_timestamp_margin=7680,
-        max_positive_token_rebase=750000,
-    )
+        self._limits = LimitsListPacked(
+            churn_validators_per_day_limit=20000,
+            one_off_cl_balance_decrease_bp_limit=500,
+            annual_balance_increase_bp_limit=1000,
+            simulated_share_rate_deviation_bp_limit=50,
+            max_validator_exit_requests_per_report=600,
+            max_accounting_extra_data_list_items_count=2,
+            max_node_operators_per_extra_data_item_count=100,
+            request_timestamp_margin=7680,
+            max_positive_token_rebase=750000,
+        )
 
+    @view
     def check_simulated_share_rate(self, *args):
         pass
 
+    @view
     def check_accounting_oracle_report(self, *args):
         pass
 
+    @view
     def get_max_positive_token_rebase(self):
         return self._limits.max_positive_token_rebase
 
+    def set_max_positive_token_rebase(self, max_positive_token_rebase: int) -> None:
+        assert max_positive_token_rebase > 0, "INCORRECT_LIMIT_VALUE"
+        self._limits.max_positive_token_rebase = max_positive_token_rebase
+
     def smoothen_token_rebase(
         self,
         pre_total_pooled_ether: int,
@@ -78,5 +87,6 @@ class OracleReportSanityChecker(Contract):
 
         return withdrawals, el_rewards, simulated_shares_to_burn, shares_to_burn
 
+    @view
     def check_withdrawal_queue_oracle_report(self, *args):
         pass
@@ -0,0 +1,169 @@
+from collections.abc import Callable
+from functools import wraps
+from inspect import getattr_static
+from time import perf_counter_ns
+import pandas as pd
+from lido_sandbox.contract import Contract
+from lido_sandbox.hooks import register_hook
+from lido_sandbox.libs import MinFirstAllocationStrategy, PositiveTokenRebaseLimiter
+
+HOOK_PROFILER: str = "profiler"
+
+# libraries are shared by all the worlds of the process, so their static methods
+# are patched while at least one profiler is enabled
+PROFILED_LIBRARIES: tuple[type, ...] = (
+    MinFirstAllocationStrategy,
+    PositiveTokenRebaseLimiter,
+)
+
+_enabled_profilers: list["Profiler"] = []
+_running_profilers: list["Profiler"] = []
+_unpatched_libraries: dict[tuple[type, str], staticmethod] = {}
+
+
+class Profiler:
+    # Call tree nodes are keyed by the path of qualified method names from the entry
+    # point down to the method, e.g. ("Lido.deposit", "StakingRouter.deposit").
+    _nodes: dict[tuple[str, ...], list[int]]
+    _stack: list[tuple[tuple[str, ...], int]]
+
+    def __init__(self) -> None:
+        self._nodes = {}
+        self._stack = []
+
+    def __deepcopy__(self, memo: dict) -> "Profiler":
+        # forked worlds start with an empty profile of their own
+        return Profiler()
+
+    def __getstate__(self) -> dict:
+        return {"_nodes": self._nodes, "_stack": []}
+
+    def reset(self) -> None:
+        assert not self._stack, "PROFILER_IS_RUNNING"
+        self._nodes = {}
+
+    def get_calls_count(self, method: str) -> int:
+        return sum(node[0] for path, node in self._nodes.items() if path[-1] == method)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        df = self.call_tree_to_dataframe()
+        df = df.groupby("method", sort=False)[["calls", "total_time", "self_time"]]
+        df = df.sum().sort_values("total_time", ascending=False)
+        df["mean_time"] = df["total_time"] / df["calls"]
+        return df
+
+    def call_tree_to_dataframe(self) -> pd.DataFrame:
+        children_time = dict.fromkeys(self._nodes, 0)
+        for path, (_, total_ns) in self._nodes.items():
+            if len(path) > 1:
+                children_time[path[:-1]] += total_ns
+
+        rows = [
+            {
+                "entry_point": path[0],
+                "path": " > ".join(path),
+                "method": path[-1],
+                "depth": len(path) - 1,
+                "calls": calls,
+                "total_time": total_ns / 1e9,
+                "self_time": (total_ns - children_time[path]) / 1e9,
+            }
+            for path, (calls, total_ns) in self._nodes.items()
+        ]
+        return pd.DataFrame(
+            rows,
+            columns=[
+                "entry_point",
+                "path",
+                "method",
+                "depth",
+                "calls",
+                "total_time",
+                "self_time",
+            ],
+        )
+
+    def _enter(self, method: str) -> None:
+        if not self._stack:
+            _running_profilers.append(self)
+            path = (method,)
+        else:
+            path = self._stack[-1][0] + (method,)
+        self._stack.append((path, perf_counter_ns()))
+
+    def _exit(self) -> None:
+        path, started = self._stack.pop()
+        elapsed = perf_counter_ns() - started
+
+        node = self._nodes.get(path)
+        if node is None:
+            self._nodes[path] = [1, elapsed]
+        else:
+            node[0] += 1
+            node[1] += elapsed
+
+        if not self._stack:
+            _running_profilers.remove(self)
+
+
+def enable_library_profiling(profiler: Profiler) -> None:
+    if not _enabled_profilers:
+        for library in PROFILED_LIBRARIES:
+            for name in list(vars(library)):
+                method = getattr_static(library, name)
+                if isinstance(method, staticmethod) and not name.startswith("__"):
+                    _unpatched_libraries[(library, name)] = method
+                    setattr(library, name, staticmethod(_profiled_function(method)))
+    _enabled_profilers.append(profiler)
+
+
+def disable_library_profiling(profiler: Profiler) -> None:
+    _enabled_profilers.remove(profiler)
+    if not _enabled_profilers:
+        for (library, name), method in _unpatched_libraries.items():
+            setattr(library, name, method)
+        _unpatched_libraries.clear()
+
+
+def _profiled_function(method: staticmethod) -> Callable:
+    function = method.__func__
+    name = function.__qualname__
+
+    @wraps(function)
+    def profiled(*args, **kwargs):
+        # report to the profiler of the contract call in progress, if any
+        if _running_profilers:
+            profiler = _running_profilers[-1]
+        elif _enabled_profilers:
+            profiler = _enabled_profilers[-1]
+        else:
+            return function(*args, **kwargs)
+
+        profiler._enter(name)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler._exit()
+
+    return profiled
+
+
+def _is_profiled(contract_class: type, name: str) -> bool:
+    return True
+
+
+def _profiled_method(method: Callable) -> Callable:
+    name = method.__qualname__
+
+    def profiled(self: Contract, *args, **kwargs):
+        profiler = self._world.profiler
+        profiler._enter(name)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler._exit()
+
+    return profiled
+
+
+register_hook(HOOK_PROFILER, _is_profiled, _profiled_method)
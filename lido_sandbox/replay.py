@@ -0,0 +1,266 @@
+import csv
+import json
+import os
+import pickle
+import struct
+from collections.abc import Callable, Iterator
+from itertools import groupby
+from operator import itemgetter
+from lido_sandbox.locator import Locator
+
+# A history is a JSONL or CSV file of actions, one per line (row), named by the
+# "action" field. It is compiled once into a binary cache next to the file:
+#   header | magic, format version, source size, source mtime
+#   chunks | (records count, length) pair and the pickled records of each chunk
+# Replays stream the cache chunk by chunk, so memory doesn't depend on the history
+# length. A record is a tuple of the action followed by its arguments.
+REPLAY_CACHE_MAGIC: bytes = b"LIDOHIST"
+REPLAY_CACHE_VERSION: int = 1
+REPLAY_CACHE_SUFFIX: str = ".replay"
+
+ACTION_SUBMIT: str = "submit"
+ACTION_TRANSFER: str = "transfer"
+ACTION_TRANSFER_SHARES: str = "transfer_shares"
+ACTION_APPROVE: str = "approve"
+ACTION_DEPOSIT: str = "deposit"
+ACTION_REQUEST_WITHDRAWAL: str = "request_withdrawal"
+ACTION_ORACLE_REPORT: str = "oracle_report"
+
+
+def _parse_int_list(value) -> list[int]:
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else []
+    return [int(item) for item in value]
+
+
+# action -> (field, parser) pairs in the order of the arguments
+ACTION_FIELDS: dict[str, tuple[tuple[str, Callable], ...]] = {
+    ACTION_SUBMIT: (("sender", str), ("value", int)),
+    ACTION_TRANSFER: (("sender", str), ("recipient", str), ("amount", int)),
+    ACTION_TRANSFER_SHARES: (
+        ("sender", str),
+        ("recipient", str),
+        ("shares_amount", int),
+    ),
+    ACTION_APPROVE: (("owner", str), ("spender", str), ("amount", int)),
+    ACTION_DEPOSIT: (("max_deposits_count", int), ("staking_module_id", int)),
+    ACTION_REQUEST_WITHDRAWAL: (("owner", str), ("amount", int)),
+    ACTION_ORACLE_REPORT: (
+        ("report_timestamp", int),
+        ("time_elapsed", int),
+        ("cl_validators", int),
+        ("cl_balance", int),
+        ("withdrawal_vault_balance", int),
+        ("el_rewards_vault_balance", int),
+        ("shares_requested_to_burn", int),
+        ("withdrawal_finalization_batches", _parse_int_list),
+        ("simulated_share_rate", int),
+    ),
+}
+
+_HEADER = struct.Struct("<8sIQQ")
+_CHUNK_HEADER = struct.Struct("<QQ")
+_action = itemgetter(0)
+
+
+def parse_record(fields: dict) -> tuple:
+    action = fields["action"]
+    assert action in ACTION_FIELDS, "UNKNOWN_ACTION"
+    return (action,) + tuple(
+        parser(fields[name]) for name, parser in ACTION_FIELDS[action]
+    )
+
+
+def read_history(path: str) -> Iterator[tuple]:
+    # records straight from the source file, CSV files are told by the extension
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                yield parse_record(row)
+        else:
+            for line in file:
+                if line.strip():
+                    yield parse_record(json.loads(line))
+
+
+def compile_history(path: str, chunk_size: int = 10_000) -> str:
+    # the cache is rebuilt only when the source file changes
+    cache_path = path + REPLAY_CACHE_SUFFIX
+    source = os.stat(path)
+    if _read_header(cache_path) == (source.st_size, source.st_mtime_ns):
+        return cache_path
+
+    temporary_path = cache_path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(
+            _HEADER.pack(
+                REPLAY_CACHE_MAGIC,
+                REPLAY_CACHE_VERSION,
+                source.st_size,
+                source.st_mtime_ns,
+            )
+        )
+        chunk = []
+        for record in read_history(path):
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                _write_chunk(file, chunk)
+                chunk = []
+        if chunk:
+            _write_chunk(file, chunk)
+    os.replace(temporary_path, cache_path)
+    return cache_path
+
+
+def read_chunks(cache_path: str, skip: int = 0) -> Iterator[list[tuple]]:
+    # chunks that hold only skipped records are seeked over without being decoded
+    with open(cache_path, "rb") as file:
+        magic, version, _, _ = _HEADER.unpack(file.read(_HEADER.size))
+        assert magic == REPLAY_CACHE_MAGIC, "INVALID_REPLAY_CACHE"
+        assert version == REPLAY_CACHE_VERSION, "UNSUPPORTED_REPLAY_CACHE_VERSION"
+
+        while header := file.read(_CHUNK_HEADER.size):
+            records_count, length = _CHUNK_HEADER.unpack(header)
+            if skip >= records_count:
+                file.seek(length, os.SEEK_CUR)
+                skip -= records_count
+                continue
+            chunk = pickle.loads(file.read(length))
+            yield chunk[skip:]
+            skip = 0
+
+
+def _read_header(cache_path: str) -> tuple[int, int] | None:
+    try:
+        with open(cache_path, "rb") as file:
+            header = file.read(_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) != _HEADER.size:
+        return None
+    magic, version, source_size, source_mtime = _HEADER.unpack(header)
+    if magic != REPLAY_CACHE_MAGIC or version != REPLAY_CACHE_VERSION:
+        return None
+    return source_size, source_mtime
+
+
+def _write_chunk(file, chunk: list[tuple]) -> None:
+    data = pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL)
+    file.write(_CHUNK_HEADER.pack(len(chunk), len(data)))
+    file.write(data)
+
+
+class HistoryReplay:
+    # Applies a history to a locator. Runs of submits and transfers go through the
+    # batch entry points, which give the same result as the calls one by one. A
+    # checkpoint is a world snapshot plus the position in the history next to it.
+    CHUNK_SIZE: int = 10_000
+    POSITION_SUFFIX: str = ".position"
+
+    def __init__(self, locator: Locator, path: str, position: int = 0) -> None:
+        self.locator = locator
+        self.path = path
+        self._position = position
+
+    @staticmethod
+    def resume(checkpoint_path: str, path: str) -> "HistoryReplay":
+        with open(checkpoint_path + HistoryReplay.POSITION_SUFFIX) as file:
+            checkpoint = json.load(file)
+        assert checkpoint["path"] == os.path.abspath(path), "WRONG_HISTORY"
+        return HistoryReplay(
+            Locator.load_snapshot(checkpoint_path), path, checkpoint["position"]
+        )
+
+    def get_position(self) -> int:
+        return self._position
+
+    def run(
+        self,
+        limit: int | None = None,
+        checkpoint_path: str | None = None,
+        checkpoint_every: int | None = None,
+        on_progress: Callable[[int], None] | None = None,
+    ) -> int:
+        # applies at most `limit` records from the current position, a checkpoint
+        # is saved every `checkpoint_every` records and progress is reported after
+        # every chunk, returns the new position
+        assert (
+            checkpoint_every is None or checkpoint_path is not None
+        ), "NO_CHECKPOINT_PATH"
+
+        cache_path = compile_history(self.path, self.CHUNK_SIZE)
+        end = None if limit is None else self._position + limit
+        next_checkpoint = (
+            None
+            if checkpoint_every is None
+            else self._position - self._position % checkpoint_every + checkpoint_every
+        )
+
+        for chunk in read_chunks(cache_path, self._position):
+            while chunk:
+                stop = len(chunk)
+                if end is not None:
+                    stop = min(stop, end - self._position)
+                if next_checkpoint is not None:
+                    stop = min(stop, next_checkpoint - self._position)
+
+                self._apply(chunk[:stop])
+                self._position += stop
+                chunk = chunk[stop:]
+
+                if self._position == next_checkpoint:
+                    self.save_checkpoint(checkpoint_path)
+                    next_checkpoint += checkpoint_every
+                if self._position == end:
+                    break
+            if on_progress is not None:
+                on_progress(self._position)
+            if self._position == end:
+                break
+
+        return self._position
+
+    def save_checkpoint(self, checkpoint_path: str) -> None:
+        # written next to the old checkpoint first: the running world may still be
+        # memory-mapped from it
+        self.locator.save_snapshot(checkpoint_path + ".tmp")
+        with open(checkpoint_path + self.POSITION_SUFFIX + ".tmp", "w") as file:
+            json.dump(
+                {"path": os.path.abspath(self.path), "position": self._position}, file
+            )
+        os.replace(checkpoint_path + ".tmp", checkpoint_path)
+        os.replace(
+            checkpoint_path + self.POSITION_SUFFIX + ".tmp",
+            checkpoint_path + self.POSITION_SUFFIX,
+        )
+
+    def _apply(self, records: list[tuple]) -> None:
+        lido = self.locator.lido
+        withdrawal_queue = self.locator.withdrawal_queue
+
+        for action, group in groupby(records, key=_action):
+            group = list(group)
+            if action == ACTION_SUBMIT:
+                lido.submit_many(*self._columns(group, 2))
+            elif action == ACTION_TRANSFER:
+                lido.transfer_many(*self._columns(group, 3))
+            elif action == ACTION_TRANSFER_SHARES:
+                lido.transfer_shares_many(*self._columns(group, 3))
+            elif action == ACTION_APPROVE:
+                for _, owner, spender, amount in group:
+                    lido.approve(owner, spender, amount)
+            elif action == ACTION_DEPOSIT:
+                for _, max_deposits_count, staking_module_id in group:
+                    lido.deposit(max_deposits_count, staking_module_id)
+            elif action == ACTION_REQUEST_WITHDRAWAL:
+                for _, owner, amount in group:
+                    shares_amount = lido.get_shares_by_pooled_eth(amount)
+                    lido.transfer_shares(owner, withdrawal_queue.address, shares_amount)
+                    withdrawal_queue.enqueue(amount, shares_amount, owner)
+            elif action == ACTION_ORACLE_REPORT:
+                for record in group:
+                    lido.handle_oracle_report(*record[1:])
+
+    @staticmethod
+    def _columns(records: list[tuple], count: int) -> list[list]:
+        return [[record[i] for record in records] for i in range(1, count + 1)]
@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_YEAR: int = 365 * 24 * 60 * 60
+
+# name -> dtype of every column, amounts are kept as exact ints in object columns
+REPORT_METRICS_COLUMNS: dict[str, type] = {
+    "report_timestamp": np.int64,
+    "time_elapsed": np.int64,
+    "deposited_validators": np.int64,
+    "cl_validators": np.int64,
+    "cl_balance": object,
+    "buffered_ether": object,
+    "pre_total_pooled_ether": object,
+    "pre_total_shares": object,
+    "total_supply": object,
+    "total_shares": object,
+    "shares_minted_as_fees": object,
+    "treasury_shares_inflow": object,
+    "fee_ether": object,
+    "rewards": object,
+    "apr": np.float64,
+    "fee_share": np.float64,
+    "rolling_apr": np.float64,
+    "rolling_fee_share": np.float64,
+    "rolling_treasury_shares_inflow": object,
+}
+
+
+class ReportMetrics:
+    # Metrics of every report in preallocated columns that double when full. The
+    # rolling statistics cover the last `window` reports and are kept up to date with
+    # running sums, so a report costs the same however long the history is:
+    #   apr         | share rate growth, annualised over the elapsed time
+    #   rewards     | pooled ether growth before fees: post ether minus the pre share
+    #                 rate applied to the shares not minted as fees, so ether leaving
+    #                 with finalised withdrawals doesn't count against the rewards
+    #   fee_share   | ether value of the fee shares over the rewards
+    DEFAULT_CAPACITY: int = 1024
+    DEFAULT_WINDOW: int = 7
+
+    _columns: dict[str, np.ndarray]
+    _capacity: int
+    _count: int
+    _window: int
+    _window_time_elapsed: int
+    _window_fee_ether: int
+    _window_rewards: int
+    _window_treasury_shares_inflow: int
+    _savepoints: list[tuple[int, int, int, int, int]]
+
+    def __init__(
+        self, window: int = DEFAULT_WINDOW, capacity: int = DEFAULT_CAPACITY
+    ) -> None:
+        assert window > 0, "INVALID_WINDOW"
+        assert capacity > 0, "INVALID_CAPACITY"
+
+        self._columns = {
+            name: np.empty(capacity, dtype=dtype)
+            for name, dtype in REPORT_METRICS_COLUMNS.items()
+        }
+        self._capacity = capacity
+        self._count = 0
+        self._window = window
+        self._window_time_elapsed = 0
+        self._window_fee_ether = 0
+        self._window_rewards = 0
+        self._window_treasury_shares_inflow = 0
+        self._savepoints = []
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_window(self) -> int:
+        return self._window
+
+    def get_reports_count(self) -> int:
+        return self._count
+
+    def get_column(self, name: str) -> np.ndarray:
+        # a view, valid until the next append
+        return self._columns[name][: self._count]
+
+    def get_rolling_apr(self) -> float:
+        return self._last("rolling_apr")
+
+    def get_rolling_fee_share(self) -> float:
+        return self._last("rolling_fee_share")
+
+    def get_rolling_treasury_shares_inflow(self) -> int:
+        return self._window_treasury_shares_inflow
+
+    def to_dataframe(self) -> pd.DataFrame:
+        # the columns are handed to pandas as views
+        return pd.DataFrame(
+            {name: column[: self._count] for name, column in self._columns.items()},
+            copy=False,
+        )
+
+    def append(
+        self,
+        report_timestamp: int,
+        time_elapsed: int,
+        deposited_validators: int,
+        cl_validators: int,
+        cl_balance: int,
+        buffered_ether: int,
+        pre_total_shares: int,
+        pre_total_pooled_ether: int,
+        post_total_shares: int,
+        post_total_pooled_ether: int,
+        shares_minted_as_fees: int,
+        treasury_shares_inflow: int,
+    ) -> None:
+        if self._count == self._capacity:
+            self._grow()
+
+        fee_ether = shares_minted_as_fees * post_total_pooled_ether // post_total_shares
+        rewards = (
+            post_total_pooled_ether
+            - (post_total_shares - shares_minted_as_fees)
+            * pre_total_pooled_ether
+            // pre_total_shares
+        )
+
+        row = self._count
+        first_row = row - self._window + 1
+        if first_row > 0:
+            # the report that leaves the window
+            columns = self._columns
+            self._window_time_elapsed -= int(columns["time_elapsed"][first_row - 1])
+            self._window_fee_ether -= columns["fee_ether"][first_row - 1]
+            self._window_rewards -= columns["rewards"][first_row - 1]
+            self._window_treasury_shares_inflow -= columns["treasury_shares_inflow"][
+                first_row - 1
+            ]
+        self._window_time_elapsed += time_elapsed
+        self._window_fee_ether += fee_ether
+        self._window_rewards += rewards
+        self._window_treasury_shares_inflow += treasury_shares_inflow
+
+        values = {
+            "report_timestamp": report_timestamp,
+            "time_elapsed": time_elapsed,
+            "deposited_validators": deposited_validators,
+            "cl_validators": cl_validators,
+            "cl_balance": cl_balance,
+            "buffered_ether": buffered_ether,
+            "pre_total_pooled_ether": pre_total_pooled_ether,
+            "pre_total_shares": pre_total_shares,
+            "total_supply": post_total_pooled_ether,
+            "total_shares": post_total_shares,
+            "shares_minted_as_fees": shares_minted_as_fees,
+            "treasury_shares_inflow": treasury_shares_inflow,
+            "fee_ether": fee_ether,
+            "rewards": rewards,
+            "apr": self._apr(
+                pre_total_pooled_ether,
+                pre_total_shares,
+                post_total_pooled_ether,
+                post_total_shares,
+                time_elapsed,
+            ),
+            "fee_share": self._ratio(fee_ether, rewards),
+            "rolling_fee_share": self._ratio(
+                self._window_fee_ether, self._window_rewards
+            ),
+            "rolling_treasury_shares_inflow": self._window_treasury_shares_inflow,
+        }
+        # the share rate before the first report of the window
+        window_row = max(first_row, 0)
+        if window_row < row:
+            window_pre_total_pooled_ether = self._columns["pre_total_pooled_ether"][
+                window_row
+            ]
+            window_pre_total_shares = self._columns["pre_total_shares"][window_row]
+        else:
+            window_pre_total_pooled_ether = pre_total_pooled_ether
+            window_pre_total_shares = pre_total_shares
+        values["rolling_apr"] = self._apr(
+            window_pre_total_pooled_ether,
+            window_pre_total_shares,
+            post_total_pooled_ether,
+            post_total_shares,
+            self._window_time_elapsed,
+        )
+
+        for name, value in values.items():
+            self._columns[name][row] = value
+        self._count += 1
+
+    def _begin_transaction(self) -> None:
+        self._savepoints.append(
+            (
+                self._count,
+                self._window_time_elapsed,
+                self._window_fee_ether,
+                self._window_rewards,
+                self._window_treasury_shares_inflow,
+            )
+        )
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+
+    def _rollback_transaction(self) -> None:
+        # rows past the restored count are simply overwritten by the next reports
+        (
+            self._count,
+            self._window_time_elapsed,
+            self._window_fee_ether,
+            self._window_rewards,
+            self._window_treasury_shares_inflow,
+        ) = self._savepoints.pop()
+
+    def _grow(self) -> None:
+        capacity = 2 * self._capacity
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self._count] = column[: self._count]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def _last(self, name: str) -> float:
+        assert self._count > 0, "NO_REPORTS"
+        return float(self._columns[name][self._count - 1])
+
+    @staticmethod
+    def _apr(
+        pre_total_pooled_ether: int,
+        pre_total_shares: int,
+        post_total_pooled_ether: int,
+        post_total_shares: int,
+        time_elapsed: int,
+    ) -> float:
+        denominator = pre_total_pooled_ether * post_total_shares * time_elapsed
+        if denominator == 0:
+            return np.nan
+        return (
+            (
+                post_total_pooled_ether * pre_total_shares
+                - pre_total_pooled_ether * post_total_shares
+            )
+            * SECONDS_PER_YEAR
+            / denominator
+        )
+
+    @staticmethod
+    def _ratio(numerator: int, denominator: int) -> float:
+        return numerator / denominator if denominator > 0 else np.nan
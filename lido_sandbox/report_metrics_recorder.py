@@ -0,0 +1,62 @@
+from lido_sandbox.locator import Locator
+from lido_sandbox.post_token_rebase_receiver import PostTokenRebaseReceiver
+from lido_sandbox.report_metrics import ReportMetrics
+
+
+class ReportMetricsRecorder(PostTokenRebaseReceiver):
+    # Records the metrics of every report into a ReportMetrics table. The treasury
+    # inflow is the growth of the treasury shares since the previous report.
+    _locator: Locator
+    _metrics: ReportMetrics
+    _treasury_shares: int
+
+    def __init__(
+        self,
+        locator: Locator,
+        address: str,
+        window: int = ReportMetrics.DEFAULT_WINDOW,
+        capacity: int = ReportMetrics.DEFAULT_CAPACITY,
+    ) -> None:
+        super().__init__(address)
+
+        self._locator = locator
+        self._metrics = ReportMetrics(window, capacity)
+        self._sync_treasury_shares()
+
+    def get_metrics(self) -> ReportMetrics:
+        return self._metrics
+
+    def handle_post_token_rebase(
+        self,
+        report_timestamp: int,
+        time_elapsed: int,
+        pre_total_shares: int,
+        pre_total_ether: int,
+        post_total_shares: int,
+        post_total_ether: int,
+        shares_minted_as_fees: int,
+    ):
+        lido = self._locator.lido
+        deposited_validators, cl_validators, cl_balance = lido.get_beacon_stat()
+        treasury_shares = lido.shares_of(self._locator.treasury.address)
+
+        self._metrics.append(
+            report_timestamp,
+            time_elapsed,
+            deposited_validators,
+            cl_validators,
+            cl_balance,
+            lido.get_buffered_ether(),
+            pre_total_shares,
+            pre_total_ether,
+            post_total_shares,
+            post_total_ether,
+            shares_minted_as_fees or 0,
+            treasury_shares - self._treasury_shares,
+        )
+        self._treasury_shares = treasury_shares
+
+    def _sync_treasury_shares(self) -> None:
+        self._treasury_shares = self._locator.lido.shares_of(
+            self._locator.treasury.address
+        )
@@ -0,0 +1,174 @@
+from array import array
+from bisect import bisect_right
+from copy import deepcopy
+from operator import itemgetter
+from lido_sandbox.libs import CopyOnWriteDict
+
+_checkpoint_epoch = itemgetter(0)
+
+
+class ShareHistory:
+    # Append-only index of the share rate after every report, plus optional
+    # per-account checkpoints of (epoch, shares, net tokens received). The epoch of a
+    # share change is the index of the first report that sees it, so the shares of
+    # an account at report k are those of its last checkpoint with epoch <= k.
+    # The checkpoints of an account are kept as (list, length, generation): the list
+    # is append-only and shared with forks and enclosing transactions, each of which
+    # only sees its first length entries. A generation is a token renewed by every
+    # fork and transaction, the last entry is replaced in place only by the
+    # generation that appended it and any other one appends a new entry.
+    _timestamps: array
+    _total_pooled_ether: list[int]
+    _total_shares: list[int]
+    _ordered: bool
+    _shared: bool
+    _accounts: CopyOnWriteDict | None
+    _tracked_since: int
+    _generation: object
+    _savepoints: list[int]
+
+    def __init__(self) -> None:
+        self._timestamps = array("q")
+        self._total_pooled_ether = []
+        self._total_shares = []
+        self._ordered = True
+        self._shared = False
+        self._accounts = None
+        self._tracked_since = 0
+        self._generation = object()
+        self._savepoints = []
+
+    def get_reports_count(self) -> int:
+        return len(self._timestamps)
+
+    def get_report(self, report_index: int) -> tuple[int, int, int]:
+        return (
+            self._timestamps[report_index],
+            self._total_pooled_ether[report_index],
+            self._total_shares[report_index],
+        )
+
+    def get_report_index(self, timestamp: int) -> int | None:
+        # the last report made at or before the timestamp
+        assert self._ordered, "UNORDERED_REPORT_TIMESTAMPS"
+        report_index = bisect_right(self._timestamps, timestamp) - 1
+        return None if report_index < 0 else report_index
+
+    def append_report(
+        self, timestamp: int, total_pooled_ether: int, total_shares: int
+    ) -> None:
+        self._prepare_write()
+        if self._timestamps and timestamp < self._timestamps[-1]:
+            self._ordered = False
+        self._timestamps.append(timestamp)
+        self._total_pooled_ether.append(total_pooled_ether)
+        self._total_shares.append(total_shares)
+
+    def is_tracking_accounts(self) -> bool:
+        return self._accounts is not None
+
+    def enable_account_checkpoints(self) -> None:
+        # accounts are only tracked from the next report on
+        assert not self._savepoints, "ENABLE_INSIDE_TRANSACTION"
+        if self._accounts is None:
+            self._accounts = CopyOnWriteDict()
+            self._tracked_since = len(self._timestamps)
+
+    def disable_account_checkpoints(self) -> None:
+        assert not self._savepoints, "DISABLE_INSIDE_TRANSACTION"
+        self._accounts = None
+
+    def checkpoint(
+        self, account: str, shares_before: int, shares_after: int, tokens_delta: int
+    ) -> None:
+        epoch = len(self._timestamps)
+        generation = self._generation
+        entry = self._accounts.peek(account)
+        if entry is None:
+            # the shares held before the first change are valid since tracking began
+            checkpoints = []
+            if epoch > self._tracked_since:
+                checkpoints.append((epoch - 1, shares_before, 0))
+            flow = tokens_delta
+        else:
+            checkpoints, length, entry_generation = entry
+            last_epoch, _, last_flow = checkpoints[length - 1]
+            flow = last_flow + tokens_delta
+            if length < len(checkpoints):
+                # another fork or a rolled back transaction appended past the view
+                checkpoints = checkpoints[:length]
+                entry_generation = generation
+            if last_epoch == epoch and entry_generation is generation:
+                checkpoints.pop()
+
+        checkpoints.append((epoch, shares_after, flow))
+        self._accounts[account] = (checkpoints, len(checkpoints), generation)
+
+    def get_shares_at(
+        self, account: str, report_index: int, current_shares: int
+    ) -> tuple[int, int]:
+        # shares held at the report and net tokens received since tracking began
+        assert self._accounts is not None, "ACCOUNTS_NOT_TRACKED"
+        assert self._tracked_since <= report_index, "REPORT_NOT_TRACKED"
+
+        entry = self._accounts.peek(account)
+        if entry is None:
+            return current_shares, 0
+        # an epoch may have several checkpoints, the last one holds. Before the
+        # first one the shares are those of the first, held since tracking began
+        checkpoints, length, _ = entry
+        index = bisect_right(
+            checkpoints, report_index, hi=length, key=_checkpoint_epoch
+        )
+        _, shares, flow = checkpoints[max(index - 1, 0)]
+        return shares, flow
+
+    def __deepcopy__(self, memo: dict) -> "ShareHistory":
+        # The reports are shared with the fork until either side writes them. The
+        # checkpoint lists stay shared as well, both sides move on to a new
+        # generation so that neither replaces an entry the other one sees.
+        assert not self._savepoints, "FORK_INSIDE_TRANSACTION"
+
+        forked = ShareHistory.__new__(ShareHistory)
+        memo[id(self)] = forked
+        forked.__dict__.update(self.__dict__)
+        forked._accounts = deepcopy(self._accounts, memo)
+        forked._savepoints = []
+        self._shared = True
+        forked._shared = True
+        self._generation = object()
+        forked._generation = object()
+        return forked
+
+    def _begin_transaction(self) -> None:
+        self._savepoints.append(len(self._timestamps))
+        self._generation = object()
+        if self._accounts is not None:
+            self._accounts._begin_transaction()
+
+    def _commit_transaction(self) -> None:
+        self._savepoints.pop()
+        if self._accounts is not None:
+            self._accounts._commit_transaction()
+
+    def _rollback_transaction(self) -> None:
+        reports_count = self._savepoints.pop()
+        if reports_count < len(self._timestamps):
+            self._prepare_write()
+        del self._timestamps[reports_count:]
+        del self._total_pooled_ether[reports_count:]
+        del self._total_shares[reports_count:]
+        if not self._ordered:
+            timestamps = self._timestamps
+            self._ordered = all(
+                timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)
+            )
+        if self._accounts is not None:
+            self._accounts._rollback_transaction()
+
+    def _prepare_write(self) -> None:
+        if self._shared:
+            self._timestamps = array("q", self._timestamps)
+            self._total_pooled_ether = list(self._total_pooled_ether)
+            self._total_shares = list(self._total_shares)
+            self._shared = False
@@ -0,0 +1,186 @@
+import io
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from typing import BinaryIO
+from lido_sandbox.libs import AccountIndex, CopyOnWriteDict, ShareLedger
+from lido_sandbox.libs.mapped_dict import MappedDict, pack_dict
+from lido_sandbox.locator import Locator
+
+# Snapshot layout (little-endian):
+#   header   | magic, format version, sections count, sections index offset
+#   sections | raw sections, each aligned to 8 bytes
+#   index    | (offset, length) pair per section
+# The last section is the pickled world. Every ledger-sized CopyOnWriteDict, ShareLedger
+# and AccountIndex is stored out of band in raw sections, which are memory-mapped and
+# decoded lazily on restore.
+SNAPSHOT_MAGIC: bytes = b"LIDOSNAP"
+SNAPSHOT_VERSION: int = 1
+
+_HEADER = struct.Struct("<8sIIQ")
+_ALIGNMENT: int = 8
+_PERSISTENT_COPY_ON_WRITE_DICT: str = "CopyOnWriteDict"
+_PERSISTENT_SHARE_LEDGER: str = "ShareLedger"
+_PERSISTENT_ACCOUNT_INDEX: str = "AccountIndex"
+
+
+class _SectionsWriter:
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self._index = array("Q")
+        file.write(b"\0" * _HEADER.size)
+
+    def add(self, data: bytes | array | None) -> int | None:
+        if data is None:
+            return None
+
+        offset = self._file.tell()
+        padding = -offset % _ALIGNMENT
+        self._file.write(b"\0" * padding)
+        offset += padding
+
+        length = self._file.write(data)
+        self._index.extend((offset, length))
+        return len(self._index) // 2 - 1
+
+    def finish(self) -> None:
+        index_offset = self._file.tell()
+        self._file.write(self._index)
+        self._file.seek(0)
+        self._file.write(
+            _HEADER.pack(
+                SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(self._index) // 2, index_offset
+            )
+        )
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file: BinaryIO, sections: _SectionsWriter) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._sections = sections
+        # an account index is shared by ledgers of forked worlds, so it is stored once
+        self._indices = {}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, AccountIndex):
+            if id(obj) not in self._indices:
+                self._indices[id(obj)] = (
+                    _PERSISTENT_ACCOUNT_INDEX,
+                    tuple(
+                        self._sections.add(buffer)
+                        for buffer in (obj._blob, obj._offsets, obj._hashes, obj._table)
+                    ),
+                )
+            return self._indices[id(obj)]
+        if isinstance(obj, ShareLedger):
+            return (
+                _PERSISTENT_SHARE_LEDGER,
+                obj.get_index(),
+                tuple(
+                    self._sections.add(column)
+                    for column in (obj._low, obj._high, obj._known)
+                ),
+            )
+        if not isinstance(obj, CopyOnWriteDict):
+            return None
+
+        packed = pack_dict(obj._merge())
+        return (
+            _PERSISTENT_COPY_ON_WRITE_DICT,
+            obj.default_factory,
+            obj.copy_values,
+            packed["values_kind"],
+            tuple(
+                self._sections.add(packed[name])
+                for name in ("key_offsets", "keys", "order", "values", "value_offsets")
+            ),
+        )
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO, sections: list[memoryview]) -> None:
+        super().__init__(file)
+        self._sections = sections
+        self._indices = {}
+
+    def persistent_load(self, pid):
+        if pid[0] == _PERSISTENT_ACCOUNT_INDEX:
+            if pid not in self._indices:
+                blob, offsets, hashes, table = pid[1]
+                self._indices[pid] = AccountIndex.from_buffers(
+                    self._sections[blob],
+                    self._sections[offsets].cast("Q"),
+                    self._sections[hashes].cast("I"),
+                    self._sections[table].cast("i"),
+                )
+            return self._indices[pid]
+        if pid[0] == _PERSISTENT_SHARE_LEDGER:
+            _, index, (low, high, known) = pid
+            return ShareLedger.from_columns(
+                index,
+                self._sections[low].cast("Q"),
+                self._sections[high].cast("Q"),
+                self._sections[known],
+            )
+
+        kind, default_factory, copy_values, values_kind, section_ids = pid
+        assert kind == _PERSISTENT_COPY_ON_WRITE_DICT, "UNKNOWN_PERSISTENT_ID"
+
+        key_offsets, keys, order, values, value_offsets = [
+            None if section_id is None else self._sections[section_id]
+            for section_id in section_ids
+        ]
+        base = MappedDict(
+            key_offsets.cast("Q"),
+            keys,
+            order.cast("Q"),
+            values_kind,
+            values,
+            None if value_offsets is None else value_offsets.cast("Q"),
+        )
+        return CopyOnWriteDict.with_base(base, default_factory, copy_values)
+
+
+def save_snapshot(locator: Locator, path: str) -> None:
+    assert sys.byteorder == "little", "UNSUPPORTED_BYTE_ORDER"
+
+    # the snapshot is written next to the target and moved over it once complete:
+    # the world being saved may still be memory-mapped from the target
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            sections = _SectionsWriter(file)
+            world = io.BytesIO()
+            _SnapshotPickler(world, sections).dump(locator)
+            sections.add(world.getbuffer())
+            sections.finish()
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.unlink(temporary_path)
+        raise
+
+
+def load_snapshot(path: str) -> Locator:
+    assert sys.byteorder == "little", "UNSUPPORTED_BYTE_ORDER"
+
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, sections_count, index_offset = _HEADER.unpack_from(mapped, 0)
+    assert magic == SNAPSHOT_MAGIC, "INVALID_SNAPSHOT"
+    assert version == SNAPSHOT_VERSION, "UNSUPPORTED_SNAPSHOT_VERSION"
+
+    buffer = memoryview(mapped)
+    index = buffer[index_offset : index_offset + sections_count * 16].cast("Q")
+    sections = [
+        buffer[index[2 * i] : index[2 * i] + index[2 * i + 1]]
+        for i in range(sections_count)
+    ]
+
+    return _SnapshotUnpickler(io.BytesIO(sections[-1]), sections).load()
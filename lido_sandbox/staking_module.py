@@ -1,14 +1,21 @@
-from lido_sandbox.objects import NodeOperator, NodeOperatorSummary
-from lido_sandbox.libs import MinFirstAllocationStrategy
+import numpy as np
+from lido_sandbox.objects import EventType, NodeOperator, NodeOperatorSummary
+from lido_sandbox.libs import (
+    AllocationStrategy,
+    CopyOnWriteDict,
+    MinFirstAllocationStrategy,
+    NodeOperatorRegistry,
+)
 from lido_sandbox.locator import Locator
-from lido_sandbox.contract import Contract
+from lido_sandbox.contract import Contract, view
 from time import time
 
 
 class StakingModule(Contract):
     _locator: Locator
 
-    _node_operators: dict[int, NodeOperator]
+    # either NodeOperator objects by id or, once enabled, a columnar registry
+    _node_operators: dict[int, NodeOperator] | NodeOperatorRegistry
     _node_operator_summary: NodeOperatorSummary
     _total_operators_count: int = 0
     _active_node_operators_count: int = 0
@@ -16,6 +23,8 @@ class StakingModule(Contract):
     _nonce: int = 0
     _type: str
     _stuck_penalty_delay: int = 30
+    # splits deposits between the node operators, see AllocationStrategy
+    _allocation_strategy: AllocationStrategy = MinFirstAllocationStrategy()
 
     MAX_UINT64 = 2**64 - 1
     MAX_NODE_OPERATORS_COUNT: int = 200
@@ -25,9 +34,11 @@ class StakingModule(Contract):
 
         self._type = type
         self._locator = locator
-        self._node_operators = {}
+        self._node_operators = CopyOnWriteDict(copy_values=True)
         self._node_operator_summary = NodeOperatorSummary()
-        self._signing_keys_mapping = {}
+        self._signing_keys_mapping = CopyOnWriteDict(copy_values=True)
+
+        locator.world.register(self)
 
     def add_node_operator(self, name: str, reward_address: str) -> int:
         id = self.get_node_operators_count()
@@ -123,15 +134,17 @@ class StakingModule(Contract):
         if node_operator_id in self._signing_keys_mapping:
             self._signing_keys_mapping[node_operator_id] += keys
         else:
-            self._signing_keys_mapping[node_operator_id] = keys
+            self._signing_keys_mapping[node_operator_id] = list(keys)
 
         node_operator.total_signing_keys_count += keys_count
         self._node_operator_summary.total_keys_count += keys_count
         self._increase_validators_keys_nonce()
 
+    @view
     def get_type(self) -> str:
         return self._type
 
+    @view
     def get_staking_module_summary(self) -> tuple[int, int, int]:
         return (
             self._node_operator_summary.exited_keys_count,
@@ -140,6 +153,7 @@ class StakingModule(Contract):
             - self._node_operator_summary.deposited_keys_count,
         )
 
+    @view
     def get_node_operator_summary(
         self, node_operator_id: int
     ) -> tuple[bool, int, int, int, int, int, int, int]:
@@ -160,18 +174,58 @@ class StakingModule(Contract):
             depositable_validators_count,
         )
 
+    @view
     def get_nonce(self) -> int:
         return self._nonce
 
+    @view
+    def get_allocation_strategy(self) -> AllocationStrategy:
+        return self._allocation_strategy
+
+    def set_allocation_strategy(self, allocation_strategy: AllocationStrategy) -> None:
+        self._allocation_strategy = allocation_strategy
+
+    @view
+    def get_node_operator_registry(self) -> NodeOperatorRegistry | None:
+        if isinstance(self._node_operators, NodeOperatorRegistry):
+            return self._node_operators
+        return None
+
+    def enable_node_operator_registry(self) -> NodeOperatorRegistry:
+        # moves the node operators into columns, which turns the scans over all of
+        # them, e.g. the rewards distribution and the deposits allocation, into
+        # numpy operations. Worth it for modules with thousands of node operators
+        if not isinstance(self._node_operators, NodeOperatorRegistry):
+            self._node_operators = NodeOperatorRegistry(
+                self._node_operators[node_operator_id]
+                for node_operator_id in range(self.get_node_operators_count())
+            )
+        return self._node_operators
+
+    def disable_node_operator_registry(self) -> None:
+        registry = self.get_node_operator_registry()
+        if registry is not None:
+            self._node_operators = CopyOnWriteDict(
+                copy_values=True,
+                data={
+                    node_operator_id: registry.to_node_operator(node_operator_id)
+                    for node_operator_id in registry
+                },
+            )
+
+    @view
     def get_node_operators_count(self) -> int:
         return self._total_operators_count
 
+    @view
     def get_active_node_operators_count(self) -> int:
         return self._active_node_operators_count
 
+    @view
     def get_node_operator_is_active(self, node_operator_id: int) -> bool:
         return self._node_operators[node_operator_id].active
 
+    @view
     def get_node_operator_ids(self, offset: int, limit: int) -> list[int]:
         node_operators_count = self.get_node_operators_count()
         if offset >= node_operators_count or limit == 0:
@@ -267,6 +321,36 @@ class StakingModule(Contract):
 
         return public_keys, signatures
 
+    @view
+    def get_signing_keys_allocation_curve(
+        self, max_keys_count: int
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # how every keys count up to max_keys_count would be split: the node
+        # operators with keys left, their active keys before the allocation and the
+        # operator (an index into the first array) of every allocated key in turn.
+        # The active keys after allocating k keys are the active keys plus the
+        # bincount of the first k operators, fewer keys are left than requested if
+        # the order is shorter than max_keys_count. With a strategy whose caps
+        # follow the keys count, e.g. CappedAllocationStrategy, only the whole
+        # order is an allocation
+        (
+            node_operator_ids,
+            active_keys_counts,
+            active_keys_capacities,
+        ) = self._get_signing_keys_allocation_buckets()
+
+        assert hasattr(
+            self._allocation_strategy, "allocate_in_order"
+        ), "STRATEGY_HAS_NO_ALLOCATION_ORDER"
+        order = self._allocation_strategy.allocate_in_order(
+            list(active_keys_counts), active_keys_capacities, max_keys_count
+        )
+        return (
+            np.array(node_operator_ids, dtype=np.int64),
+            np.array(active_keys_counts, dtype=np.int64),
+            np.array(order, dtype=np.int64),
+        )
+
     def on_exited_and_stuck_validators_counts_updated(self):
         self._distribute_rewards()
 
@@ -299,9 +383,13 @@ class StakingModule(Contract):
             burner.request_burn_shares(self.address, to_burn)
         return distributed
 
+    @view
     def get_rewards_distribution(
         self, total_reward_shares: int
     ) -> tuple[list[str], list[int], list[bool]]:
+        if isinstance(self._node_operators, NodeOperatorRegistry):
+            return self._get_registry_rewards_distribution(total_reward_shares)
+
         node_operator_count = self.get_node_operators_count()
         active_count = self.get_active_node_operators_count()
 
@@ -346,6 +434,28 @@ class StakingModule(Contract):
 
         return recipients, shares, penalized
 
+    def _get_registry_rewards_distribution(
+        self, total_reward_shares: int
+    ) -> tuple[list[str], list[int], list[bool]]:
+        # same as get_rewards_distribution over the columns of the registry
+        (
+            recipients,
+            active_validators_counts,
+            penalized,
+        ) = self._node_operators.get_rewards_inputs(int(time()))
+
+        total_active_validators_count = int(active_validators_counts.sum())
+        if total_active_validators_count == 0:
+            return recipients, active_validators_counts.tolist(), penalized.tolist()
+
+        shares = (
+            active_validators_counts.astype(object)
+            * total_reward_shares
+            // total_active_validators_count
+        )
+        return recipients, shares.tolist(), penalized.tolist()
+
+    @view
     def is_operator_penalized(self, node_operator_id: int) -> bool:
         return self._is_operator_penalized(node_operator_id)
 
@@ -358,6 +468,7 @@ class StakingModule(Contract):
             or int(time()) <= node_operator.stuck_penalty_end_timestamp
         )
 
+    @view
     def is_operator_penalty_cleared(self, node_operator_id: int) -> bool:
         node_operator = self._node_operators[node_operator_id]
         return (
@@ -371,6 +482,42 @@ class StakingModule(Contract):
     def _get_signing_keys_allocation_data(
         self, keys_count: int
     ) -> tuple[int, list[int], list[int]]:
+        (
+            node_operator_ids,
+            active_key_counts_after_allocation,
+            active_keys_capacities,
+        ) = self._get_signing_keys_allocation_buckets()
+
+        if not node_operator_ids:
+            return 0, [], []
+
+        # the keys are deposited, a strategy with state of its own moves on
+        commit_allocation = getattr(
+            self._allocation_strategy,
+            "commit_allocation",
+            self._allocation_strategy.allocate,
+        )
+        allocated_keys_count = commit_allocation(
+            active_key_counts_after_allocation, active_keys_capacities, keys_count
+        )
+
+        # method NEVER allocates more keys than was requested
+        assert keys_count >= allocated_keys_count
+
+        return (
+            allocated_keys_count,
+            node_operator_ids,
+            active_key_counts_after_allocation,
+        )
+
+    def _get_signing_keys_allocation_buckets(
+        self,
+    ) -> tuple[list[int], list[int], list[int]]:
+        # the node operators with keys left to deposit, their active keys and the
+        # most active keys they may have
+        if isinstance(self._node_operators, NodeOperatorRegistry):
+            return self._node_operators.get_allocation_buckets()
+
         active_node_operators_count: int = self.get_active_node_operators_count()
         node_operator_ids: list[int] = [None] * active_node_operators_count
         active_key_counts_after_allocation: list[int] = [
@@ -402,9 +549,6 @@ class StakingModule(Contract):
             )
             active_node_operator_index += 1
 
-        if active_node_operator_index == 0:
-            return 0, [], []
-
         # shrink the length of the resulting arrays if some active node operators have no available keys to be deposited
         if active_node_operator_index < active_node_operators_count:
             node_operator_ids = node_operator_ids[:active_node_operator_index]
@@ -413,17 +557,10 @@ class StakingModule(Contract):
             ]
             active_keys_capacities = active_keys_capacities[:active_node_operator_index]
 
-        allocated_keys_count = MinFirstAllocationStrategy.allocate(
-            active_key_counts_after_allocation, active_keys_capacities, keys_count
-        )
-
-        # method NEVER allocates more keys than was requested
-        assert keys_count >= allocated_keys_count
-
         return (
-            allocated_keys_count,
             node_operator_ids,
             active_key_counts_after_allocation,
+            active_keys_capacities,
         )
 
     def _load_allocated_signing_keys(
@@ -436,7 +573,19 @@ class StakingModule(Contract):
         signatures: list[str] = [None] * keys_count_to_load
         loaded_keys_count = 0
 
-        for i in range(len(node_operator_ids)):
+        indices = range(len(node_operator_ids))
+        if isinstance(self._node_operators, NodeOperatorRegistry):
+            # only the node operators given keys by the allocation are visited
+            ids = np.array(node_operator_ids, dtype=np.int64)
+            deposited_signing_keys_counts_after = self._node_operators.get_values(
+                "exited_signing_keys_count", ids
+            ) + np.array(active_key_counts_after_allocation, dtype=np.uint64)
+            indices = np.flatnonzero(
+                deposited_signing_keys_counts_after
+                != self._node_operators.get_values("deposited_signing_keys_count", ids)
+            ).tolist()
+
+        for i in indices:
             node_operator = self._node_operators[node_operator_ids[i]]
             deposited_signing_keys_count_before = (
                 node_operator.deposited_signing_keys_count
@@ -471,6 +620,14 @@ class StakingModule(Contract):
             )
             self._update_summary_max_validators_count(node_operator_ids[i])
 
+            if self._event_log is not None:
+                self._event_log.emit(
+                    EventType.DepositedSigningKeysCountChanged,
+                    self.address,
+                    (),
+                    (node_operator_ids[i], deposited_signing_keys_count_after),
+                )
+
         assert loaded_keys_count == keys_count_to_load
         self._node_operator_summary.deposited_keys_count += loaded_keys_count
 
@@ -602,5 +759,6 @@ class StakingModule(Contract):
 
         return old_max_signing_keys_count, new_max_signing_keys_count
 
+    @view
     def get_stuck_penalty_delay(self):
         return self._stuck_penalty_delay
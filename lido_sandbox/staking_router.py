@@ -1,5 +1,11 @@
-from lido_sandbox.libs import MinFirstAllocationStrategy
-from lido_sandbox.contract import Contract
+from bisect import bisect_right
+import numpy as np
+from lido_sandbox.libs import (
+    AllocationStrategy,
+    CopyOnWriteDict,
+    MinFirstAllocationStrategy,
+)
+from lido_sandbox.contract import Contract, view
 from lido_sandbox.locator import Locator
 from lido_sandbox.staking_module import StakingModule
 from lido_sandbox.objects import (
@@ -18,6 +24,15 @@ class StakingRouter(Contract):
     _staking_modules: dict[str, StakingModule]
     _last_staking_module_id: int = 0
     _staking_modules_count: int = 0
+    _config_version: int = 0
+    _rewards_distribution: tuple | None = None
+    # splits deposits between the modules, see AllocationStrategy
+    _allocation_strategy: AllocationStrategy = MinFirstAllocationStrategy()
+
+    # the rewards distribution is cached against the router configuration version
+    # and the nonces of the modules, every cached read is checked against a full
+    # recompute when set
+    CHECK_REWARDS_DISTRIBUTION_CACHE: bool = False
 
     FEE_PRECISION_POINTS: int = 10**20
     TOTAL_BASIS_POINTS: int = 10000
@@ -29,8 +44,8 @@ class StakingRouter(Contract):
 
         self._withdrawal_credentials = "lido_withdrawal_credentials"
         self._locator = locator
-        self._staking_module_indices_mapping = {}
-        self._staking_modules_mapping = {}
+        self._staking_module_indices_mapping = CopyOnWriteDict(int)
+        self._staking_modules_mapping = CopyOnWriteDict(copy_values=True)
         self._staking_modules = {}
 
     def add_staking_module(
@@ -72,6 +87,7 @@ class StakingRouter(Contract):
         self._last_staking_module_id = new_staking_module.id
         self._staking_modules_count = new_staking_module_index + 1
         self._staking_modules[staking_module.address] = staking_module
+        self._increase_config_version()
 
         return new_staking_module.id, new_staking_module_index
 
@@ -89,6 +105,7 @@ class StakingRouter(Contract):
         staking_module.target_share = target_share
         staking_module.treasury_fee = treasury_fee
         staking_module.staking_module_fee = staking_module_fee
+        self._increase_config_version()
 
     def update_target_validators_limits(
         self,
@@ -152,6 +169,7 @@ class StakingRouter(Contract):
                 exited_validators_counts[i] - prev_reported_exited_validators_count
             )
             module_data.exited_validators_count = exited_validators_counts[i]
+            self._increase_config_version()
 
         return newly_exited_validators_count
 
@@ -180,6 +198,7 @@ class StakingRouter(Contract):
             if exited_validators_count == module_data.exited_validators_count:
                 module.on_exited_and_stuck_validators_counts_updated()
 
+    @view
     def get_staking_modules(self) -> list[StakingModuleData]:
         staking_modules_count: int = self.get_staking_modules_count()
         staking_modules: list[StakingModuleData] = [None] * staking_modules_count
@@ -188,6 +207,7 @@ class StakingRouter(Contract):
             staking_modules[i] = self._get_staking_module_by_index(i)
         return staking_modules
 
+    @view
     def get_staking_module_ids(self) -> list[int]:
         staking_modules_count: int = self.get_staking_modules_count()
         staking_module_ids: list[int] = [None] * staking_modules_count
@@ -196,18 +216,23 @@ class StakingRouter(Contract):
             staking_module_ids[i] = self._get_staking_module_by_index(i).id
         return staking_module_ids
 
+    @view
     def get_staking_module(self, staking_module_id: int) -> StakingModule:
         return self._get_staking_module_by_id(staking_module_id)
 
+    @view
     def get_staking_modules_count(self) -> int:
         return self._staking_modules_count
 
+    @view
     def has_staking_module(self, staking_module_id: int) -> bool:
         return self._staking_module_indices_mapping[staking_module_id] != 0
 
+    @view
     def get_staking_module_status(self, staking_module_id: int) -> StakingModuleStatus:
         return self._get_staking_module_by_id(staking_module_id).status
 
+    @view
     def get_node_operator_digests(
         self, staking_module_id: int, offset: int, limit: int
     ) -> list[tuple[int, bool, str]]:
@@ -242,29 +267,34 @@ class StakingRouter(Contract):
         assert staking_module.status == StakingModuleStatus.DepositsPaused
         self._set_staking_module_status(staking_module, StakingModuleStatus.Active)
 
+    @view
     def get_staking_module_is_stopped(self, staking_module_id: int) -> bool:
         return (
             self.get_staking_module_status(staking_module_id)
             == StakingModuleStatus.Stopped
         )
 
+    @view
     def get_staking_module_is_deposits_paused(self, staking_module_id: int) -> bool:
         return (
             self.get_staking_module_status(staking_module_id)
             == StakingModuleStatus.DepositsPaused
         )
 
+    @view
     def get_staking_module_is_active(self, staking_module_id: int) -> bool:
         return (
             self.get_staking_module_status(staking_module_id)
             == StakingModuleStatus.Active
         )
 
+    @view
     def get_staking_module_nonce(self, staking_module_id: int) -> int:
         module_data = self._get_staking_module_by_id(staking_module_id)
         module = self.get_staking_module_instance(module_data.staking_module_address)
         return module.get_nonce()
 
+    @view
     def get_staking_module_active_validators_count(self, staking_module_id: int) -> int:
         module_data = self._get_staking_module_by_id(staking_module_id)
         module = self.get_staking_module_instance(module_data.staking_module_address)
@@ -279,6 +309,7 @@ class StakingRouter(Contract):
         )
         return active_validators_count
 
+    @view
     def get_staking_module_max_deposits_count(
         self, staking_module_id: int, max_deposits_value: int
     ) -> int:
@@ -293,6 +324,27 @@ class StakingRouter(Contract):
             - staking_modules_cache[staking_module_index].active_validators_count
         )
 
+    @view
+    def get_staking_modules_deposits_counts(
+        self, max_deposits_count: int
+    ) -> tuple[list[int], list[int]]:
+        # module ids and the new deposits of every module, allocated in a single pass
+        (
+            _,
+            new_deposits_allocation,
+            staking_modules_cache,
+        ) = self._get_deposits_allocation(max_deposits_count)
+        return (
+            [cache_item.staking_module_id for cache_item in staking_modules_cache],
+            [
+                allocation - cache_item.active_validators_count
+                for allocation, cache_item in zip(
+                    new_deposits_allocation, staking_modules_cache
+                )
+            ],
+        )
+
+    @view
     def get_staking_fee_aggregate_distribution(self) -> tuple[int, int, int]:
         module_fees = []
         (
@@ -309,6 +361,34 @@ class StakingRouter(Contract):
 
     def get_staking_rewards_distribution(
         self,
+    ) -> tuple[list[str], list[int], list[int], int, int]:
+        key = self._get_rewards_distribution_key()
+        rewards_distribution = self._rewards_distribution
+        if rewards_distribution is None or rewards_distribution[0] != key:
+            rewards_distribution = (key, self._calculate_staking_rewards_distribution())
+            self._rewards_distribution = rewards_distribution
+        elif self.CHECK_REWARDS_DISTRIBUTION_CACHE:
+            recalculated = self._calculate_staking_rewards_distribution()
+            assert rewards_distribution[1] == recalculated, "STALE_REWARDS_DISTRIBUTION"
+
+        # callers get their own lists, the cached ones are shared
+        (
+            recipients,
+            staking_module_ids,
+            staking_module_fees,
+            total_fee,
+            precision_points,
+        ) = rewards_distribution[1]
+        return (
+            list(recipients),
+            list(staking_module_ids),
+            list(staking_module_fees),
+            total_fee,
+            precision_points,
+        )
+
+    def _calculate_staking_rewards_distribution(
+        self,
     ) -> tuple[list[str], list[int], list[int], int, int]:
         recipients: list[str] = []
         staking_module_ids: list[int] = []
@@ -363,6 +443,7 @@ class StakingRouter(Contract):
             precision_points,
         )
 
+    @view
     def get_total_fee_e4_precision(self) -> int:
         (
             _,
@@ -373,6 +454,7 @@ class StakingRouter(Contract):
         ) = self.get_staking_rewards_distribution()
         return self._to_e4_precision(total_fee_in_high_precision, precision)
 
+    @view
     def get_staking_fee_aggregate_distribution_e4_precision(self) -> tuple[int, int]:
         (
             modules_fee_high_precision,
@@ -383,13 +465,128 @@ class StakingRouter(Contract):
         treasury_fee = self._to_e4_precision(treasury_fee_high_precision, precision)
         return modules_fee, treasury_fee
 
+    @view
     def get_deposits_allocation(self, deposits_count: int) -> tuple[int, list[int]]:
         allocated, allocations, _ = self._get_deposits_allocation(deposits_count)
         return allocated, allocations
 
+    @view
+    def get_deposits_allocation_curve(
+        self, max_deposits_count: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # get_deposits_allocation for every deposits count from 1 to
+        # max_deposits_count with the modules loaded once: row k - 1 holds the
+        # allocated count and the allocations for k deposits
+        (
+            total_active_validators,
+            staking_modules_cache,
+        ) = self._load_staking_modules_cache()
+
+        allocated = np.zeros(max_deposits_count, dtype=np.int64)
+        allocations = np.zeros(
+            (max_deposits_count, len(staking_modules_cache)), dtype=np.int64
+        )
+        if not staking_modules_cache:
+            return allocated, allocations
+
+        target_shares = [item.target_share for item in staking_modules_cache]
+        if not getattr(self._allocation_strategy, "RESUMABLE", False):
+            for deposits_count in range(1, max_deposits_count + 1):
+                row, capacities = self._get_deposits_buckets(
+                    staking_modules_cache, total_active_validators + deposits_count
+                )
+                allocated[deposits_count - 1] = self._allocation_strategy.allocate(
+                    row, capacities, deposits_count, target_shares
+                )
+                allocations[deposits_count - 1] = row
+            return allocated, allocations
+
+        # A resumable strategy picks every deposit from the buckets alone, so under
+        # the same capacities the allocation of k + 1 deposits is the one of k plus
+        # a deposit. Capacities grow with k through the target shares, which only
+        # matters for a module that has reached its capacity: the rows are
+        # allocated in passes under the capacities of the last row before a full
+        # module may grow, and only the row where it grows is allocated from
+        # scratch.
+        initial = [item.active_validators_count for item in staking_modules_cache]
+        limits = np.array(
+            [
+                item.active_validators_count + item.available_validators_count
+                for item in staking_modules_cache
+            ],
+            dtype=np.int64,
+        )
+        totals = total_active_validators + np.arange(
+            1, max_deposits_count + 1, dtype=np.int64
+        )
+        # row k - 1 holds the capacities for k deposits, see _get_deposits_buckets
+        capacities = np.minimum(
+            totals[:, None]
+            * np.array(target_shares, dtype=np.int64)
+            // self.TOTAL_BASIS_POINTS,
+            limits,
+        )
+        columns = capacities.T.tolist()
+        capacities = capacities.tolist()
+
+        rows = []
+        buckets = initial
+        base_capacities = capacities[0]
+        while len(rows) < max_deposits_count:
+            row_index = len(rows)
+            # the first row where a full module could take a deposit
+            end = max_deposits_count
+            for i, bucket in enumerate(buckets):
+                if bucket >= base_capacities[i]:
+                    end = min(end, bisect_right(columns[i], bucket))
+            if end <= row_index:
+                buckets = list(initial)
+                self._allocation_strategy.allocate(
+                    buckets, capacities[row_index], row_index + 1, target_shares
+                )
+                rows.append(buckets)
+                base_capacities = capacities[row_index]
+                continue
+
+            pass_capacities = capacities[end - 1]
+            order = self._allocation_strategy.allocate_in_order(
+                list(buckets), pass_capacities, end - row_index, target_shares
+            )
+            # a row holds unless a module open in the pass has reached the capacity
+            # of the row before its last deposit
+            open_modules = [
+                i for i in range(len(buckets)) if buckets[i] < pass_capacities[i]
+            ]
+            row = buckets
+            for index in range(row_index, end):
+                row_capacities = capacities[index]
+                if any(
+                    row[i] >= row_capacities[i] < pass_capacities[i]
+                    for i in open_modules
+                ):
+                    break
+                if index - row_index < len(order):
+                    row = list(row)
+                    row[order[index - row_index]] += 1
+                rows.append(row)
+                buckets = row
+                base_capacities = row_capacities
+
+        allocations[:] = rows
+        allocated[:] = allocations.sum(axis=1) - sum(initial)
+        return allocated, allocations
+
+    @view
     def get_withdrawal_credentials(self) -> str:
         return self._withdrawal_credentials
 
+    @view
+    def get_allocation_strategy(self) -> AllocationStrategy:
+        return self._allocation_strategy
+
+    def set_allocation_strategy(self, allocation_strategy: AllocationStrategy) -> None:
+        self._allocation_strategy = allocation_strategy
+
     def deposit(
         self, deposit_value: int, deposits_count: int, staking_module_id: int
     ) -> None:
@@ -397,12 +594,50 @@ class StakingRouter(Contract):
         assert module_data.status == StakingModuleStatus.Active
         assert deposit_value == deposits_count * self.DEPOSIT_SIZE
 
+        # the caller picks the module, no allocation of the router is carried out
         if deposits_count > 0:
             module = self.get_staking_module_instance(
                 module_data.staking_module_address
             )
             module.obtain_deposit_data(deposits_count)
 
+    def deposit_many(
+        self,
+        deposit_value: int,
+        staking_module_ids: list[int],
+        deposits_counts: list[int],
+    ) -> None:
+        assert len(staking_module_ids) == len(deposits_counts)
+        assert deposit_value == sum(deposits_counts) * self.DEPOSIT_SIZE
+
+        # the deposits follow get_staking_modules_deposits_counts, a strategy with
+        # state of its own moves on past that allocation
+        if hasattr(self._allocation_strategy, "commit_allocation"):
+            self._commit_deposits_allocation(sum(deposits_counts))
+
+        for staking_module_id, deposits_count in zip(
+            staking_module_ids, deposits_counts
+        ):
+            if deposits_count > 0:
+                module_data = self._get_staking_module_by_id(staking_module_id)
+                assert module_data.status == StakingModuleStatus.Active
+                module = self.get_staking_module_instance(
+                    module_data.staking_module_address
+                )
+                module.obtain_deposit_data(deposits_count)
+
+    def _get_rewards_distribution_key(self) -> tuple[int, ...]:
+        # deposits and validator counts updates of a module change its nonce
+        return (self._config_version,) + tuple(
+            self.get_staking_module_instance(
+                self._get_staking_module_by_index(i).staking_module_address
+            ).get_nonce()
+            for i in range(self.get_staking_modules_count())
+        )
+
+    def _increase_config_version(self) -> None:
+        self._config_version += 1
+
     def _load_staking_modules_cache(self) -> tuple[int, list[StakingModuleCache]]:
         total_active_validators = 0
         staking_modules_count = self.get_staking_modules_count()
@@ -448,6 +683,7 @@ class StakingRouter(Contract):
 
         return cache_item
 
+    @view
     def get_staking_module_instance(self, address: str) -> StakingModule:
         return self._staking_modules[address]
 
@@ -457,6 +693,7 @@ class StakingRouter(Contract):
         prev_status = staking_module.status
         if prev_status != status:
             staking_module.status = status
+            self._increase_config_version()
 
     def _get_deposits_allocation(
         self, deposits_to_allocate: int
@@ -470,29 +707,58 @@ class StakingRouter(Contract):
         allocations = [0] * staking_modules_count
 
         if staking_modules_count > 0:
-            total_active_validators += deposits_to_allocate
-            capacities = [0] * staking_modules_count
-            target_validators = 0
-
-            for i in range(staking_modules_count):
-                allocations[i] = staking_modules_cache[i].active_validators_count
-                target_validators = (
-                    staking_modules_cache[i].target_share * total_active_validators
-                ) // self.TOTAL_BASIS_POINTS
-                capacities[i] = min(
-                    target_validators,
-                    staking_modules_cache[i].active_validators_count
-                    + staking_modules_cache[i].available_validators_count,
-                )
-
-            allocated = MinFirstAllocationStrategy.allocate(
-                allocations, capacities, deposits_to_allocate
+            allocations, capacities = self._get_deposits_buckets(
+                staking_modules_cache, total_active_validators + deposits_to_allocate
+            )
+            allocated = self._allocation_strategy.allocate(
+                allocations,
+                capacities,
+                deposits_to_allocate,
+                [item.target_share for item in staking_modules_cache],
             )
         else:
             allocated = 0
 
         return allocated, allocations, staking_modules_cache
 
+    def _commit_deposits_allocation(self, deposits_count: int) -> None:
+        (
+            total_active_validators,
+            staking_modules_cache,
+        ) = self._load_staking_modules_cache()
+        if staking_modules_cache:
+            allocations, capacities = self._get_deposits_buckets(
+                staking_modules_cache, total_active_validators + deposits_count
+            )
+            self._allocation_strategy.commit_allocation(
+                allocations,
+                capacities,
+                deposits_count,
+                [item.target_share for item in staking_modules_cache],
+            )
+
+    def _get_deposits_buckets(
+        self,
+        staking_modules_cache: list[StakingModuleCache],
+        total_active_validators: int,
+    ) -> tuple[list[int], list[int]]:
+        # active validators of every module and the most each may have once the
+        # total active validators is reached
+        allocations = [0] * len(staking_modules_cache)
+        capacities = [0] * len(staking_modules_cache)
+
+        for i in range(len(staking_modules_cache)):
+            allocations[i] = staking_modules_cache[i].active_validators_count
+            target_validators = (
+                staking_modules_cache[i].target_share * total_active_validators
+            ) // self.TOTAL_BASIS_POINTS
+            capacities[i] = min(
+                target_validators,
+                staking_modules_cache[i].active_validators_count
+                + staking_modules_cache[i].available_validators_count,
+            )
+        return allocations, capacities
+
     def _get_staking_module_index_by_id(self, staking_module_id: int) -> int:
         index_one_based = self._staking_module_indices_mapping[staking_module_id]
         assert index_one_based != 0
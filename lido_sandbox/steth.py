@@ -1,36 +1,86 @@
 from collections import defaultdict
-from lido_sandbox.contract import Contract
+from functools import partial
+import numpy as np
+import pandas as pd
+from lido_sandbox.contract import Contract, view
+from lido_sandbox.libs import CopyOnWriteDict, HolderIndex, ShareLedger
+from lido_sandbox.objects import EventType
+from lido_sandbox.share_history import ShareHistory
 
 
 class StETH(Contract):
-    _shares: dict[str, int]
+    _shares: ShareLedger
     _allowances: dict[str, dict[str, int]]
     _total_shares: int = 0
+    _share_rate: tuple[int, int] | None = None
+    _share_history: ShareHistory
+    _holder_index: HolderIndex | None = None
+
+    # the total pooled ether and total shares pair is cached until one of its
+    # mutators invalidates it, every cached read is checked against a full
+    # recompute when set
+    CHECK_SHARE_RATE_CACHE: bool = False
 
     INFINITE_ALLOWANCE: int = 2**256 - 1
     INITIAL_TOKEN_HOLDER: str = "0xdead"
+    ZERO_ADDRESS: str = "0x0000000000000000000000000000000000000000"
 
     def __init__(self, address: str) -> None:
         super().__init__(address)
 
-        self._shares = defaultdict(int)
-        self._allowances = defaultdict(lambda: defaultdict(int))
+        self._shares = ShareLedger()
+        self._allowances = CopyOnWriteDict(
+            partial(defaultdict, int), copy_values=True
+        )
+        self._share_history = ShareHistory()
 
+    @view
     def total_supply(self) -> int:
-        return self._get_total_pooled_ether()
+        return self._get_share_rate()[0]
 
+    @view
     def get_total_pooled_ether(self) -> int:
-        return self._get_total_pooled_ether()
+        return self._get_share_rate()[0]
 
+    @view
     def balance_of(self, account: str) -> int:
         return self.get_pooled_eth_by_shares(self.shares_of(account))
 
+    @view
+    def balances_of(
+        self, accounts: list[str] | None = None, as_dataframe: bool = False
+    ) -> tuple[list[str], np.ndarray, np.ndarray] | pd.DataFrame:
+        # balance_of for many accounts (every holder by default) in one pass over the
+        # ledger, shares and balances are exact ints aligned with the accounts
+        if accounts is None:
+            ids = self._shares.get_known_ids()
+            accounts = self._shares.get_accounts(ids)
+        else:
+            ids = self._shares.get_ids(accounts)
+
+        shares = self._shares.get_shares_array(ids)
+        total_pooled_ether, total_shares = self._get_share_rate()
+        balances = shares * total_pooled_ether // total_shares
+
+        if not as_dataframe:
+            return accounts, shares, balances
+        return pd.DataFrame(
+            {"address": accounts, "shares": shares, "balance": balances}, copy=False
+        )
+
     def transfer(self, sender: str, recipient: str, amount: int) -> bool:
         self._transfer(sender, recipient, amount)
         return True
 
+    def transfer_many(
+        self, senders: list[str], recipients: list[str], amounts: list[int]
+    ) -> bool:
+        self._transfer_many(senders, recipients, amounts)
+        return True
+
+    @view
     def allowance(self, owner: str, spender: str) -> int:
-        return self._allowances[owner][spender]
+        return self._get_allowance(owner, spender)
 
     def approve(self, sender: str, spender: str, amount: int) -> bool:
         self._approve(sender, spender, amount)
@@ -43,19 +93,97 @@ class StETH(Contract):
         self._transfer(sender, recipient, amount)
         return True
 
+    @view
     def get_total_shares(self) -> int:
         return self._get_total_shares()
 
+    @view
     def shares_of(self, account: str) -> int:
         return self._shares_of(account)
 
+    def prune_empty_entries(self) -> tuple[int, int]:
+        # drops zero share balances and zero allowances left by earlier writes,
+        # returns how many of each were dropped
+        dropped_shares = self._shares.drop_zeros()
+        dropped_allowances = 0
+        for owner in list(self._allowances):
+            spenders = self._allowances.peek(owner)
+            allowances = {
+                spender: amount for spender, amount in spenders.items() if amount
+            }
+            if len(allowances) == len(spenders) and allowances:
+                continue
+            dropped_allowances += len(spenders) - len(allowances)
+            if allowances:
+                self._allowances[owner] = self._allowances.default_factory(allowances)
+            else:
+                del self._allowances[owner]
+        return dropped_shares, dropped_allowances
+
+    @view
+    def get_share_history(self) -> ShareHistory:
+        return self._share_history
+
+    @view
+    def get_holder_index(self) -> HolderIndex | None:
+        return self._holder_index
+
+    def enable_holder_index(self) -> HolderIndex:
+        # the index is built from the ledger once and then kept up to date by every
+        # share mutation
+        if self._holder_index is None:
+            ids = self._shares.get_known_ids()
+            self._holder_index = HolderIndex(
+                zip(self._shares.get_accounts(ids), self._shares.get_shares_array(ids))
+            )
+        return self._holder_index
+
+    def disable_holder_index(self) -> None:
+        self._holder_index = None
+
+    @view
+    def get_top_holders(self, count: int) -> list[tuple[str, int]]:
+        assert self._holder_index is not None, "HOLDER_INDEX_DISABLED"
+        return self._holder_index.get_top_holders(count)
+
+    @view
+    def get_holder_rank(self, account: str) -> int | None:
+        assert self._holder_index is not None, "HOLDER_INDEX_DISABLED"
+        return self._holder_index.get_rank(account, self._shares_of(account))
+
+    @view
+    def get_balance_at(self, account: str, timestamp: int) -> int:
+        # balance right after the last report made at or before the timestamp
+        report_index = self._share_history.get_report_index(timestamp)
+        assert report_index is not None, "NO_REPORT_BEFORE_TIMESTAMP"
+        return self._get_balance_at_report(account, report_index)[0]
+
+    @view
+    def get_rewards_between(
+        self, account: str, from_timestamp: int, to_timestamp: int
+    ) -> int:
+        # rebase rewards are the part of the balance change that is not explained by
+        # the tokens the account received or sent in between
+        from_report_index = self._share_history.get_report_index(from_timestamp)
+        to_report_index = self._share_history.get_report_index(to_timestamp)
+        assert from_report_index is not None, "NO_REPORT_BEFORE_TIMESTAMP"
+        assert from_report_index <= to_report_index, "INVALID_TIME_RANGE"
+
+        from_balance, from_tokens = self._get_balance_at_report(
+            account, from_report_index
+        )
+        to_balance, to_tokens = self._get_balance_at_report(account, to_report_index)
+        return to_balance - from_balance - (to_tokens - from_tokens)
+
+    @view
     def get_shares_by_pooled_eth(self, eth_amount: int) -> int:
-        return eth_amount * self._get_total_shares() // self._get_total_pooled_ether()
+        total_pooled_ether, total_shares = self._get_share_rate()
+        return eth_amount * total_shares // total_pooled_ether
 
+    @view
     def get_pooled_eth_by_shares(self, shares_amount: int) -> int:
-        return (
-            shares_amount * self._get_total_pooled_ether() // self._get_total_shares()
-        )
+        total_pooled_ether, total_shares = self._get_share_rate()
+        return shares_amount * total_pooled_ether // total_shares
 
     def transfer_shares(
         self, msg_sender: str, recipient: str, shares_amount: int
@@ -64,6 +192,16 @@ class StETH(Contract):
         tokens_amount = self.get_pooled_eth_by_shares(shares_amount)
         return tokens_amount
 
+    def transfer_shares_many(
+        self, msg_senders: list[str], recipients: list[str], shares_amounts: list[int]
+    ) -> list[int]:
+        self._transfer_shares_many(msg_senders, recipients, shares_amounts)
+        total_pooled_ether, total_shares = self._get_share_rate()
+        return [
+            shares_amount * total_pooled_ether // total_shares
+            for shares_amount in shares_amounts
+        ]
+
     def transfer_shares_from(
         self, msg_sender: str, sender: str, recipient: str, shares_amount: int
     ) -> int:
@@ -75,15 +213,63 @@ class StETH(Contract):
     def _get_total_pooled_ether(self) -> int:
         pass
 
+    def _get_share_rate(self) -> tuple[int, int]:
+        share_rate = self._share_rate
+        if share_rate is None:
+            share_rate = (self._get_total_pooled_ether(), self._get_total_shares())
+            self._share_rate = share_rate
+        elif self.CHECK_SHARE_RATE_CACHE:
+            assert share_rate == (
+                self._get_total_pooled_ether(),
+                self._get_total_shares(),
+            ), "STALE_SHARE_RATE"
+        return share_rate
+
+    def _invalidate_share_rate(self) -> None:
+        self._share_rate = None
+
+    def _get_balance_at_report(
+        self, account: str, report_index: int
+    ) -> tuple[int, int]:
+        _, total_pooled_ether, total_shares = self._share_history.get_report(
+            report_index
+        )
+        shares, tokens_received = self._share_history.get_shares_at(
+            account, report_index, self._shares_of(account)
+        )
+        return shares * total_pooled_ether // total_shares, tokens_received
+
     def _transfer(self, sender: str, recipient: str, amount: int) -> None:
         shares_to_transfer = self.get_shares_by_pooled_eth(amount)
         self._transfer_shares(sender, recipient, shares_to_transfer)
 
+    def _transfer_many(
+        self, senders: list[str], recipients: list[str], amounts: list[int]
+    ) -> None:
+        # transfers don't move the share rate, so all the amounts are converted at once
+        total_pooled_ether, total_shares = self._get_share_rate()
+        self._transfer_shares_many(
+            senders,
+            recipients,
+            [amount * total_shares // total_pooled_ether for amount in amounts],
+        )
+
+    def _get_allowance(self, owner: str, spender: str) -> int:
+        spenders = self._allowances.peek(owner)
+        return 0 if spenders is None else spenders.get(spender, 0)
+
     def _approve(self, owner: str, spender: str, amount: int) -> None:
-        self._allowances[owner][spender] = amount
+        # zero allowances are not stored, reads default to zero anyway
+        if amount:
+            self._allowances[owner][spender] = amount
+        elif spender in self._allowances.peek(owner, ()):
+            spenders = self._allowances[owner]
+            del spenders[spender]
+            if not spenders:
+                del self._allowances[owner]
 
     def _spend_allowance(self, owner: str, spender: str, amount: int) -> None:
-        current_allowance = self._allowances[owner][spender]
+        current_allowance = self._get_allowance(owner, spender)
         if current_allowance != self.INFINITE_ALLOWANCE:
             assert current_allowance >= amount
             self._approve(owner, spender, current_allowance - amount)
@@ -101,19 +287,186 @@ class StETH(Contract):
         self._shares[sender] = current_sender_shares - shares_amount
         self._shares[recipient] += shares_amount
 
+        if self._holder_index is not None:
+            self._holder_index.update(
+                sender, current_sender_shares, current_sender_shares - shares_amount
+            )
+            current_recipient_shares = self._shares_of(recipient)
+            self._holder_index.update(
+                recipient,
+                current_recipient_shares - shares_amount,
+                current_recipient_shares,
+            )
+
+        if self._share_history.is_tracking_accounts():
+            tokens_amount = self.get_pooled_eth_by_shares(shares_amount)
+            self._share_history.checkpoint(
+                sender,
+                current_sender_shares,
+                current_sender_shares - shares_amount,
+                -tokens_amount,
+            )
+            current_recipient_shares = self._shares_of(recipient)
+            self._share_history.checkpoint(
+                recipient,
+                current_recipient_shares - shares_amount,
+                current_recipient_shares,
+                tokens_amount,
+            )
+
+        if self._event_log is not None:
+            self._emit_transfer_events(
+                sender,
+                recipient,
+                shares_amount,
+                self.get_pooled_eth_by_shares(shares_amount),
+            )
+
+    def _transfer_shares_many(
+        self, senders: list[str], recipients: list[str], shares_amounts: list[int]
+    ) -> None:
+        assert len(senders) == len(recipients) == len(shares_amounts)
+
+        # every transfer is checked against the balances left by the previous ones,
+        # nothing is written unless the whole batch passes
+        shares = {}
+        for sender, recipient, shares_amount in zip(
+            senders, recipients, shares_amounts
+        ):
+            current_sender_shares = (
+                shares[sender] if sender in shares else self._shares_of(sender)
+            )
+            assert shares_amount <= current_sender_shares
+
+            shares[sender] = current_sender_shares - shares_amount
+            shares[recipient] = (
+                shares[recipient] if recipient in shares else self._shares_of(recipient)
+            ) + shares_amount
+
+        if self._holder_index is not None or self._share_history.is_tracking_accounts():
+            shares_before = {account: self._shares_of(account) for account in shares}
+        if self._share_history.is_tracking_accounts():
+            total_pooled_ether, total_shares = self._get_share_rate()
+            tokens_received = dict.fromkeys(shares, 0)
+            for sender, recipient, shares_amount in zip(
+                senders, recipients, shares_amounts
+            ):
+                tokens_amount = shares_amount * total_pooled_ether // total_shares
+                tokens_received[sender] -= tokens_amount
+                tokens_received[recipient] += tokens_amount
+
+        self._shares.set_many(shares.keys(), shares.values())
+
+        if self._holder_index is not None:
+            for account, account_shares in shares.items():
+                self._holder_index.update(
+                    account, shares_before[account], account_shares
+                )
+
+        if self._share_history.is_tracking_accounts():
+            for account, account_shares in shares.items():
+                self._share_history.checkpoint(
+                    account,
+                    shares_before[account],
+                    account_shares,
+                    tokens_received[account],
+                )
+
+        if self._event_log is not None:
+            total_pooled_ether, total_shares = self._get_share_rate()
+            for sender, recipient, shares_amount in zip(
+                senders, recipients, shares_amounts
+            ):
+                self._emit_transfer_events(
+                    sender,
+                    recipient,
+                    shares_amount,
+                    shares_amount * total_pooled_ether // total_shares,
+                )
+
     def _mint_shares(self, recipient: str, shares_amount: int) -> None:
         self._total_shares = self._get_total_shares() + shares_amount
-        self._shares[recipient] = self._shares[recipient] + shares_amount
+        self._invalidate_share_rate()
+        current_recipient_shares = self._shares[recipient]
+        self._shares[recipient] = current_recipient_shares + shares_amount
+
+        if self._holder_index is not None:
+            self._holder_index.update(
+                recipient,
+                current_recipient_shares,
+                current_recipient_shares + shares_amount,
+            )
+
+        if self._share_history.is_tracking_accounts():
+            self._share_history.checkpoint(
+                recipient,
+                current_recipient_shares,
+                current_recipient_shares + shares_amount,
+                self.get_pooled_eth_by_shares(shares_amount),
+            )
+
+        if self._event_log is not None:
+            self._emit_transfer_events(
+                self.ZERO_ADDRESS,
+                recipient,
+                shares_amount,
+                self.get_pooled_eth_by_shares(shares_amount),
+            )
 
     def _burn_shares(self, account: str, shares_amount: int) -> int:
         account_shares = self._shares[account]
         assert shares_amount <= account_shares
 
+        if self._event_log is not None or self._share_history.is_tracking_accounts():
+            pre_rebase_token_amount = self.get_pooled_eth_by_shares(shares_amount)
+
         new_total_shares = self._get_total_shares() - shares_amount
         self._total_shares = new_total_shares
+        self._invalidate_share_rate()
         self._shares[account] = account_shares - shares_amount
 
+        if self._holder_index is not None:
+            self._holder_index.update(
+                account, account_shares, account_shares - shares_amount
+            )
+
+        if self._share_history.is_tracking_accounts():
+            self._share_history.checkpoint(
+                account,
+                account_shares,
+                account_shares - shares_amount,
+                -pre_rebase_token_amount,
+            )
+
+        if self._event_log is not None:
+            self._event_log.emit(
+                EventType.SharesBurnt,
+                self.address,
+                (account,),
+                (
+                    pre_rebase_token_amount,
+                    self.get_pooled_eth_by_shares(shares_amount),
+                    shares_amount,
+                ),
+            )
+
         return new_total_shares
 
+    def _emit_transfer_events(
+        self, sender: str, recipient: str, shares_amount: int, tokens_amount: int
+    ) -> None:
+        self._event_log.emit(
+            EventType.Transfer,
+            self.address,
+            (sender, recipient),
+            (tokens_amount,),
+        )
+        self._event_log.emit(
+            EventType.TransferShares,
+            self.address,
+            (sender, recipient),
+            (shares_amount,),
+        )
+
     def _mint_initial_shares(self, shares_amount: int) -> None:
         self._mint_shares(self.INITIAL_TOKEN_HOLDER, shares_amount)
@@ -0,0 +1,251 @@
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+from collections.abc import Callable, Iterator, Sequence
+from itertools import product
+from typing import Any
+import numpy as np
+import pandas as pd
+from lido_sandbox.locator import Locator
+
+# A point of a parameter space is a dict of parameter values. The parameters below
+# are applied to the forked world before the scenario runs, module parameters are
+# suffixed with the staking module id, e.g. "treasury_fee.1". Every other parameter,
+# e.g. a report input, is only handed to the scenario.
+PARAMETER_MAX_POSITIVE_TOKEN_REBASE: str = "max_positive_token_rebase"
+PARAMETER_TARGET_SHARE: str = "target_share"
+PARAMETER_STAKING_MODULE_FEE: str = "staking_module_fee"
+PARAMETER_TREASURY_FEE: str = "treasury_fee"
+
+_MODULE_PARAMETERS: tuple[str, ...] = (
+    PARAMETER_TARGET_SHARE,
+    PARAMETER_STAKING_MODULE_FEE,
+    PARAMETER_TREASURY_FEE,
+)
+
+# a scenario runs on a fork of the base world and returns the metrics of the point
+Scenario = Callable[[Locator, dict], dict[str, Any]]
+
+# the worker state is set once per process by the pool initializer
+_base_locator: Locator | None = None
+_scenario: Scenario | None = None
+
+
+def grid(axes: dict[str, Sequence]) -> list[dict]:
+    names = list(axes)
+    return [dict(zip(names, values)) for values in product(*axes.values())]
+
+
+def random_points(
+    axes: dict[str, Sequence | Callable[[random.Random], Any]],
+    count: int,
+    seed: int = 0,
+) -> list[dict]:
+    # an axis is either a sequence to choose from or a function drawing a value
+    rnd = random.Random(seed)
+    return [
+        {
+            name: axis(rnd) if callable(axis) else rnd.choice(axis)
+            for name, axis in axes.items()
+        }
+        for _ in range(count)
+    ]
+
+
+def apply_parameters(locator: Locator, point: dict) -> None:
+    router = locator.staking_router
+    module_parameters = {}
+
+    for name, value in point.items():
+        if name == PARAMETER_MAX_POSITIVE_TOKEN_REBASE:
+            locator.oracle_report_sanity_checker.set_max_positive_token_rebase(value)
+            continue
+        parameter, _, staking_module_id = name.partition(".")
+        if parameter in _MODULE_PARAMETERS and staking_module_id.isdigit():
+            module_parameters.setdefault(int(staking_module_id), {})[parameter] = value
+
+    for staking_module_id, parameters in module_parameters.items():
+        staking_module = router.get_staking_module(staking_module_id)
+        router.update_staking_module(
+            staking_module_id,
+            parameters.get(PARAMETER_TARGET_SHARE, staking_module.target_share),
+            parameters.get(
+                PARAMETER_STAKING_MODULE_FEE, staking_module.staking_module_fee
+            ),
+            parameters.get(PARAMETER_TREASURY_FEE, staking_module.treasury_fee),
+        )
+
+
+def run_point(locator: Locator, scenario: Scenario, point: dict) -> dict:
+    # a rejected point, e.g. a report failing a sanity check, is recorded with its
+    # error instead of stopping the sweep
+    forked = locator.fork()
+    try:
+        apply_parameters(forked, point)
+        return {"metrics": scenario(forked, point), "error": None}
+    except AssertionError as error:
+        return {"metrics": {}, "error": str(error) or type(error).__name__}
+
+
+class Sweep:
+    # Runs a scenario for every point of a parameter space, each on its own fork of
+    # the base world. The base world is written to a snapshot once, every worker
+    # process loads it and forks it per point. Workers are replaced after
+    # `max_points_per_worker` points, which bounds their memory. Finished points are
+    # appended to the results file as JSON lines, so a sweep run again with the same
+    # file only runs the points that are missing.
+    DEFAULT_CHUNK_SIZE: int = 8
+    DEFAULT_MAX_POINTS_PER_WORKER: int = 256
+
+    def __init__(
+        self,
+        locator: Locator,
+        scenario: Scenario,
+        points: list[dict],
+        results_path: str | None = None,
+        workers: int | None = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_points_per_worker: int = DEFAULT_MAX_POINTS_PER_WORKER,
+    ) -> None:
+        assert chunk_size > 0, "INVALID_CHUNK_SIZE"
+        assert max_points_per_worker >= chunk_size, "INVALID_MAX_POINTS_PER_WORKER"
+
+        self.locator = locator
+        self.scenario = scenario
+        self.points = points
+        self.results_path = results_path
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_points_per_worker = max_points_per_worker
+
+    def get_pending_points(self) -> list[int]:
+        done = {record["index"] for record in self._read_results()}
+        return [index for index in range(len(self.points)) if index not in done]
+
+    def run(
+        self, on_progress: Callable[[int, int], None] | None = None
+    ) -> pd.DataFrame:
+        # on_progress gets the finished and total points counts after every chunk
+        self._drop_partial_line()
+        pending = self.get_pending_points()
+        records = [] if self.results_path is None else None
+        finished = len(self.points) - len(pending)
+
+        results_file = (
+            None if self.results_path is None else open(self.results_path, "a")
+        )
+        try:
+            for chunk_records in self._run_chunks(pending):
+                for record in chunk_records:
+                    if results_file is None:
+                        records.append(record)
+                    else:
+                        results_file.write(_to_json(record) + "\n")
+                if results_file is not None:
+                    results_file.flush()
+                finished += len(chunk_records)
+                if on_progress is not None:
+                    on_progress(finished, len(self.points))
+        finally:
+            if results_file is not None:
+                results_file.close()
+
+        return self._to_dataframe(self._read_results() if records is None else records)
+
+    def _run_chunks(self, pending: list[int]) -> Iterator[list[dict]]:
+        chunks = [
+            [(index, self.points[index]) for index in pending[i : i + self.chunk_size]]
+            for i in range(0, len(pending), self.chunk_size)
+        ]
+        if not chunks:
+            return
+
+        if self.workers <= 1:
+            for chunk in chunks:
+                yield [
+                    {"index": index, "point": point}
+                    | run_point(self.locator, self.scenario, point)
+                    for index, point in chunk
+                ]
+            return
+
+        directory = tempfile.mkdtemp(prefix="lido-sweep-")
+        try:
+            snapshot_path = os.path.join(directory, "base.snapshot")
+            self.locator.save_snapshot(snapshot_path)
+            with multiprocessing.Pool(
+                min(self.workers, len(chunks)),
+                _init_worker,
+                (snapshot_path, self.scenario),
+                self.max_points_per_worker // self.chunk_size,
+            ) as pool:
+                yield from pool.imap_unordered(_run_chunk, chunks)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _read_results(self) -> list[dict]:
+        if self.results_path is None or not os.path.exists(self.results_path):
+            return []
+
+        records = []
+        with open(self.results_path) as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break
+                record = json.loads(line)
+                assert record["index"] < len(self.points), "UNKNOWN_POINT"
+                assert record["point"] == json.loads(
+                    _to_json(self.points[record["index"]])
+                ), "POINTS_CHANGED"
+                records.append(record)
+        return records
+
+    def _drop_partial_line(self) -> None:
+        # a line cut short by an interrupted run is dropped, its point runs again
+        if self.results_path is None or not os.path.exists(self.results_path):
+            return
+        with open(self.results_path, "rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+
+    @staticmethod
+    def _to_dataframe(records: list[dict]) -> pd.DataFrame:
+        records = sorted(records, key=lambda record: record["index"])
+        return pd.DataFrame(
+            [
+                record["point"] | record["metrics"] | {"error": record["error"]}
+                for record in records
+            ],
+            index=pd.Index([record["index"] for record in records], name="point"),
+        )
+
+
+def _to_json(value) -> str:
+    # numpy scalars and arrays, e.g. metrics of a scenario or points drawn from a
+    # numpy range, are written as the plain values they hold
+    return json.dumps(value, default=_to_json_value)
+
+
+def _to_json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _init_worker(snapshot_path: str, scenario: Scenario) -> None:
+    global _base_locator, _scenario
+    _base_locator = Locator.load_snapshot(snapshot_path)
+    _scenario = scenario
+
+
+def _run_chunk(chunk: list[tuple[int, dict]]) -> list[dict]:
+    return [
+        {"index": index, "point": point} | run_point(_base_locator, _scenario, point)
+        for index, point in chunk
+    ]
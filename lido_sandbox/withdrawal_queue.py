@@ -1,11 +1,12 @@
 from lido_sandbox.objects import (
     BatchesCalculationState,
     Checkpoint,
+    EventType,
     WithdrawalRequest,
     WithdrawalRequestStatus,
 )
-from lido_sandbox.contract import Contract
-from collections import defaultdict
+from lido_sandbox.contract import Contract, view
+from lido_sandbox.libs import CopyOnWriteDict
 from time import time
 
 
@@ -27,35 +28,46 @@ class WithdrawalQueue(Contract):
     def __init__(self, address: str) -> None:
         super().__init__(address)
 
-        self._queue = defaultdict(lambda: WithdrawalRequest())
-        self._checkpoints = defaultdict(lambda: Checkpoint())
-        self._request_by_owner = defaultdict(set)
+        self._queue = CopyOnWriteDict(WithdrawalRequest, copy_values=True)
+        self._checkpoints = CopyOnWriteDict(Checkpoint, copy_values=True)
+        self._request_by_owner = CopyOnWriteDict(set, copy_values=True)
 
+    @view
     def is_bunker_mode_active(self) -> bool:
         return self._is_bunker
 
+    @view
     def get_last_request_id(self) -> int:
         return self._last_request_id
 
+    @view
     def get_last_finalized_request_id(self) -> int:
         return self._last_finalized_request_id
 
+    @view
     def get_locked_ether_amount(self) -> int:
         return self._locked_ether_amount
 
+    @view
     def get_last_checkpoint_index(self) -> int:
         return self._last_checkpoint_index
 
+    @view
     def unfinalized_request_number(self) -> int:
         return self.get_last_request_id() - self.get_last_finalized_request_id()
 
+    @view
     def unfinalized_steth(self) -> int:
-        queue = self._get_queue()
         return (
-            queue[self.get_last_request_id()].cumulative_steth
-            - queue[self.get_last_finalized_request_id()].cumulative_steth
+            self._get_request(self.get_last_request_id()).cumulative_steth
+            - self._get_request(self.get_last_finalized_request_id()).cumulative_steth
         )
 
+    def enqueue(self, amount_of_steth: int, amount_of_shares: int, owner: str) -> int:
+        # the stETH is expected to be transferred to the queue by the caller
+        return self._enqueue(amount_of_steth, amount_of_shares, owner)
+
+    @view
     def calculate_finalization_batches(
         self,
         max_share_rate: int,
@@ -72,21 +84,21 @@ class WithdrawalQueue(Contract):
         if state.batches_length == 0:
             current_id = self.get_last_finalized_request_id() + 1
 
-            prev_request = self._get_queue()[current_id - 1]
+            prev_request = self._get_request(current_id - 1)
         else:
             last_handled_request_id = state.batches[state.batches_length - 1]
             current_id = last_handled_request_id + 1
 
-            prev_request = self._get_queue()[last_handled_request_id]
+            prev_request = self._get_request(last_handled_request_id)
             prev_request_share_rate, _, _ = self._calc_batch(
-                self._get_queue()[last_handled_request_id - 1], prev_request
+                self._get_request(last_handled_request_id - 1), prev_request
             )
 
         next_call_request_id = current_id + max_requests_per_call
         queue_length = self.get_last_request_id() + 1
 
         while current_id < queue_length and current_id < next_call_request_id:
-            request = self._get_queue()[current_id]
+            request = self._get_request(current_id)
 
             if request.timestamp > max_timestamp:
                 break  # max timestamp break
@@ -136,6 +148,7 @@ class WithdrawalQueue(Contract):
 
         return state
 
+    @view
     def prefinalize(self, batches: list[int], max_share_rate: int) -> tuple[int, int]:
         assert max_share_rate != 0
         assert len(batches)
@@ -148,7 +161,7 @@ class WithdrawalQueue(Contract):
 
         current_batch_index = 0
         prev_batch_end_request_id = last_finalized_request_id
-        prev_batch_end = self._get_queue()[prev_batch_end_request_id]
+        prev_batch_end = self._get_request(prev_batch_end_request_id)
         eth_to_lock = 0
         shares_to_burn = 0
 
@@ -156,7 +169,7 @@ class WithdrawalQueue(Contract):
             batch_end_request_id = batches[current_batch_index]
             assert batch_end_request_id > prev_batch_end_request_id
 
-            batch_end = self._get_queue()[batch_end_request_id]
+            batch_end = self._get_request(batch_end_request_id)
             batch_share_rate, steth, shares = self._calc_batch(
                 prev_batch_end, batch_end
             )
@@ -185,8 +198,8 @@ class WithdrawalQueue(Contract):
         last_finalized_request_id = self.get_last_finalized_request_id()
         assert last_request_id_to_be_finalized > last_finalized_request_id
 
-        last_finalized_request = self._get_queue()[last_finalized_request_id]
-        request_to_finalize = self._get_queue()[last_request_id_to_be_finalized]
+        last_finalized_request = self._get_request(last_finalized_request_id)
+        request_to_finalize = self._get_request(last_request_id_to_be_finalized)
 
         steth_to_finalize = (
             request_to_finalize.cumulative_steth
@@ -206,9 +219,24 @@ class WithdrawalQueue(Contract):
         self._set_locked_ether_amount(self.get_locked_ether_amount() + amount_of_eth)
         self._set_last_finalized_request_id(last_request_id_to_be_finalized)
 
+        if self._event_log is not None:
+            self._event_log.emit(
+                EventType.WithdrawalsFinalized,
+                self.address,
+                (),
+                (
+                    first_request_id_to_finalize,
+                    last_request_id_to_be_finalized,
+                    amount_of_eth,
+                    request_to_finalize.cumulative_shares
+                    - last_finalized_request.cumulative_shares,
+                    int(time()),
+                ),
+            )
+
     def _enqueue(self, amount_of_steth: int, amount_of_shares: int, owner: str) -> int:
         last_request_id = self.get_last_request_id()
-        last_request = self._get_queue()[last_request_id]
+        last_request = self._get_request(last_request_id)
 
         cumulative_shares = last_request.cumulative_shares + amount_of_shares
         cumulative_steth = last_request.cumulative_steth + amount_of_steth
@@ -226,15 +254,23 @@ class WithdrawalQueue(Contract):
             self._get_last_report_timestamp(),
         )
         self._get_queue()[request_id] = new_request
-        assert self._get_requests_by_owner()[owner].add(request_id)
+        self._get_requests_by_owner()[owner].add(request_id)
+
+        if self._event_log is not None:
+            self._event_log.emit(
+                EventType.WithdrawalRequested,
+                self.address,
+                (owner, owner),
+                (request_id, amount_of_steth, amount_of_shares),
+            )
 
         return request_id
 
     def _get_status(self, request_id: int) -> WithdrawalRequestStatus:
         assert request_id != 0 and request_id <= self.get_last_request_id()
 
-        request = self._get_queue()[request_id]
-        previous_request = self._get_queue()[request_id - 1]
+        request = self._get_request(request_id)
+        previous_request = self._get_request(request_id - 1)
 
         status = WithdrawalRequestStatus(
             request.cumulative_steth - previous_request.cumulative_steth,
@@ -260,17 +296,17 @@ class WithdrawalQueue(Contract):
             return self.NOT_FOUND
 
         # Right boundary
-        if request_id >= self._get_checkpoints()[end].from_request_id:
+        if request_id >= self._get_checkpoint(end).from_request_id:
             # it's the last checkpoint, so it's valid
             if end == last_checkpoint_index:
                 return end
             # it fits right before the next checkpoint
-            if request_id < self._get_checkpoints()[end + 1].from_request_id:
+            if request_id < self._get_checkpoint(end + 1).from_request_id:
                 return end
             return self.NOT_FOUND
 
         # Left boundary
-        if request_id < self._get_checkpoints()[start].from_request_id:
+        if request_id < self._get_checkpoint(start).from_request_id:
             return self.NOT_FOUND
 
         # Binary search
@@ -278,7 +314,7 @@ class WithdrawalQueue(Contract):
         max_index = end - 1
         while max_index > min_index:
             mid_index = (max_index + min_index + 1) // 2
-            if self._get_checkpoints()[mid_index].from_request_id <= request_id:
+            if self._get_checkpoint(mid_index).from_request_id <= request_id:
                 min_index = mid_index
             else:
                 max_index = mid_index - 1
@@ -306,14 +342,14 @@ class WithdrawalQueue(Contract):
         last_checkpoint_index = self.get_last_checkpoint_index()
         assert hint <= last_checkpoint_index
 
-        checkpoint = self._get_checkpoints()[hint]
+        checkpoint = self._get_checkpoint(hint)
 
         assert request_id >= checkpoint.from_request_id
         if hint < last_checkpoint_index:
-            next_checkpoint = self._get_checkpoints()[hint + 1]
+            next_checkpoint = self._get_checkpoint(hint + 1)
             assert next_checkpoint.from_request_id > request_id
 
-        prev_request = self._get_queue()[request_id - 1]
+        prev_request = self._get_request(request_id - 1)
         batch_share_rate, eth, shares = self._calc_batch(prev_request, request)
 
         if batch_share_rate > checkpoint.max_share_rate:
@@ -330,6 +366,7 @@ class WithdrawalQueue(Contract):
     def _send_value(self, recipient: str, amount: int) -> None:
         pass
 
+    @view
     def calc_batch(
         self, pre_start_request: WithdrawalRequest, end_request: WithdrawalRequest
     ) -> tuple[int, int, int]:
@@ -344,6 +381,16 @@ class WithdrawalQueue(Contract):
     def _get_checkpoints(self) -> dict[int, Checkpoint]:
         return self._checkpoints
 
+    def _get_request(self, request_id: int) -> WithdrawalRequest:
+        # reads neither insert missing requests nor copy the stored ones, the request
+        # must not be mutated
+        request = self._get_queue().peek(request_id)
+        return WithdrawalRequest() if request is None else request
+
+    def _get_checkpoint(self, index: int) -> Checkpoint:
+        checkpoint = self._get_checkpoints().peek(index)
+        return Checkpoint() if checkpoint is None else checkpoint
+
     def _get_requests_by_owner(self) -> dict[str, set[WithdrawalRequest]]:
         return self._request_by_owner
 
@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+from copy import copy
+from functools import cache
+from lido_sandbox.contract import Contract
+from lido_sandbox.event_log import EventLog
+from lido_sandbox.gas_meter import HOOK_GAS_METER, GasMeter, attach_gas_meter
+from lido_sandbox.hooks import HOOK_TRANSACTIONS, hooked_class
+from lido_sandbox.objects import LimitsListPacked, NodeOperatorSummary
+from lido_sandbox.profiler import (
+    HOOK_PROFILER,
+    Profiler,
+    disable_library_profiling,
+    enable_library_profiling,
+)
+
+# plain objects kept by contracts and mutated in place
+JOURNALED_STRUCT_TYPES: tuple[type, ...] = (LimitsListPacked, NodeOperatorSummary)
+
+_JOURNAL_PARTICIPANT: int = 1
+_JOURNAL_CONTAINER: int = 2
+_JOURNAL_STRUCT: int = 3
+
+
+@cache
+def _journal_kind(value_type: type) -> int | None:
+    if issubclass(value_type, (Contract, EventLog)):
+        return None
+    if hasattr(value_type, "_begin_transaction"):
+        return _JOURNAL_PARTICIPANT
+    if issubclass(value_type, (dict, list, set)):
+        return _JOURNAL_CONTAINER
+    if issubclass(value_type, JOURNALED_STRUCT_TYPES):
+        return _JOURNAL_STRUCT
+    return None
+
+
+# Every locator owns its own world, so independent sandboxes never share contracts
+# and a whole world can be pickled along with its locator
+class World:
+    _contracts: dict[str, Contract]
+    _journal: list[dict[int, tuple]]
+    _hooks: tuple[str, ...] = ()
+    event_log: EventLog | None = None
+    profiler: Profiler | None = None
+    gas_meter: GasMeter | None = None
+
+    def __init__(self) -> None:
+        self._contracts = {}
+        self._journal = []
+
+    def __getstate__(self) -> dict:
+        # contracts lose their hooks when copied, see Locator.fork
+        state = dict(self.__dict__)
+        state.pop("_hooks", None)
+        return state
+
+    def register(self, contract: Contract) -> Contract:
+        assert contract.address not in self._contracts, "ADDRESS_ALREADY_REGISTERED"
+
+        self._contracts[contract.address] = contract
+        contract._world = self
+        contract._event_log = self.event_log
+
+        if self._hooks:
+            contract.__class__ = hooked_class(type(contract), self._hooks)
+        if HOOK_GAS_METER in self._hooks:
+            attach_gas_meter(contract, self.gas_meter)
+
+        return contract
+
+    def has_contract(self, address: str) -> bool:
+        return address in self._contracts
+
+    def get_contract(self, address: str) -> Contract:
+        return self._contracts[address]
+
+    def get_contracts(self) -> list[Contract]:
+        return list(self._contracts.values())
+
+    def enable_event_log(self, capacity: int = EventLog.DEFAULT_CAPACITY) -> EventLog:
+        self._set_event_log(EventLog(capacity))
+        return self.event_log
+
+    def disable_event_log(self) -> None:
+        self._set_event_log(None)
+
+    def is_transactions_enabled(self) -> bool:
+        return HOOK_TRANSACTIONS in self._hooks
+
+    def enable_transactions(self) -> None:
+        # every public method of every contract, except views, becomes a transaction:
+        # if it fails, the whole world is rolled back to the state before the call
+        self._enable_hook(HOOK_TRANSACTIONS)
+
+    def disable_transactions(self) -> None:
+        self._disable_hook(HOOK_TRANSACTIONS)
+
+    def enable_profiler(self) -> Profiler:
+        # counts and times the calls of every contract method and library function
+        if self.profiler is None or HOOK_PROFILER not in self._hooks:
+            self.profiler = Profiler()
+            enable_library_profiling(self.profiler)
+            self._enable_hook(HOOK_PROFILER)
+        return self.profiler
+
+    def disable_profiler(self) -> None:
+        if HOOK_PROFILER in self._hooks:
+            self._disable_hook(HOOK_PROFILER)
+            disable_library_profiling(self.profiler)
+
+    def enable_gas_meter(self) -> GasMeter:
+        # counts storage reads and writes of every entry point call and estimates gas
+        if HOOK_GAS_METER not in self._hooks:
+            self.gas_meter = GasMeter()
+            for contract in self._contracts.values():
+                attach_gas_meter(contract, self.gas_meter)
+            self._enable_hook(HOOK_GAS_METER)
+        return self.gas_meter
+
+    def disable_gas_meter(self) -> None:
+        if HOOK_GAS_METER in self._hooks:
+            self._disable_hook(HOOK_GAS_METER)
+            for contract in self._contracts.values():
+                attach_gas_meter(contract, None)
+
+    def get_transaction_depth(self) -> int:
+        return len(self._journal)
+
+    @contextmanager
+    def transaction(self, *contracts: Contract):
+        # transactions nest: a failing inner transaction only reverts its own changes
+        self.begin_transaction(*contracts)
+        try:
+            yield self
+        except BaseException:
+            self.rollback_transaction()
+            raise
+        self.commit_transaction()
+
+    def begin_transaction(self, *contracts: Contract) -> None:
+        # Contracts are journaled up front, all of them unless some are given. With
+        # transactions enabled the others are journaled by their entry points on
+        # the first call inside the transaction.
+        self._journal.append({})
+        if self.event_log is not None:
+            self.event_log._begin_transaction()
+        for contract in contracts or self._contracts.values():
+            self._journal_contract(contract)
+
+    def commit_transaction(self) -> None:
+        assert self._journal, "NO_ACTIVE_TRANSACTION"
+
+        frame = self._journal.pop()
+        outer_frame = self._journal[-1] if self._journal else None
+        for key, entry in frame.items():
+            # a contract first journaled by an inner transaction is restored by the
+            # outer one to the same state, so the entry moves up
+            if outer_frame is not None and key not in outer_frame:
+                outer_frame[key] = entry
+                continue
+            for participant in entry[2]:
+                participant._commit_transaction()
+        if self.event_log is not None:
+            self.event_log._commit_transaction()
+
+    def rollback_transaction(self) -> None:
+        assert self._journal, "NO_ACTIVE_TRANSACTION"
+
+        frame = self._journal.pop()
+        if self.event_log is not None:
+            self.event_log._rollback_transaction()
+
+        for contract, state, participants, containers, structs in frame.values():
+            contract.__dict__.clear()
+            contract.__dict__.update(state)
+            for participant in participants:
+                participant._rollback_transaction()
+            for container, saved in containers:
+                if isinstance(container, list):
+                    container[:] = saved
+                else:
+                    container.clear()
+                    container.update(saved)
+            for struct, saved in structs:
+                struct.__dict__.clear()
+                struct.__dict__.update(saved)
+
+    def _journal_contract(self, contract: Contract) -> None:
+        frame = self._journal[-1]
+        if id(contract) in frame:
+            return
+
+        state = dict(contract.__dict__)
+        participants = []
+        containers = []
+        structs = []
+
+        for value in state.values():
+            kind = _journal_kind(type(value))
+            if kind == _JOURNAL_PARTICIPANT:
+                value._begin_transaction()
+                participants.append(value)
+            elif kind == _JOURNAL_CONTAINER:
+                containers.append((value, copy(value)))
+            elif kind == _JOURNAL_STRUCT:
+                structs.append((value, dict(value.__dict__)))
+
+        frame[id(contract)] = (contract, state, participants, containers, structs)
+
+    def _inherit_hooks(self, world: "World") -> None:
+        if world.is_transactions_enabled():
+            self.enable_transactions()
+        if HOOK_PROFILER in world._hooks:
+            self.enable_profiler()
+        if HOOK_GAS_METER in world._hooks:
+            self.enable_gas_meter()
+
+    def _enable_hook(self, kind: str) -> None:
+        if kind not in self._hooks:
+            self._hooks = self._hooks + (kind,)
+            self._apply_hooks()
+
+    def _disable_hook(self, kind: str) -> None:
+        if kind in self._hooks:
+            self._hooks = tuple(hook for hook in self._hooks if hook != kind)
+            self._apply_hooks()
+
+    def _apply_hooks(self) -> None:
+        for contract in self._contracts.values():
+            contract.__class__ = hooked_class(type(contract), self._hooks)
+
+    def _set_event_log(self, event_log: EventLog | None) -> None:
+        self.event_log = event_log
+        for contract in self._contracts.values():
+            contract._event_log = event_log
@@ -0,0 +1,62 @@
+import random
+import pytest
+from lido_sandbox.libs import MinFirstAllocationStrategy
+
+
+def allocate_both(
+    buckets: list[int], capacities: list[int], allocation_size: int
+) -> tuple[tuple[int, list[int]], tuple[int, list[int]]]:
+    expected_buckets = list(buckets)
+    expected = MinFirstAllocationStrategy.allocate_iteratively(
+        expected_buckets, capacities, allocation_size
+    )
+    buckets = list(buckets)
+    allocated = MinFirstAllocationStrategy.allocate(
+        buckets, capacities, allocation_size
+    )
+    return (allocated, buckets), (expected, expected_buckets)
+
+
+def random_case(rnd: random.Random) -> tuple[list[int], list[int], int]:
+    count = rnd.randint(0, 12)
+    top = rnd.choice([3, 10, 100, 10**6])
+    buckets = [rnd.randint(0, top) for _ in range(count)]
+    capacities = [
+        rnd.choice([0, bucket, rnd.randint(0, top), bucket + rnd.randint(0, top)])
+        for bucket in buckets
+    ]
+    allocation_size = rnd.choice(
+        [0, 1, rnd.randint(0, count + 1), rnd.randint(0, top * (count + 1))]
+    )
+    return buckets, capacities, allocation_size
+
+
+@pytest.mark.parametrize(
+    "buckets, capacities, allocation_size",
+    [
+        ([], [], 0),
+        ([], [], 10),
+        ([0, 0, 0], [0, 0, 0], 5),
+        ([5, 3], [0, 0], 5),
+        ([1, 2, 3], [10, 10, 10], 0),
+        ([4, 4, 4], [10, 10, 10], 1),
+        ([4, 4, 4], [10, 10, 10], 4),
+        ([4, 4, 4], [10, 10, 10], 100),
+        ([2, 2, 7, 2], [3, 9, 9, 9], 6),
+        ([0, 5, 0, 5], [5, 10, 5, 10], 11),
+    ],
+)
+def test_allocate_edge_cases(
+    buckets: list[int], capacities: list[int], allocation_size: int
+) -> None:
+    allocated, expected = allocate_both(buckets, capacities, allocation_size)
+    assert allocated == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_allocate_matches_allocate_iteratively(seed: int) -> None:
+    rnd = random.Random(seed)
+    for _ in range(2_000):
+        buckets, capacities, allocation_size = random_case(rnd)
+        allocated, expected = allocate_both(buckets, capacities, allocation_size)
+        assert allocated == expected, (buckets, capacities, allocation_size)